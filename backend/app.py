@@ -1,118 +1,264 @@
 # backend/app.py
 
 import os
+import time
+_IMPORT_STARTED = time.perf_counter()
+
 import json
 from datetime import datetime, timedelta
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, Response, stream_with_context, g
 from flask_cors import CORS
-import joblib
-import pandas as pd
-import numpy as np 
-
-# --- NEW IMPORTS FOR VERSION 2 & 3 ---
-from utils import get_current_tou_prices
-from decision_engine import make_decision 
-# --- END NEW IMPORTS ---
+import numpy as np
+
+from settings_store import get_settings, get_settings_version, update_settings, SettingsValidationError
+from utils import get_current_tou_prices, get_step_price_arrays, step_hour
+from forecasting import (make_predictions_for_time, make_predictions_for_horizon, make_predictions_for_steps,
+                         ensure_models_loaded, load_models, start_model_warmup, get_model_state, get_prediction_cache_stats)
+from decision_engine import make_decision, ACTION_NAMES, FLOW_KEYS, OPTIMAL_DISPATCH_MODE
+from dispatch_planner import current_dispatch_decision
+from simulation import simulate_battery, battery_params, MAX_SIMULATION_HOURS
+from batch_simulation import (normalize_household_config, build_shared_forecast, run_batch_simulation,
+                              DEFAULT_CHUNK_SIZE)
+from sizing import run_sweep
+from history_store import query_history
+from backtest import run_backtest, DEFAULT_DAILY_DEMAND_KWH
+from monte_carlo import run_monte_carlo, DEFAULT_SCENARIOS
+from event_log import log_event, query_events, get_event_log_stats, DEFAULT_PAGE_SIZE
+from telemetry import ingest_samples, latest_readings, query_series, get_telemetry_stats
+from status_feed import (subscribe_status_feed, unsubscribe_status_feed, next_status_message, get_subscriber_count,
+                         STATUS_FEED_KEEPALIVE_SECONDS)
+from response_cache import (dumps_json, cached_response, response_key, time_bucket, etag_matches, record_not_modified,
+                            get_response_cache_stats, CACHE_CONTROL)
+from metrics import stage, observe, inc, add_gauge, register_collector, render_metrics, PROMETHEUS_CONTENT_TYPE
+from profiler import start_profiler, stop_profiler, get_profile, get_folded_profile, DEFAULT_INTERVAL_SECONDS
 
 app = Flask(__name__)
 CORS(app)
 
-# Load AI models
-MODEL_DIR = os.path.join(os.path.dirname(__file__), 'models')
+# Models load lazily on first use; by default a background thread loads them
+# (and runs one dummy prediction) right away. SYNAPSE_MODEL_WARMUP=0 disables it.
+if os.environ.get('SYNAPSE_MODEL_WARMUP') != '0':
+    start_model_warmup()
 
-try:
-    solar_model = joblib.load(os.path.join(MODEL_DIR, 'solar_production_model.joblib'))
-    wind_model = joblib.load(os.path.join(MODEL_DIR, 'wind_production_model.joblib'))
-    demand_model = joblib.load(os.path.join(MODEL_DIR, 'household_demand_model.joblib'))
-    print("Models loaded successfully!")
-except FileNotFoundError as e:
-    print(f"Error loading models: {e}")
-    solar_model = None
-    wind_model = None
-    demand_model = None
+# Long simulations are computed (and streamed) this many hours at a time
+SIMULATION_CHUNK_HOURS = 168
 
+STREAM_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
 
-def get_settings():
-    settings_filepath = os.path.join(os.path.dirname(__file__), 'data', 'settings.json')
-    
-    default_settings_structure = {
-        "solar_capacity_kw": 5.0,
-        "wind_capacity_kw": 2.0,
-        "battery_capacity_kwh": 10.0,
-        "battery_current_charge_kwh": 5.0, 
-        "battery_min_reserve_percent": 20, # Hard minimum for battery discharge
-        "allow_grid_charge": True, 
-        "operating_mode": "Cost Optimization", 
-        "min_battery_reserve_user_percent": 20 
-    }
 
-    current_settings = {}
-    try:
-        with open(settings_filepath, 'r') as f:
-            file_settings = json.load(f)
-            for key, default_value in default_settings_structure.items():
-                current_settings[key] = file_settings.get(key, default_value)
-            
-    except (FileNotFoundError, json.JSONDecodeError):
-        print("Settings file not found or corrupted. Creating with default values.")
-        current_settings = default_settings_structure 
-        data_dir = os.path.join(os.path.dirname(__file__), 'data')
-        if not os.path.exists(data_dir):
-            os.makedirs(data_dir)
-        with open(settings_filepath, 'w') as f:
-            json.dump(current_settings, f, indent=4)
-            
-    return current_settings
-
-
-# Prediction helper function (no changes)
-def create_features_for_time(dt_object):
-    data = {'hour': [dt_object.hour], 'dayofweek': [dt_object.weekday()], 'month': [dt_object.month], 'year': [dt_object.year]}
-    return pd.DataFrame(data)
-
-def make_predictions_for_time(dt_object):
-    if not all([solar_model, wind_model, demand_model]): 
-        return 0.0, 0.0, 0.0
-    
-    features = create_features_for_time(dt_object)
-    hour = features['hour'].iloc[0]
-    
-    solar_pred = solar_model.predict(features)[0]
-    wind_pred = wind_model.predict(features)[0]
-    demand_pred = demand_model.predict(features)[0]
-    
-    if hour < 6 or hour > 19:
-        solar_pred = 0.0
-            
-    return max(0.0, solar_pred), max(0.0, wind_pred), max(0.0, demand_pred)
+def _stream_event(stream_format, event, data):
+    if stream_format == "sse":
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return json.dumps({"type": event, **data}) + "\n"
 
 
-# backend/app.py (Relevant section, make sure to replace only this part)
+# --- Startup timings ---
+_IMPORT_SECONDS = None
+_first_response_seconds = None
 
-@app.route("/api/status")
-def get_status():
-    settings = get_settings()
+def record_first_response():
+    """Called after each response; keeps the time from import to the first one."""
+    global _first_response_seconds
+    if _first_response_seconds is None:
+        _first_response_seconds = round(time.perf_counter() - _IMPORT_STARTED, 4)
+
+def get_startup_timings():
+    return {
+        "import_seconds": _IMPORT_SECONDS,
+        "import_to_first_response_seconds": _first_response_seconds,
+        "uptime_seconds": round(time.perf_counter() - _IMPORT_STARTED, 1),
+    }
+
+def build_health():
+    """/healthz: the process is up; model state is reported but not required."""
+    return {"status": "ok", "startup": get_startup_timings(), "models": get_model_state()}
+
+def build_readiness():
+    """/readyz: (payload, ready). Ready once the models are loaded."""
+    models = get_model_state()
+    return {"ready": models["models_loaded"], "models": models}, models["models_loaded"]
+
+@app.after_request
+def _track_first_response(response):
+    record_first_response()
+    return response
+
+# --- Metrics ---
+@app.before_request
+def _start_request_metrics():
+    g.metrics_started = time.perf_counter()
+    add_gauge("synapse_http_requests_in_flight", 1)
+
+@app.after_request
+def _record_request_metrics(response):
+    started = g.get('metrics_started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        observe("synapse_http_request_duration_seconds", time.perf_counter() - started,
+                route=route, method=request.method)
+        inc("synapse_http_requests_total", route=route, method=request.method, status=response.status_code)
+    return response
+
+@app.teardown_request
+def _end_request_metrics(exc):
+    if g.pop('metrics_started', None) is not None:
+        add_gauge("synapse_http_requests_in_flight", -1)
+
+@register_collector
+def _collect_app_metrics():
+    cache = get_prediction_cache_stats()
+    responses = get_response_cache_stats()
+    models = get_model_state()
+    events = get_event_log_stats()
+    telemetry_stats = get_telemetry_stats()
+    profile = get_profile(limit=0)
+    return [
+        ("synapse_prediction_cache_lookups_total", "counter", "Prediction cache lookups by result.",
+         [({"result": "hit"}, cache["hits"]), ({"result": "miss"}, cache["misses"])]),
+        ("synapse_prediction_cache_evictions_total", "counter", "Entries evicted from the prediction cache.",
+         [({}, cache["evictions"])]),
+        ("synapse_prediction_cache_entries", "gauge", "Entries in the prediction cache.", [({}, cache["size"])]),
+        ("synapse_response_cache_lookups_total", "counter", "Response cache lookups by result.",
+         [({"result": "hit"}, responses["hits"]), ({"result": "miss"}, responses["misses"])]),
+        ("synapse_response_not_modified_total", "counter", "Requests answered with 304 Not Modified.",
+         [({}, responses["not_modified"])]),
+        ("synapse_response_cache_bytes", "gauge", "Bytes of response bodies held in the cache.",
+         [({}, responses["bytes"])]),
+        ("synapse_models_loaded", "gauge", "1 if the forecasting models are loaded.",
+         [({}, models["models_loaded"])]),
+        ("synapse_event_log_events_total", "counter", "Event log entries by outcome.",
+         [({"outcome": "logged"}, events["logged"]), ({"outcome": "written"}, events["written"]),
+          ({"outcome": "dropped"}, events["dropped"])]),
+        ("synapse_event_log_queue_length", "gauge", "Events waiting for the log writer.", [({}, events["queued"])]),
+        ("synapse_telemetry_readings_total", "counter", "Telemetry readings by outcome.",
+         [({"outcome": "accepted"}, telemetry_stats["accepted"]),
+          ({"outcome": "dropped_out_of_order"}, telemetry_stats["dropped_out_of_order"])]),
+        ("synapse_status_feed_subscribers", "gauge", "Open /api/status/stream connections.",
+         [({}, get_subscriber_count())]),
+        ("synapse_profiler_running", "gauge", "1 while the sampling profiler is on.", [({}, profile["running"])]),
+    ]
+
+@app.route("/metrics")
+def metrics():
+    return Response(render_metrics(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+def build_profiler(args):
+    """/api/profiler GET: (body, mimetype); ?format=folded returns flame graph input."""
+    if args.get('format') == 'folded':
+        return get_folded_profile(), "text/plain"
+    try:
+        limit = int(args.get('limit', 50))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    return get_profile(limit), None
+
+def update_profiler(payload):
+    """
+    /api/profiler POST: {"enabled": bool, "interval_ms", "duration_seconds",
+    "reset"} starts or stops the sampling profiler. Raises ValueError.
+    """
+    if not isinstance(payload, dict) or not isinstance(payload.get('enabled'), bool):
+        raise ValueError("Body must be an object with a boolean 'enabled'")
+    if payload['enabled']:
+        try:
+            start_profiler(interval_seconds=float(payload.get('interval_ms', DEFAULT_INTERVAL_SECONDS * 1000)) / 1000,
+                           duration_seconds=float(payload.get('duration_seconds', 60)),
+                           reset=bool(payload.get('reset', True)))
+        except TypeError:
+            raise ValueError("interval_ms and duration_seconds must be numbers")
+    else:
+        stop_profiler()
+    return get_profile(limit=0)
+
+@app.route("/api/profiler", methods=['GET', 'POST'])
+def profiler():
+    try:
+        if request.method == 'POST':
+            return jsonify(update_profiler(request.get_json(silent=True)))
+        body, mimetype = build_profiler(request.args)
+        return Response(body, mimetype=mimetype) if mimetype else jsonify(body)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route("/healthz")
+def healthz():
+    return jsonify(build_health())
+
+@app.route("/readyz")
+def readyz():
+    payload, ready = build_readiness()
+    return jsonify(payload), (200 if ready else 503)
+
+
+def build_status_snapshot():
+    """Computes the /api/status payload for the current moment."""
+    with stage("status.settings"):
+        settings = get_settings()
     
-    solar_pred, wind_pred, demand_pred = make_predictions_for_time(datetime.now())
+    with stage("status.predict"):
+        solar_pred, wind_pred, demand_pred = make_predictions_for_time(datetime.now())
     
     solar_kwh = solar_pred * settings.get('solar_capacity_kw', 5.0)
     wind_kwh = wind_pred * settings.get('wind_capacity_kw', 2.0)
     demand_kwh = demand_pred 
+    battery_charge_kwh = settings.get('battery_current_charge_kwh', 5.0)
+    grid_kw = 0.0
+
+    # Fresh measurements from POST /api/telemetry replace the model / settings values
+    with stage("status.telemetry"):
+        measured = latest_readings()
+    if 'solar' in measured:
+        solar_kwh = measured['solar']['value']
+    if 'wind' in measured:
+        wind_kwh = measured['wind']['value']
+    if 'demand' in measured:
+        demand_kwh = measured['demand']['value']
+    if 'battery' in measured:
+        battery_charge_kwh = measured['battery']['value']
+    if 'grid' in measured:
+        grid_kw = measured['grid']['value']
+
+    timestep_minutes = settings.get('simulation_timestep_minutes', 60)
+    now = datetime.now()
+    with stage("status.tou"):
+        tou_prices = get_current_tou_prices(step_hour(now, timestep_minutes))
 
-    current_hour = datetime.now().hour
-    tou_prices = get_current_tou_prices(current_hour)
-
-    decision_output = make_decision(
-        current_solar_production=solar_kwh,
-        current_wind_production=wind_kwh,
-        current_demand=demand_kwh,
-        current_battery_charge=settings.get('battery_current_charge_kwh', 5.0), 
-        battery_capacity=settings.get('battery_capacity_kwh', 10.0), 
-        battery_min_reserve=settings.get('min_battery_reserve_user_percent', 20), 
-        buying_price_per_kwh=tou_prices['buying_price_per_kwh'],
-        selling_price_per_kwh=tou_prices['selling_price_per_kwh'],
-        operating_mode=settings.get('operating_mode', 'Cost Optimization') 
-    )
+    operating_mode = settings.get('operating_mode', 'Cost Optimization')
+    with stage("status.decide"):
+        if operating_mode == OPTIMAL_DISPATCH_MODE:
+            # Lookahead plan for the next 24h (solved once per hour); act on its first step
+            decision_output = current_dispatch_decision(dict(settings, battery_current_charge_kwh=battery_charge_kwh),
+                                                        get_settings_version())
+        else:
+            decision_output = make_decision(
+                current_solar_production=solar_kwh,
+                current_wind_production=wind_kwh,
+                current_demand=demand_kwh,
+                current_battery_charge=battery_charge_kwh, 
+                battery_capacity=settings.get('battery_capacity_kwh', 10.0), 
+                battery_min_reserve=settings.get('min_battery_reserve_user_percent', 20), 
+                buying_price_per_kwh=tou_prices['buying_price_per_kwh'],
+                selling_price_per_kwh=tou_prices['selling_price_per_kwh'],
+                operating_mode=operating_mode,
+                timestep_hours=timestep_minutes / 60,
+                **battery_params(settings)
+            )
+
+    with stage("status.log"):
+        log_event("DECISION", f"{decision_output['recommended_action']} ({operating_mode})", {
+            "inputs": {
+                "solar_kwh": solar_kwh,
+                "wind_kwh": wind_kwh,
+                "demand_kwh": demand_kwh,
+                "battery_charge_kwh": battery_charge_kwh,
+                "buying_price_per_kwh": tou_prices['buying_price_per_kwh'],
+                "selling_price_per_kwh": tou_prices['selling_price_per_kwh'],
+            },
+            "decision": decision_output,
+        })
     
     # --- NEW: Calculate Instantaneous Grid Dependence and Self-Sufficiency ---
     total_production_instant = solar_kwh + wind_kwh
@@ -140,9 +286,9 @@ def get_status():
         "live_data": {
             "solar": round(solar_kwh, 2),
             "wind": round(wind_kwh, 2),
-            "grid": 0.0, 
+            "grid": round(grid_kw, 2), 
             "home_demand": round(demand_kwh, 2),
-            "battery_level": round(settings.get('battery_current_charge_kwh', 5.0), 2)
+            "battery_level": round(battery_charge_kwh, 2)
         },
         "kpi": {
             "total_production": round(total_production_instant, 2), # Use calculated values
@@ -154,207 +300,489 @@ def get_status():
         "decision_engine_output": decision_output,
         "user_settings": settings 
     }
-    return jsonify(status_data)
-
-# ... (rest of app.py) ...
+    return status_data
+
+def json_response(payload, status=200):
+    """Like jsonify(), through the faster dumps_json() encoder."""
+    return Response(dumps_json(payload), status=status, content_type='application/json')
+
+def cached_json_response(key, render):
+    """
+    Serves the cached body for key (rendering it on a miss) with its ETag, or
+    304 Not Modified when the request's If-None-Match already has it.
+    """
+    body, etag = cached_response(key, render)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        record_not_modified()
+        return Response(status=304, headers=headers)
+    return Response(body, content_type='application/json', headers=headers)
 
-@app.route("/api/forecasts")
-def get_forecasts():
-    # This route will eventually be replaced or enhanced by /api/simulate for richer forecasts
+@app.route("/api/status")
+def get_status():
+    snapshot = build_status_snapshot()
+    with stage("status.serialize"):
+        return json_response(snapshot)
+
+@app.route("/api/status/stream")
+def stream_status():
+    """
+    Server-Sent Events feed of the status snapshot. One background producer
+    computes it per tick for all subscribers; clients get a full "snapshot"
+    event first and "delta" events with only the changed fields afterwards.
+    """
+    subscriber = subscribe_status_feed(build_status_snapshot)
+
+    def generate():
+        try:
+            while True:
+                message = next_status_message(subscriber, timeout=STATUS_FEED_KEEPALIVE_SECONDS)
+                if message is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                event, data = message
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        finally:
+            unsubscribe_status_feed(subscriber)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def build_forecasts(current_time=None):
+    """Computes the /api/forecasts payload: the next 24 hours from current_time (now)."""
+    current_time = current_time or datetime.now()
     forecast_data = {
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": current_time.isoformat(),
         "hourly_forecasts": []
     }
     
-    settings = get_settings()
-    current_time = datetime.now()
+    with stage("forecasts.settings"):
+        settings = get_settings()
 
-    for i in range(24):
-        forecast_hour_dt = current_time + timedelta(hours=i)
-        
-        forecast_solar_pred, forecast_wind_pred, forecast_demand_pred = \
-            make_predictions_for_time(forecast_hour_dt)
-        
-        forecast_solar_kwh = forecast_solar_pred * settings.get('solar_capacity_kw', 5.0)
-        forecast_wind_kwh = forecast_wind_pred * settings.get('wind_capacity_kw', 2.0)
-        
+    # One batched inference pass for the whole horizon
+    with stage("forecasts.predict"):
+        forecast_times, solar_preds, wind_preds, demand_preds = make_predictions_for_horizon(current_time, 24)
+    solar_kwh = np.maximum(solar_preds * settings.get('solar_capacity_kw', 5.0), 0.0)
+    wind_kwh = np.maximum(wind_preds * settings.get('wind_capacity_kw', 2.0), 0.0)
+
+    for i, forecast_hour_dt in enumerate(forecast_times):
         forecast_data["hourly_forecasts"].append({
             "hour": forecast_hour_dt.hour,
             "timestamp": forecast_hour_dt.isoformat(),
-            "solar_kwh": round(max(0.0, forecast_solar_kwh), 2),
-            "wind_kwh": round(max(0.0, forecast_wind_kwh), 2),
-            "demand_kwh": round(max(0.0, forecast_demand_pred), 2),
+            "solar_kwh": round(solar_kwh[i], 2),
+            "wind_kwh": round(wind_kwh[i], 2),
+            "demand_kwh": round(demand_preds[i], 2),
         })
-    
-    return jsonify(forecast_data)
+    return forecast_data
+
+def render_forecasts(current_time):
+    forecasts = build_forecasts(current_time)
+    with stage("forecasts.serialize"):
+        return dumps_json(forecasts)
+
+@app.route("/api/forecasts")
+def get_forecasts():
+    # This route will eventually be replaced or enhanced by /api/simulate for richer forecasts
+    # The forecast only changes with the hour (or settings / tariff / models): repeat polls are served
+    # from the response cache, stamped with the time the hour's payload was first computed
+    current_time = datetime.now()
+    key = response_key("forecasts", time_bucket(current_time))
+    return cached_json_response(key, lambda: render_forecasts(current_time))
+
+def parse_epoch(args, name):
+    """Optional query argument as epoch seconds; accepts epoch seconds or ISO 8601."""
+    value = args.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            raise ValueError(f"{name} must be epoch seconds or an ISO 8601 string")
+
+def build_logs(args):
+    """
+    /api/logs page, newest first. Query arguments: cursor (next_cursor of the
+    previous page), limit, type (comma-separated) and start/end.
+    """
+    try:
+        cursor = int(args['cursor']) if args.get('cursor') else None
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("cursor and limit must be integers")
+    types = [t.strip().upper() for t in args.get('type', '').split(',') if t.strip()]
+    return query_events(cursor=cursor, limit=limit, types=types or None,
+                        start=parse_epoch(args, 'start'), end=parse_epoch(args, 'end'))
+
+def log_settings_update(payload, settings):
+    changed = {key: settings[key] for key in payload if key in settings}
+    log_event("SETTINGS", "Settings updated: " + ", ".join(f"{k}={v}" for k, v in changed.items()), changed)
 
 @app.route("/api/logs")
 def get_logs():
-    mock_logs = [
-        {"timestamp": "2025-08-29 16:15:10", "type": "DECISION", "message": "Surplus solar detected. Prioritizing battery charging."},
-        {"timestamp": "2025-08-29 15:30:05", "type": "ACTION", "message": "EV charging complete."},
-        {"timestamp": "2025-08-29 14:05:45", "type": "ALERT", "message": "High consumption detected from AC unit."},
-        {"timestamp": "2025-08-29 13:00:00", "type": "ACTION", "message": "Started charging EV from 100% solar power."}
-    ]
-    return jsonify(mock_logs)
+    try:
+        return jsonify(build_logs(request.args))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
 @app.route("/api/settings", methods=['GET', 'POST'])
 def handle_settings():
-    settings_filepath = os.path.join(os.path.dirname(__file__), 'data', 'settings.json')
-    
     if request.method == 'GET':
         settings = get_settings() 
         return jsonify(settings)
 
     elif request.method == 'POST':
         new_settings_payload = request.json
-        settings = get_settings() 
 
-        valid_settings = {
-            "solar_capacity_kw": {'type': float, 'min': 0.0},
-            "wind_capacity_kw": {'type': float, 'min': 0.0},
-            "battery_capacity_kwh": {'type': float, 'min': 0.0},
-            "battery_current_charge_kwh": {'type': float, 'min': 0.0}, # This would typically not be user-editable
-            "battery_min_reserve_percent": {'type': int, 'min': 0, 'max': 100},
-            "allow_grid_charge": {'type': bool},
-            "operating_mode": {'type': str, 'options': ["Cost Optimization", "Self-Sufficiency", "Environmental"]},
-            "min_battery_reserve_user_percent": {'type': int, 'min': 0, 'max': 100}
-        }
-        
-        updated = False
-        for key, value in new_settings_payload.items():
-            if key in valid_settings:
-                try:
-                    expected_type = valid_settings[key]['type']
-                    converted_value = expected_type(value)
-
-                    if 'options' in valid_settings[key] and converted_value not in valid_settings[key]['options']:
-                        return jsonify({"error": f"Invalid option for {key}: {value}"}), 400
-                    if 'min' in valid_settings[key] and converted_value < valid_settings[key]['min']:
-                        return jsonify({"error": f"{key} must be at least {valid_settings[key]['min']}"}), 400
-                    if 'max' in valid_settings[key] and converted_value > valid_settings[key]['max']:
-                        return jsonify({"error": f"{key} must be at most {valid_settings[key]['max']}"}), 400
-                    
-                    settings[key] = converted_value
-                    updated = True
-                except (ValueError, TypeError):
-                    return jsonify({"error": f"Invalid type or format for {key}: expected {valid_settings[key]['type'].__name__}"}), 400
-            else:
-                print(f"Warning: Attempted to update unknown setting key: {key}") 
+        try:
+            settings, updated = update_settings(new_settings_payload)
+        except SettingsValidationError as e:
+            return jsonify({"error": str(e)}), 400
+        except IOError as e:
+            return jsonify({"error": f"Could not write settings: {e}"}), 500
 
         if updated:
-            try:
-                with open(settings_filepath, 'w') as f:
-                    json.dump(settings, f, indent=4)
-                return jsonify({"message": "Settings updated successfully", "new_settings": settings}), 200
-            except IOError as e:
-                return jsonify({"error": f"Could not write settings: {e}"}), 500
+            log_settings_update(new_settings_payload, settings)
+            return jsonify({"message": "Settings updated successfully", "new_settings": settings}), 200
         else:
             return jsonify({"message": "No valid settings provided for update", "current_settings": settings}), 400
 
-# --- NEW: Simulation Endpoint ---
-@app.route("/api/simulate")
-def get_simulation():
-    settings = get_settings()
-    
-    sim_data = {
-        "timestamp_start": datetime.now().isoformat(),
-        "simulation_duration_hours": 24,
-        "hourly_results": [],
-        "summary": {
-            "total_grid_import_kwh": 0.0,
-            "total_grid_export_kwh": 0.0,
-            "net_grid_cost": 0.0,
-            "final_battery_charge_kwh": 0.0
-        }
-    }
+# --- Prediction cache / model management ---
+@app.route("/api/cache/stats")
+def get_cache_stats():
+    return jsonify({"predictions": get_prediction_cache_stats(), "responses": get_response_cache_stats()})
+
+@app.route("/api/models/reload", methods=['POST'])
+def reload_models():
+    loaded = load_models()
+    log_event("SYSTEM", "Models reloaded" if loaded else "Model reload failed", get_model_state())
+    return jsonify({"models_loaded": loaded, "predictions": get_prediction_cache_stats()}), (200 if loaded else 503)
+
+# --- Measured telemetry ---
+def ingest_telemetry(payload):
+    """Accepts {"samples": [...]} or a single sample object. Raises ValueError."""
+    if isinstance(payload, dict) and 'samples' in payload:
+        return ingest_samples(payload['samples'])
+    if isinstance(payload, dict):
+        return ingest_samples([payload])
+    raise ValueError("Body must be a sample object or {\"samples\": [...]}")
+
+def build_telemetry_series(args):
+    return query_series(args.get('signal', ''), args.get('resolution', 'raw'),
+                        parse_epoch(args, 'start'), parse_epoch(args, 'end'))
+
+@app.route("/api/telemetry", methods=['GET', 'POST'])
+def telemetry():
+    try:
+        if request.method == 'POST':
+            return jsonify(ingest_telemetry(request.get_json(silent=True)))
+        return jsonify(build_telemetry_series(request.args))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route("/api/telemetry/latest")
+def telemetry_latest():
+    return jsonify({"readings": latest_readings(max_age_seconds=None), "stats": get_telemetry_stats()})
+
+# --- Historical data (renewable_power_data.csv) ---
+def build_history(args):
+    """
+    /api/history payload from query arguments: start, end (YYYY-MM-DD),
+    columns (comma-separated) and resolution (daily | monthly | yearly).
+    Raises ValueError on invalid arguments.
+    """
+    columns = [c.strip() for c in args.get('columns', '').split(',') if c.strip()]
+    return query_history(start=args.get('start'), end=args.get('end'), columns=columns or None,
+                         resolution=args.get('resolution', 'daily'))
+
+@app.route("/api/history")
+def get_history():
+    try:
+        return jsonify(build_history(request.args))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+# --- Historical backtest ---
+def build_backtest(payload):
+    """Runs /api/backtest for a JSON payload. Raises ValueError/TypeError on invalid input."""
+    modes = payload.get('operating_modes')
+    if modes is not None and not isinstance(modes, list):
+        raise ValueError("operating_modes must be a list")
+    household = payload.get('household') or {}
+    if not isinstance(household, dict):
+        raise ValueError("household must be an object of settings")
+    return run_backtest(
+        start=payload.get('start'),
+        end=payload.get('end'),
+        operating_modes=modes,
+        household=household,
+        resolution=payload.get('resolution', 'monthly'),
+        daily_demand_kwh=float(payload.get('daily_demand_kwh', DEFAULT_DAILY_DEMAND_KWH)),
+        workers=payload.get('workers')
+    )
+
+@app.route("/api/backtest", methods=['POST'])
+def backtest():
+    try:
+        return jsonify(build_backtest(request.json or {}))
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
 
+# --- NEW: Simulation Endpoint ---
+def simulation_steps(settings, hours):
+    """
+    Returns:
+        tuple: (timestep_minutes, steps) for simulating `hours` hours at the
+        settings' "simulation_timestep_minutes" resolution.
+    """
+    timestep_minutes = int(settings.get('simulation_timestep_minutes', 60))
+    return timestep_minutes, hours * 60 // timestep_minutes
+
+def iter_simulation(settings, start_time, hours, chunk_hours=SIMULATION_CHUNK_HOURS):
+    """
+    Simulates `hours` hours from `start_time`, yielding each step's result dict
+    as soon as its chunk is computed and the summary dict last.
+
+    Steps are "simulation_timestep_minutes" long (hourly by default). Predicted
+    values and decision flows are average kW over the step; costs are per step
+    and the summary totals are energy and cost over the whole horizon.
+
+    Forecasts and the battery recurrence run chunk by chunk (the charge is
+    carried across chunks), so memory stays flat however long the horizon is.
+    "Optimal Dispatch" plans the whole horizon at once, as it needs lookahead.
+    """
     current_battery_charge_kwh = settings.get('battery_current_charge_kwh', 5.0)
     battery_capacity_kwh = settings.get('battery_capacity_kwh', 10.0)
     solar_capacity_kw = settings.get('solar_capacity_kw', 5.0)
     wind_capacity_kw = settings.get('wind_capacity_kw', 2.0)
     operating_mode = settings.get('operating_mode', 'Cost Optimization')
     min_battery_reserve_user_percent = settings.get('min_battery_reserve_user_percent', 20)
-    
+    actual_min_reserve_kwh = round((min_battery_reserve_user_percent / 100) * battery_capacity_kwh, 2)
+    timestep_minutes, steps = simulation_steps(settings, hours)
+    timestep_hours = timestep_minutes / 60
+    chunk_steps = chunk_hours * 60 // timestep_minutes
+    if operating_mode == OPTIMAL_DISPATCH_MODE:
+        chunk_steps = steps
+
     total_grid_import_kwh = 0.0
     total_grid_export_kwh = 0.0
     net_grid_cost = 0.0
 
-    current_time = datetime.now()
-    for i in range(24): # Simulate for the next 24 hours
-        forecast_hour_dt = current_time + timedelta(hours=i)
-        
-        # 1. Get predictions for this hour
-        forecast_solar_pred, forecast_wind_pred, forecast_demand_pred = \
-            make_predictions_for_time(forecast_hour_dt)
-        
-        forecast_solar_kwh = forecast_solar_pred * solar_capacity_kw
-        forecast_wind_kwh = forecast_wind_pred * wind_capacity_kw
-        forecast_demand_kwh = forecast_demand_pred # Model should output kWh for the hour
-
-        # 2. Get TOU prices for this hour
-        tou_prices = get_current_tou_prices(forecast_hour_dt.hour)
-
-        # 3. Run the decision engine for this hour
-        decision_output = make_decision(
-            current_solar_production=forecast_solar_kwh,
-            current_wind_production=forecast_wind_kwh,
-            current_demand=forecast_demand_kwh,
-            current_battery_charge=current_battery_charge_kwh, # Use the dynamic charge level
-            battery_capacity=battery_capacity_kwh,
+    for chunk_start in range(0, steps, chunk_steps):
+        chunk_len = min(chunk_steps, steps - chunk_start)
+
+        # 1. Get predictions for the chunk in one batched pass (interpolated below an hour)
+        forecast_times, solar_preds, wind_preds, demand_preds = make_predictions_for_steps(
+            start_time + timedelta(minutes=chunk_start * timestep_minutes), chunk_len, timestep_minutes)
+        forecast_solar_kwh = solar_preds * solar_capacity_kw
+        forecast_wind_kwh = wind_preds * wind_capacity_kw
+        forecast_demand_kwh = demand_preds # Model should output kWh for the hour
+
+        # 2. Get TOU prices for each step (the schedule repeats daily)
+        buying_prices, selling_prices = get_step_price_arrays(forecast_times, timestep_minutes)
+
+        # 3. Run the decision engine and battery recurrence over the chunk
+        result = simulate_battery(
+            forecast_solar_kwh, forecast_wind_kwh, forecast_demand_kwh, buying_prices, selling_prices,
+            initial_charge_kwh=current_battery_charge_kwh,
+            battery_capacity_kwh=battery_capacity_kwh,
             battery_min_reserve=min_battery_reserve_user_percent,
-            buying_price_per_kwh=tou_prices['buying_price_per_kwh'],
-            selling_price_per_kwh=tou_prices['selling_price_per_kwh'],
-            operating_mode=operating_mode
+            operating_mode=operating_mode,
+            allow_grid_charge=settings.get('allow_grid_charge', True),
+            timestep_hours=timestep_hours,
+            **battery_params(settings)
         )
+        current_battery_charge_kwh = result["final_battery_charge_kwh"]
+
+        # 4. Emit per-step results (rounded column-wise, then converted to plain lists)
+        flows = result["flows"].tolist()
+        actions = [ACTION_NAMES[code] for code in result["action_codes"].tolist()]
+        solar_out = np.round(forecast_solar_kwh, 2).tolist()
+        wind_out = np.round(forecast_wind_kwh, 2).tolist()
+        demand_out = np.round(forecast_demand_kwh, 2).tolist()
+        charge_out = np.round(result["battery_charge_kwh"], 2).tolist()
+        step_cost = result["step_cost"].tolist()
+        buying_out = buying_prices.tolist()
+        selling_out = selling_prices.tolist()
+
+        for i, forecast_hour_dt in enumerate(forecast_times):
+            decision_output = dict(zip(FLOW_KEYS, flows[i]))
+            decision_output["recommended_action"] = actions[i]
+            decision_output["current_operating_mode"] = operating_mode
+            decision_output["actual_min_reserve_kwh"] = actual_min_reserve_kwh
+
+            total_grid_import_kwh += flows[i][3] * timestep_hours
+            total_grid_export_kwh += flows[i][4] * timestep_hours
+            net_grid_cost += step_cost[i]
+
+            yield {
+                "hour": forecast_hour_dt.hour,
+                "timestamp": forecast_hour_dt.isoformat(),
+                "step_label": forecast_hour_dt.strftime('%H:%M'),
+                "predicted_solar_kwh": solar_out[i],
+                "predicted_wind_kwh": wind_out[i],
+                "predicted_demand_kwh": demand_out[i],
+                "tou_prices": {"buying_price_per_kwh": buying_out[i], "selling_price_per_kwh": selling_out[i]},
+                "decision": decision_output,
+                "simulated_battery_charge_kwh_end_of_step": charge_out[i],
+                "step_net_cost": round(np.float64(step_cost[i]), 2)
+            }
+
+    yield {
+        "total_grid_import_kwh": round(np.float64(total_grid_import_kwh), 2),
+        "total_grid_export_kwh": round(np.float64(total_grid_export_kwh), 2),
+        "net_grid_cost": round(np.float64(net_grid_cost), 2),
+        "final_battery_charge_kwh": round(np.float64(current_battery_charge_kwh), 2)
+    }
+
+def build_simulation(settings, start_time, hours):
+    """Collects iter_simulation() into the non-streamed /api/simulate payload."""
+    timestep_minutes, steps = simulation_steps(settings, hours)
+    sim_data = {
+        "timestamp_start": start_time.isoformat(),
+        "simulation_duration_hours": hours,
+        "timestep_minutes": timestep_minutes,
+        "step_results": [],
+        "summary": {}
+    }
+    results = iter_simulation(settings, start_time, hours)
+    for _ in range(steps):
+        sim_data["step_results"].append(next(results))
+    sim_data["summary"] = next(results)
+    return sim_data
+
+def _simulation_stream_format():
+    # ?stream=ndjson|sse wins over the Accept header
+    requested = request.args.get('stream', '').lower()
+    if requested in STREAM_FORMATS:
+        return requested
+    accept = request.accept_mimetypes
+    for fmt, mimetype in STREAM_FORMATS.items():
+        if accept.best == mimetype:
+            return fmt
+    return None
+
+@app.route("/api/simulate")
+def get_simulation():
+    hours = request.args.get('hours', default=24, type=int)
+    if hours is None or not 1 <= hours <= MAX_SIMULATION_HOURS:
+        return jsonify({"error": f"hours must be an integer between 1 and {MAX_SIMULATION_HOURS}"}), 400
+
+    current_time = datetime.now()
+    # Key before settings: a settings change racing with this request makes the next poll miss, never stale
+    timestep_minutes, _ = simulation_steps(get_settings(), hours)
+    key = response_key("simulate", time_bucket(current_time, timestep_minutes), hours)
+    settings = get_settings()
+    stream_format = _simulation_stream_format()
+
+    if stream_format:
+        def generate():
+            timestep_minutes, steps = simulation_steps(settings, hours)
+            header = {"timestamp_start": current_time.isoformat(), "simulation_duration_hours": hours,
+                      "timestep_minutes": timestep_minutes}
+            results = iter_simulation(settings, current_time, hours)
+            yield _stream_event(stream_format, "start", header)
+            for i, item in enumerate(results):
+                yield _stream_event(stream_format, "step" if i < steps else "summary", item)
+
+        return Response(stream_with_context(generate()), mimetype=STREAM_FORMATS[stream_format],
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    # Cached per simulation step; the payload is the one computed first in the step
+    return cached_json_response(key, lambda: dumps_json(build_simulation(settings, current_time, hours)))
+
+# --- Probabilistic (Monte Carlo) simulation ---
+def build_monte_carlo(settings, start_time, args):
+    """
+    /api/simulate/montecarlo payload from query arguments: hours, scenarios
+    and seed. Raises ValueError on invalid arguments.
+    """
+    try:
+        hours = int(args.get('hours', 24))
+        scenarios = int(args.get('scenarios', DEFAULT_SCENARIOS))
+        seed = int(args['seed']) if args.get('seed') not in (None, '') else None
+    except ValueError:
+        raise ValueError("hours, scenarios and seed must be integers")
+    if not 1 <= hours <= MAX_SIMULATION_HOURS:
+        raise ValueError(f"hours must be an integer between 1 and {MAX_SIMULATION_HOURS}")
+    return run_monte_carlo(settings, start_time, hours, scenarios, seed)
+
+@app.route("/api/simulate/montecarlo")
+def monte_carlo_simulation():
+    try:
+        return jsonify(build_monte_carlo(get_settings(), datetime.now(), request.args))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+# --- Multi-household batch simulation ---
+@app.route("/api/simulate/batch", methods=['POST'])
+def batch_simulation():
+    payload = request.json or {}
+    households = payload.get('households')
+    hours = payload.get('hours', 24)
+    if not isinstance(households, list) or not households:
+        return jsonify({"error": "households must be a non-empty list of household configs"}), 400
+    if isinstance(hours, bool) or not isinstance(hours, int) or not 1 <= hours <= MAX_SIMULATION_HOURS:
+        return jsonify({"error": f"hours must be an integer between 1 and {MAX_SIMULATION_HOURS}"}), 400
+
+    try:
+        configs = [normalize_household_config(household, i) for i, household in enumerate(households)]
+    except SettingsValidationError as e:
+        return jsonify({"error": str(e)}), 400
+
+    workers = payload.get('workers')
+    chunk_size = payload.get('chunk_size', DEFAULT_CHUNK_SIZE)
+    # bool is an int subclass, so true/false would pass as 1/0
+    if (workers is not None and (isinstance(workers, bool) or not isinstance(workers, int) or workers < 1)) or \
+            isinstance(chunk_size, bool) or not isinstance(chunk_size, int) or chunk_size < 1:
+        return jsonify({"error": "workers and chunk_size must be positive integers"}), 400
+
+    timestep_minutes, _ = simulation_steps(get_settings(), hours)
+    forecast = build_shared_forecast(datetime.now(), hours, timestep_minutes)
+
+    # One NDJSON line per household as chunks finish, then a final summary line
+    def generate():
+        count = 0
+        for summary in run_batch_simulation(configs, forecast, workers, chunk_size):
+            count += 1
+            yield json.dumps(summary) + "\n"
+        yield json.dumps({"done": True, "households": count, "timestamp_start": forecast["timestamp_start"],
+                          "simulation_duration_hours": hours}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+# --- Battery / PV sizing sweep ---
+@app.route("/api/sweep", methods=['POST'])
+def sizing_sweep():
+    payload = request.json or {}
+    settings = get_settings()
+    try:
+        result = run_sweep(
+            battery_capacities=payload.get('battery_capacity_kwh', [settings['battery_capacity_kwh']]),
+            solar_capacities=payload.get('solar_capacity_kw', [settings['solar_capacity_kw']]),
+            wind_capacities=payload.get('wind_capacity_kw', [settings['wind_capacity_kw']]),
+            operating_modes=payload.get('operating_mode', [settings['operating_mode']]),
+            hours=int(payload.get('hours', 24)),
+            workers=payload.get('workers'),
+            prune=bool(payload.get('prune', True)),
+            unit_costs=payload.get('unit_costs')
+        )
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result)
 
-        # 4. Update battery charge for the next hour's simulation
-        # Net change = power_to_battery - power_from_battery
-        # Assuming 1-hour time steps, kWh directly represents change
-        current_battery_charge_kwh += decision_output['power_to_battery'] 
-        current_battery_charge_kwh -= decision_output['power_from_battery']
-        
-        # Ensure battery charge stays within physical limits
-        current_battery_charge_kwh = max(0, min(current_battery_charge_kwh, battery_capacity_kwh))
-        
-        # 5. Calculate costs/benefits for this hour
-        hourly_cost = (decision_output['power_from_grid'] * tou_prices['buying_price_per_kwh']) - \
-                      (decision_output['power_to_grid'] * tou_prices['selling_price_per_kwh'])
-        
-        total_grid_import_kwh += decision_output['power_from_grid']
-        total_grid_export_kwh += decision_output['power_to_grid']
-        net_grid_cost += hourly_cost
-
-        # 6. Store hourly results
-        hourly_result = {
-            "hour": forecast_hour_dt.hour,
-            "timestamp": forecast_hour_dt.isoformat(),
-            "predicted_solar_kwh": round(forecast_solar_kwh, 2),
-            "predicted_wind_kwh": round(forecast_wind_kwh, 2),
-            "predicted_demand_kwh": round(forecast_demand_kwh, 2),
-            "tou_prices": tou_prices,
-            "decision": decision_output,
-            "simulated_battery_charge_kwh_end_of_hour": round(current_battery_charge_kwh, 2),
-            "hourly_net_cost": round(hourly_cost, 2)
-        }
-        sim_data["hourly_results"].append(hourly_result)
-    
-    # Update summary
-    sim_data["summary"]["total_grid_import_kwh"] = round(total_grid_import_kwh, 2)
-    sim_data["summary"]["total_grid_export_kwh"] = round(total_grid_export_kwh, 2)
-    sim_data["summary"]["net_grid_cost"] = round(net_grid_cost, 2)
-    sim_data["summary"]["final_battery_charge_kwh"] = round(current_battery_charge_kwh, 2)
 
-    return jsonify(sim_data)
+_IMPORT_SECONDS = round(time.perf_counter() - _IMPORT_STARTED, 4)
 
 
 if __name__ == '__main__':
-    if solar_model is None or wind_model is None or demand_model is None:
+    if not ensure_models_loaded():
         print("Warning: One or more models failed to load. Predictions will return zeros.")
 
-    data_dir = os.path.join(os.path.dirname(__file__), 'data')
-    if not os.path.exists(data_dir):
-        os.makedirs(data_dir)
     get_settings() 
 
     app.run(debug=True, port=5000)
\ No newline at end of file
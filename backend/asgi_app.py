@@ -0,0 +1,518 @@
+# backend/asgi_app.py
+#
+# ASGI serving mode: the same /api/* contract as app.py with async handlers.
+#
+#   uvicorn asgi_app:app --port 5000
+#   python asgi_app.py --port 5000 --workers 4
+#
+# The second form loads the models once and forks the workers from that
+# process, so they share one physical copy of the models.
+
+import os
+import json
+import time
+import socket
+import asyncio
+import argparse
+import itertools
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse, PlainTextResponse
+from starlette.background import BackgroundTask
+
+from app import (build_status_snapshot, build_simulation, iter_simulation, build_logs, log_settings_update,
+                 build_health, build_readiness, build_history, build_backtest, build_profiler, update_profiler,
+                 build_monte_carlo, simulation_steps, render_forecasts,
+                 ingest_telemetry, build_telemetry_series, record_first_response, _stream_event, STREAM_FORMATS,
+                 SIMULATION_CHUNK_HOURS)
+from simulation import MAX_SIMULATION_HOURS
+from batch_simulation import normalize_household_config, build_shared_forecast, run_batch_simulation, DEFAULT_CHUNK_SIZE
+from sizing import run_sweep
+from status_feed import subscribe_status_feed, unsubscribe_status_feed, next_status_message, STATUS_FEED_KEEPALIVE_SECONDS
+from settings_store import get_settings, update_settings, SettingsValidationError
+from response_cache import (dumps_json, cached_response, peek_response, response_key, time_bucket, etag_matches,
+                            record_not_modified, get_response_cache_stats, CACHE_CONTROL)
+from telemetry import latest_readings, get_telemetry_stats
+from event_log import log_event
+from metrics import stage, observe, inc, add_gauge, register_collector, render_metrics, PROMETHEUS_CONTENT_TYPE
+from forecasting import load_models, start_model_warmup, get_model_state, get_prediction_cache_stats
+
+# Cheap requests (status, forecasts, settings) and heavy ones (simulate, batch,
+# sweep) run on separate bounded executors, so a burst of long simulations
+# queues behind itself instead of starving /api/status.
+FAST_EXECUTOR_WORKERS = 4
+HEAVY_EXECUTOR_WORKERS = 2
+
+# Heavy requests beyond this many (running + waiting) are rejected with 503
+MAX_PENDING_HEAVY_REQUESTS = 16
+
+STATUS_FEED_POLL_SECONDS = 0.25
+
+_fast_executor = ThreadPoolExecutor(max_workers=FAST_EXECUTOR_WORKERS, thread_name_prefix="api-fast")
+_heavy_executor = ThreadPoolExecutor(max_workers=HEAVY_EXECUTOR_WORKERS, thread_name_prefix="api-heavy")
+_pending_heavy = 0
+
+app = FastAPI(title="SynapseHome API")
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+
+_STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def _json(data, status_code=200):
+    # Same encoding as the Flask app (sorted keys, compact separators)
+    return Response(dumps_json(data), status_code=status_code, media_type="application/json")
+
+def _cached_json(request, entry):
+    """Response for a response-cache (body, etag) entry, or 304 if the client already has it."""
+    body, etag = entry
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        record_not_modified()
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+async def _run(executor, fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+
+class _HeavySlot:
+    """
+    Counts a heavy request from admission until its response is fully sent.
+    release() is idempotent: streamed responses release from the generator and
+    again from a background task, which also runs if the client disconnected.
+    """
+
+    def __init__(self):
+        self.released = False
+
+    def release(self):
+        global _pending_heavy
+        if not self.released:
+            self.released = True
+            _pending_heavy -= 1
+
+def _acquire_heavy_slot():
+    global _pending_heavy
+    if _pending_heavy >= MAX_PENDING_HEAVY_REQUESTS:
+        return None
+    _pending_heavy += 1
+    return _HeavySlot()
+
+def _busy():
+    return _json({"error": "Server is busy with other simulations, please retry shortly"}, 503)
+
+async def _stream_from_executor(iterator, slot, batch_size):
+    """
+    Drains a blocking iterator on the heavy executor `batch_size` items at a
+    time, yielding them to the event loop as they are produced.
+    """
+    try:
+        while True:
+            batch = await _run(_heavy_executor, lambda: list(itertools.islice(iterator, batch_size)))
+            if not batch:
+                return
+            for item in batch:
+                yield item
+    finally:
+        slot.release()
+
+async def _read_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+class _FirstResponseMiddleware:
+    """Plain ASGI middleware (keeps streaming intact) feeding the /healthz startup timings."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        async def send_and_record(message):
+            if message["type"] == "http.response.start":
+                record_first_response()
+            await send(message)
+        await self.app(scope, receive, send_and_record)
+
+class _MetricsMiddleware:
+    """
+    Request duration (until the response headers are sent, like the Flask
+    hooks), request counts by route template and the in-flight gauge.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        recorded = False
+
+        def record(status):
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            observe("synapse_http_request_duration_seconds", time.perf_counter() - started,
+                    route=path, method=scope["method"])
+            inc("synapse_http_requests_total", route=path, method=scope["method"], status=status)
+
+        async def send_and_record(message):
+            nonlocal recorded
+            if message["type"] == "http.response.start" and not recorded:
+                recorded = True
+                record(message["status"])
+            await send(message)
+
+        add_gauge("synapse_http_requests_in_flight", 1)
+        try:
+            await self.app(scope, receive, send_and_record)
+        finally:
+            add_gauge("synapse_http_requests_in_flight", -1)
+            if not recorded:
+                record(500)
+
+app.add_middleware(_FirstResponseMiddleware)
+app.add_middleware(_MetricsMiddleware)
+
+@register_collector
+def _collect_executor_metrics():
+    return [("synapse_heavy_requests_pending", "gauge", "Heavy requests running or waiting for an executor.",
+             [({}, _pending_heavy)])]
+
+@app.get("/metrics")
+async def metrics():
+    return Response(render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.get("/api/profiler")
+async def get_profiler(request: Request):
+    try:
+        body, mimetype = build_profiler(request.query_params)
+    except ValueError as e:
+        return _json({"error": str(e)}, 400)
+    return PlainTextResponse(body) if mimetype else _json(body)
+
+@app.post("/api/profiler")
+async def post_profiler(request: Request):
+    try:
+        return _json(await _run(_fast_executor, update_profiler, await _read_json(request)))
+    except ValueError as e:
+        return _json({"error": str(e)}, 400)
+
+@app.get("/healthz")
+async def healthz():
+    return _json(build_health())
+
+@app.get("/readyz")
+async def readyz():
+    payload, ready = build_readiness()
+    return _json(payload, 200 if ready else 503)
+
+@app.get("/api/status")
+async def get_status():
+    snapshot = await _run(_fast_executor, build_status_snapshot)
+    with stage("status.serialize"):
+        return _json(snapshot)
+
+@app.get("/api/status/stream")
+async def stream_status(request: Request):
+    subscriber = subscribe_status_feed(build_status_snapshot)
+
+    async def generate():
+        loop = asyncio.get_running_loop()
+        last_sent = loop.time()
+        try:
+            while not await request.is_disconnected():
+                message = next_status_message(subscriber, timeout=0)
+                if message is not None:
+                    event, data = message
+                    last_sent = loop.time()
+                    yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+                    continue
+                if loop.time() - last_sent >= STATUS_FEED_KEEPALIVE_SECONDS:
+                    last_sent = loop.time()
+                    yield ": keep-alive\n\n"
+                await asyncio.sleep(STATUS_FEED_POLL_SECONDS)
+        finally:
+            unsubscribe_status_feed(subscriber)
+
+    return StreamingResponse(generate(), media_type="text/event-stream", headers=_STREAM_HEADERS)
+
+@app.get("/api/forecasts")
+async def get_forecasts(request: Request):
+    current_time = datetime.now()
+    key = response_key("forecasts", time_bucket(current_time))
+    entry = peek_response(key) or await _run(_fast_executor, cached_response, key,
+                                             lambda: render_forecasts(current_time))
+    return _cached_json(request, entry)
+
+@app.get("/api/logs")
+async def get_logs(request: Request):
+    try:
+        return _json(await _run(_fast_executor, build_logs, request.query_params))
+    except ValueError as e:
+        return _json({"error": str(e)}, 400)
+
+@app.get("/api/settings")
+async def get_settings_async():
+    return _json(get_settings())
+
+@app.post("/api/settings")
+async def post_settings(request: Request):
+    payload = await _read_json(request)
+    if not isinstance(payload, dict):
+        return _json({"error": "Request body must be a JSON object"}, 400)
+    try:
+        settings, updated = await _run(_fast_executor, update_settings, payload)
+    except SettingsValidationError as e:
+        return _json({"error": str(e)}, 400)
+    except IOError as e:
+        return _json({"error": f"Could not write settings: {e}"}, 500)
+
+    if updated:
+        log_settings_update(payload, settings)
+        return _json({"message": "Settings updated successfully", "new_settings": settings})
+    return _json({"message": "No valid settings provided for update", "current_settings": settings}, 400)
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    return _json({"predictions": get_prediction_cache_stats(), "responses": get_response_cache_stats()})
+
+@app.post("/api/models/reload")
+async def reload_models():
+    loaded = await _run(_heavy_executor, load_models)
+    log_event("SYSTEM", "Models reloaded" if loaded else "Model reload failed", get_model_state())
+    return _json({"models_loaded": loaded, "predictions": get_prediction_cache_stats()}, 200 if loaded else 503)
+
+@app.post("/api/telemetry")
+async def post_telemetry(request: Request):
+    try:
+        return _json(await _run(_fast_executor, ingest_telemetry, await _read_json(request)))
+    except ValueError as e:
+        return _json({"error": str(e)}, 400)
+
+@app.get("/api/telemetry")
+async def get_telemetry(request: Request):
+    try:
+        return _json(build_telemetry_series(request.query_params))
+    except ValueError as e:
+        return _json({"error": str(e)}, 400)
+
+@app.get("/api/telemetry/latest")
+async def telemetry_latest():
+    return _json({"readings": latest_readings(max_age_seconds=None), "stats": get_telemetry_stats()})
+
+@app.get("/api/history")
+async def get_history(request: Request):
+    try:
+        return _json(await _run(_fast_executor, build_history, request.query_params))
+    except ValueError as e:
+        return _json({"error": str(e)}, 400)
+
+def _simulation_stream_format(request):
+    requested = request.query_params.get('stream', '').lower()
+    if requested in STREAM_FORMATS:
+        return requested
+    accept = request.headers.get('accept', '')
+    for fmt, mimetype in STREAM_FORMATS.items():
+        if accept.split(',')[0].split(';')[0].strip() == mimetype:
+            return fmt
+    return None
+
+@app.get("/api/simulate")
+async def get_simulation(request: Request):
+    try:
+        hours = int(request.query_params.get('hours', 24))
+    except ValueError:
+        hours = None
+    if hours is None or not 1 <= hours <= MAX_SIMULATION_HOURS:
+        return _json({"error": f"hours must be an integer between 1 and {MAX_SIMULATION_HOURS}"}, 400)
+
+    current_time = datetime.now()
+    timestep_minutes, _ = simulation_steps(get_settings(), hours)
+    key = response_key("simulate", time_bucket(current_time, timestep_minutes), hours)
+    settings = get_settings()
+    stream_format = _simulation_stream_format(request)
+
+    # Cache hits skip the heavy executor (and its admission limit) altogether
+    entry = None if stream_format else peek_response(key)
+    if entry is not None:
+        return _cached_json(request, entry)
+
+    slot = _acquire_heavy_slot()
+    if slot is None:
+        return _busy()
+
+    if stream_format:
+        async def generate():
+            timestep_minutes, steps = simulation_steps(settings, hours)
+            yield _stream_event(stream_format, "start",
+                                {"timestamp_start": current_time.isoformat(), "simulation_duration_hours": hours,
+                                 "timestep_minutes": timestep_minutes})
+            results = iter_simulation(settings, current_time, hours)
+            i = 0
+            async for item in _stream_from_executor(results, slot, SIMULATION_CHUNK_HOURS):
+                yield _stream_event(stream_format, "step" if i < steps else "summary", item)
+                i += 1
+
+        return StreamingResponse(generate(), media_type=STREAM_FORMATS[stream_format], headers=_STREAM_HEADERS,
+                                 background=BackgroundTask(slot.release))
+
+    try:
+        entry = await _run(_heavy_executor, cached_response, key,
+                           lambda: dumps_json(build_simulation(settings, current_time, hours)))
+        return _cached_json(request, entry)
+    finally:
+        slot.release()
+
+@app.get("/api/simulate/montecarlo")
+async def monte_carlo_simulation(request: Request):
+    slot = _acquire_heavy_slot()
+    if slot is None:
+        return _busy()
+    try:
+        return _json(await _run(_heavy_executor, build_monte_carlo, get_settings(), datetime.now(),
+                                request.query_params))
+    except ValueError as e:
+        return _json({"error": str(e)}, 400)
+    finally:
+        slot.release()
+
+@app.post("/api/simulate/batch")
+async def batch_simulation(request: Request):
+    payload = await _read_json(request) or {}
+    households = payload.get('households')
+    hours = payload.get('hours', 24)
+    if not isinstance(households, list) or not households:
+        return _json({"error": "households must be a non-empty list of household configs"}, 400)
+    if isinstance(hours, bool) or not isinstance(hours, int) or not 1 <= hours <= MAX_SIMULATION_HOURS:
+        return _json({"error": f"hours must be an integer between 1 and {MAX_SIMULATION_HOURS}"}, 400)
+
+    try:
+        configs = [normalize_household_config(household, i) for i, household in enumerate(households)]
+    except SettingsValidationError as e:
+        return _json({"error": str(e)}, 400)
+
+    workers = payload.get('workers')
+    chunk_size = payload.get('chunk_size', DEFAULT_CHUNK_SIZE)
+    # bool is an int subclass, so true/false would pass as 1/0
+    if (workers is not None and (isinstance(workers, bool) or not isinstance(workers, int) or workers < 1)) or \
+            isinstance(chunk_size, bool) or not isinstance(chunk_size, int) or chunk_size < 1:
+        return _json({"error": "workers and chunk_size must be positive integers"}, 400)
+
+    timestep_minutes, _ = simulation_steps(get_settings(), hours)
+    slot = _acquire_heavy_slot()
+    if slot is None:
+        return _busy()
+    try:
+        forecast = await _run(_heavy_executor, build_shared_forecast, datetime.now(), hours, timestep_minutes)
+    except BaseException:
+        slot.release()
+        raise
+
+    async def generate():
+        count = 0
+        summaries = run_batch_simulation(configs, forecast, workers, chunk_size)
+        async for summary in _stream_from_executor(summaries, slot, chunk_size):
+            count += 1
+            yield json.dumps(summary) + "\n"
+        yield json.dumps({"done": True, "households": count, "timestamp_start": forecast["timestamp_start"],
+                          "simulation_duration_hours": hours}) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson", background=BackgroundTask(slot.release))
+
+@app.post("/api/sweep")
+async def sizing_sweep(request: Request):
+    payload = await _read_json(request) or {}
+    settings = get_settings()
+    slot = _acquire_heavy_slot()
+    if slot is None:
+        return _busy()
+    try:
+        result = await _run(_heavy_executor, lambda: run_sweep(
+            battery_capacities=payload.get('battery_capacity_kwh', [settings['battery_capacity_kwh']]),
+            solar_capacities=payload.get('solar_capacity_kw', [settings['solar_capacity_kw']]),
+            wind_capacities=payload.get('wind_capacity_kw', [settings['wind_capacity_kw']]),
+            operating_modes=payload.get('operating_mode', [settings['operating_mode']]),
+            hours=int(payload.get('hours', 24)),
+            workers=payload.get('workers'),
+            prune=bool(payload.get('prune', True)),
+            unit_costs=payload.get('unit_costs')
+        ))
+    except (ValueError, TypeError) as e:
+        return _json({"error": str(e)}, 400)
+    finally:
+        slot.release()
+    return _json(result)
+
+
+@app.post("/api/backtest")
+async def backtest(request: Request):
+    payload = await _read_json(request) or {}
+    slot = _acquire_heavy_slot()
+    if slot is None:
+        return _busy()
+    try:
+        return _json(await _run(_heavy_executor, build_backtest, payload))
+    except (ValueError, TypeError) as e:
+        return _json({"error": str(e)}, 400)
+    finally:
+        slot.release()
+
+
+# --- Pre-forking launcher: python asgi_app.py --workers N ---
+
+def _serve(sock, log_level):
+    import uvicorn
+    config = uvicorn.Config(app, log_level=log_level)
+    uvicorn.Server(config).run(sockets=[sock])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the API with uvicorn.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    # Finish loading before fork(): the workers share the models, and no
+    # thread may hold a lock while the process is forked
+    start_model_warmup().join()
+    if not build_readiness()[1]:
+        print("Warning: One or more models failed to load. Predictions will return zeros.")
+    get_settings()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    if args.workers <= 1 or not hasattr(os, "fork"):
+        # No fork() (e.g. Windows): a single process
+        _serve(sock, args.log_level)
+        return
+
+    # Workers are forked after the models are loaded, so their pages are shared
+    # copy-on-write (and the memory-mapped arrays through the page cache)
+    children = []
+    for _ in range(args.workers):
+        pid = os.fork()
+        if pid == 0:
+            _serve(sock, args.log_level)
+            os._exit(0)
+        children.append(pid)
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} workers")
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+# backend/backtest.py
+
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+from utils import get_tou_price_arrays
+from simulation import simulate_battery, battery_params, MODE_CODES
+from settings_store import get_settings, validate_settings_update
+from history_store import history_range, COLUMN_NAMES
+from batch_simulation import imap_shared_forecast, validate_workers
+
+# renewable_power_data.csv holds national daily totals, so each day is scaled
+# to the household and spread over 24 hours with fixed profiles:
+#  - solar: the day's output relative to that year's best days (P99) times the
+#    yield of one kW on such a day. Normalizing per year removes the growth of
+#    the installed fleet from the series.
+#  - wind: same, relative to that year's P99 day, at MAX_WIND_CAPACITY_FACTOR.
+#  - demand: the day's consumption relative to that year's mean, times the
+#    household's average daily demand.
+SOLAR_KWH_PER_KW_BEST_DAY = 6.0
+MAX_WIND_CAPACITY_FACTOR = 0.6
+DEFAULT_DAILY_DEMAND_KWH = 24.0
+REFERENCE_PERCENTILE = 99
+
+SOLAR_PROFILE = np.array([0, 0, 0, 0, 0, 0, 0.2, 0.6, 1.0, 1.4, 1.7, 1.9, 2.0, 1.9, 1.7, 1.4, 1.0, 0.6, 0.3, 0.1,
+                          0, 0, 0, 0], dtype=float)
+DEMAND_PROFILE = np.array([0.6, 0.5, 0.5, 0.5, 0.5, 0.6, 0.9, 1.2, 1.1, 0.9, 0.8, 0.8, 0.8, 0.8, 0.8, 0.9, 1.1,
+                           1.4, 1.6, 1.5, 1.3, 1.1, 0.9, 0.7], dtype=float)
+WIND_PROFILE = np.ones(24)
+SOLAR_PROFILE /= SOLAR_PROFILE.sum()
+DEMAND_PROFILE /= DEMAND_PROFILE.sum()
+WIND_PROFILE /= WIND_PROFILE.sum()
+
+PERIODS = {"monthly": "M", "yearly": "Y"}
+
+_SOLAR, _WIND, _DEMAND = COLUMN_NAMES.index("solar"), COLUMN_NAMES.index("wind"), COLUMN_NAMES.index("consumption")
+
+
+def _relative_to_year(values, years, reference):
+    """Each value divided by its calendar year's reference statistic."""
+    scaled = np.zeros(len(values))
+    for year in np.unique(years):
+        in_year = years == year
+        ref = reference(values[in_year])
+        if ref > 0:
+            scaled[in_year] = values[in_year] / ref
+    return scaled
+
+def build_backtest_inputs(start=None, end=None, daily_demand_kwh=DEFAULT_DAILY_DEMAND_KWH):
+    """
+    Turns the historical range into hourly per-kW solar/wind output, household
+    demand and TOU prices. Days missing any of the three series are skipped
+    (the battery carries over across the gap).
+    Returns:
+        dict: Shaped like batch_simulation.build_shared_forecast() plus the
+        day index ("days") and the number of skipped days.
+    """
+    dates, values, valid = history_range(start, end)
+    usable = valid[:, _SOLAR] & valid[:, _WIND] & valid[:, _DEMAND]
+    days = np.asarray(dates[usable])
+    values = np.asarray(values[usable])
+    years = days.astype('datetime64[Y]')
+
+    p_ref = lambda v: np.percentile(v, REFERENCE_PERCENTILE)
+    solar_daily = _relative_to_year(values[:, _SOLAR], years, p_ref) * SOLAR_KWH_PER_KW_BEST_DAY
+    wind_daily = _relative_to_year(values[:, _WIND], years, p_ref) * (24 * MAX_WIND_CAPACITY_FACTOR)
+    demand_daily = _relative_to_year(values[:, _DEMAND], years, np.mean) * daily_demand_kwh
+
+    buying, selling = get_tou_price_arrays(list(range(24)))
+    n_days = len(days)
+    return {
+        "timestamp_start": str(days[0]) if n_days else None,
+        "timestamp_end": str(days[-1]) if n_days else None,
+        "days": days,
+        "skipped_days": int(len(dates) - n_days),
+        "solar_per_kw": np.outer(solar_daily, SOLAR_PROFILE).ravel(),
+        "wind_per_kw": np.outer(wind_daily, WIND_PROFILE).ravel(),
+        "demand_kwh": np.outer(demand_daily, DEMAND_PROFILE).ravel(),
+        "buying_prices": np.tile(np.asarray(buying, dtype=float), n_days),
+        "selling_prices": np.tile(np.asarray(selling, dtype=float), n_days),
+    }
+
+def _rollup(forecast, result, config, period_unit):
+    """Per-period and total sums of one mode's hourly results."""
+    flows = result["flows"]
+    demand = forecast["demand_kwh"]
+    buy = forecast["buying_prices"]
+    columns = np.column_stack([
+        flows[:, 3],              # grid import
+        flows[:, 4],              # grid export
+        result["step_cost"],      # net grid cost
+        demand * buy,             # cost without solar, wind or battery
+        demand,
+    ])
+
+    periods = forecast["days"].astype(f'datetime64[{period_unit}]')
+    starts = np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]]) if len(periods) else np.array([], int)
+    sums = np.add.reduceat(columns, starts * 24, axis=0) if len(starts) else np.zeros((0, columns.shape[1]))
+
+    def row(values):
+        grid_import, grid_export, net_cost, baseline_cost, demand_kwh = (float(v) for v in values)
+        return {
+            "grid_import_kwh": round(grid_import, 2),
+            "grid_export_kwh": round(grid_export, 2),
+            "net_grid_cost": round(net_cost, 2),
+            "baseline_cost": round(baseline_cost, 2),
+            "savings": round(baseline_cost - net_cost, 2),
+            "self_sufficiency_percent": round(100 * (1 - grid_import / demand_kwh), 2) if demand_kwh > 0 else None,
+        }
+
+    total = row(columns.sum(axis=0))
+    total["final_battery_charge_kwh"] = round(float(result["final_battery_charge_kwh"]), 2)
+    return {
+        "operating_mode": config["operating_mode"],
+        "totals": total,
+        "periods": [dict(period=str(periods[s]), **row(values)) for s, values in zip(starts, sums)],
+    }
+
+def backtest_mode(forecast, config):
+    """Replays one operating mode over the backtest inputs (a pool task)."""
+    result = simulate_battery(
+        forecast["solar_per_kw"] * config["solar_capacity_kw"],
+        forecast["wind_per_kw"] * config["wind_capacity_kw"],
+        forecast["demand_kwh"],
+        forecast["buying_prices"],
+        forecast["selling_prices"],
+        initial_charge_kwh=config["battery_current_charge_kwh"],
+        battery_capacity_kwh=config["battery_capacity_kwh"],
+        battery_min_reserve=config["min_battery_reserve_user_percent"],
+        operating_mode=config["operating_mode"],
+        allow_grid_charge=config["allow_grid_charge"],
+        **battery_params(config)
+    )
+    return _rollup(forecast, result, config, config["period_unit"])
+
+def run_backtest(start=None, end=None, operating_modes=None, household=None, resolution="monthly",
+                 daily_demand_kwh=DEFAULT_DAILY_DEMAND_KWH, workers=None):
+    """
+    Replays the decision policy and battery recurrence over a historical range
+    for several operating modes, one mode per pool worker.
+    Args:
+        start, end (str): YYYY-MM-DD, inclusive; the whole file when omitted.
+        operating_modes (list[str]): Defaults to the three greedy modes.
+        household (dict): Settings overrides (capacities, reserve, ...) on top
+            of the current settings, validated like /api/settings.
+        resolution (str): "monthly" or "yearly" rollups.
+        daily_demand_kwh (float): Household's average daily demand.
+        workers (int): Pool size; defaults to the CPU count.
+    Returns:
+        dict: Range info and one rollup per mode, in the requested order.
+    Raises:
+        ValueError: On invalid dates, settings, resolution or workers.
+    """
+    validate_workers(workers)
+    if resolution not in PERIODS:
+        raise ValueError(f"resolution must be one of {', '.join(PERIODS)}")
+    if daily_demand_kwh <= 0:
+        raise ValueError("daily_demand_kwh must be positive")
+    operating_modes = operating_modes or list(MODE_CODES)
+    modes = [validate_settings_update({"operating_mode": mode})["operating_mode"] for mode in operating_modes]
+
+    base = get_settings()
+    base.update(validate_settings_update(household or {}))
+
+    started = time.perf_counter()
+    forecast = build_backtest_inputs(start, end, daily_demand_kwh)
+    configs = [dict(base, operating_mode=mode, period_unit=PERIODS[resolution]) for mode in dict.fromkeys(modes)]
+
+    results = {}
+    if len(forecast["days"]):
+        for rollup in imap_shared_forecast(backtest_mode, configs, forecast, workers):
+            results[rollup["operating_mode"]] = rollup
+
+    return {
+        "start": forecast["timestamp_start"],
+        "end": forecast["timestamp_end"],
+        "days": int(len(forecast["days"])),
+        "skipped_days": forecast["skipped_days"],
+        "resolution": resolution,
+        "household": {key: base[key] for key in ("solar_capacity_kw", "wind_capacity_kw", "battery_capacity_kwh",
+                                                 "battery_current_charge_kwh", "min_battery_reserve_user_percent",
+                                                 "allow_grid_charge")},
+        "daily_demand_kwh": daily_demand_kwh,
+        "modes": [results[mode] for mode in dict.fromkeys(modes) if mode in results],
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay operating modes over renewable_power_data.csv.")
+    parser.add_argument("--start", default="2012-01-01")
+    parser.add_argument("--end", default="2017-12-31")
+    parser.add_argument("--modes", default=",".join(MODE_CODES), help="Comma-separated operating modes")
+    parser.add_argument("--resolution", choices=list(PERIODS), default="yearly")
+    parser.add_argument("--daily-demand", type=float, default=DEFAULT_DAILY_DEMAND_KWH)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="Print the full result as JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        result = run_backtest(args.start, args.end, args.modes.split(","), resolution=args.resolution,
+                              daily_demand_kwh=args.daily_demand, workers=args.workers)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.json:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+        return
+    print(f"{result['start']} .. {result['end']}: {result['days']} days "
+          f"({result['skipped_days']} skipped), {result['elapsed_seconds']}s")
+    header = f"{'mode':<20}{'import kWh':>12}{'export kWh':>12}{'net cost $':>12}{'savings $':>12}{'self-suff %':>12}"
+    print(header)
+    print("-" * len(header))
+    for mode in result["modes"]:
+        t = mode["totals"]
+        print(f"{mode['operating_mode']:<20}{t['grid_import_kwh']:>12.2f}{t['grid_export_kwh']:>12.2f}"
+              f"{t['net_grid_cost']:>12.2f}{t['savings']:>12.2f}{t['self_sufficiency_percent']:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
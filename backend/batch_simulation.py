@@ -0,0 +1,234 @@
+# backend/batch_simulation.py
+
+import os
+import csv
+import json
+import sys
+import time
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from utils import get_step_price_arrays
+from simulation import simulate_battery, battery_params, MAX_SIMULATION_HOURS
+from settings_store import DEFAULT_SETTINGS, VALID_SETTINGS, get_settings, validate_settings_update, SettingsValidationError
+
+# Settings a household config may override; everything else comes from DEFAULT_SETTINGS
+HOUSEHOLD_KEYS = (
+    "solar_capacity_kw",
+    "wind_capacity_kw",
+    "battery_capacity_kwh",
+    "battery_current_charge_kwh",
+    "operating_mode",
+    "allow_grid_charge",
+    "min_battery_reserve_user_percent",
+    "battery_max_charge_kw",
+    "battery_max_discharge_kw",
+    "battery_round_trip_efficiency",
+)
+
+DEFAULT_CHUNK_SIZE = 250
+
+# CSV cells are strings, and bool("false") is True
+_CSV_BOOLEANS = {"true": True, "1": True, "yes": True, "false": False, "0": False, "no": False}
+
+
+def normalize_household_config(raw, index):
+    """
+    Validates one household config with the same rules as /api/settings.
+    Args:
+        raw (dict): Household values (CSV row or JSON object).
+        index (int): Position in the input, used as the default household_id.
+    Returns:
+        dict: household_id plus every key in HOUSEHOLD_KEYS.
+    Raises:
+        SettingsValidationError: If raw is not an object or holds an invalid value.
+    """
+    if not isinstance(raw, dict):
+        raise SettingsValidationError(f"household {index} must be an object of settings")
+    values = {key: value for key, value in raw.items() if key in HOUSEHOLD_KEYS and value not in (None, "")}
+    if isinstance(values.get("allow_grid_charge"), str):
+        flag = values["allow_grid_charge"].strip().lower()
+        if flag not in _CSV_BOOLEANS:
+            raise SettingsValidationError(f"household {index}: allow_grid_charge must be true or false")
+        values["allow_grid_charge"] = _CSV_BOOLEANS[flag]
+    config = {key: DEFAULT_SETTINGS[key] for key in HOUSEHOLD_KEYS}
+    config.update(validate_settings_update(values))
+    config["household_id"] = str(raw.get("household_id") or index)
+    return config
+
+def load_household_configs(path):
+    """
+    Reads household configs from a .csv (header row with HOUSEHOLD_KEYS columns)
+    or a .json file holding a list of objects.
+    """
+    with open(path, 'r', newline='') as f:
+        if path.lower().endswith('.json'):
+            rows = json.load(f)
+        else:
+            rows = list(csv.DictReader(f))
+    return [normalize_household_config(row, i) for i, row in enumerate(rows)]
+
+
+def build_shared_forecast(start_dt, hours, timestep_minutes=60):
+    """
+    Runs the models once for the horizon, in steps of timestep_minutes.
+    Capacities are applied per household, so the arrays hold per-kW
+    solar/wind output and raw demand.
+    """
+    # Imported here so pool workers never load the models themselves
+    from forecasting import make_predictions_for_steps
+
+    times, solar, wind, demand = make_predictions_for_steps(start_dt, hours * 60 // timestep_minutes,
+                                                            timestep_minutes)
+    buying, selling = get_step_price_arrays(times, timestep_minutes)
+    return {
+        "timestamp_start": start_dt.isoformat(),
+        "timestep_minutes": timestep_minutes,
+        "solar_per_kw": solar,
+        "wind_per_kw": wind,
+        "demand_kwh": demand,
+        "buying_prices": np.asarray(buying, dtype=float),
+        "selling_prices": np.asarray(selling, dtype=float),
+    }
+
+def simulate_household(forecast, config):
+    """Runs the battery simulation for one household and returns its summary."""
+    result = simulate_battery(
+        forecast["solar_per_kw"] * config["solar_capacity_kw"],
+        forecast["wind_per_kw"] * config["wind_capacity_kw"],
+        forecast["demand_kwh"],
+        forecast["buying_prices"],
+        forecast["selling_prices"],
+        initial_charge_kwh=config["battery_current_charge_kwh"],
+        battery_capacity_kwh=config["battery_capacity_kwh"],
+        battery_min_reserve=config["min_battery_reserve_user_percent"],
+        operating_mode=config["operating_mode"],
+        allow_grid_charge=config["allow_grid_charge"],
+        timestep_hours=forecast["timestep_minutes"] / 60,
+        **battery_params(config)
+    )
+    return {
+        "household_id": config["household_id"],
+        "operating_mode": config["operating_mode"],
+        "total_grid_import_kwh": round(float(result["total_grid_import_kwh"]), 2),
+        "total_grid_export_kwh": round(float(result["total_grid_export_kwh"]), 2),
+        "net_grid_cost": round(float(result["net_grid_cost"]), 2),
+        "final_battery_charge_kwh": round(float(result["final_battery_charge_kwh"]), 2),
+    }
+
+
+# Each pool worker receives the shared forecast once, through the initializer
+_worker_forecast = None
+
+def _init_worker(forecast):
+    global _worker_forecast
+    _worker_forecast = forecast
+
+def _run_task(task_fn, task):
+    return task_fn(_worker_forecast, task)
+
+# Process pools open at once in this process. Each pool already uses every
+# CPU, so a concurrent batch or sweep runs in-process instead of forking
+# another CPU-count pool (N parallel requests would otherwise fork N x CPUs).
+MAX_CONCURRENT_POOLS = 1
+_pool_slots = threading.BoundedSemaphore(MAX_CONCURRENT_POOLS)
+
+def validate_workers(workers):
+    """
+    Raises:
+        ValueError: Unless workers is None (CPU count) or a positive integer.
+    """
+    if workers is not None and (isinstance(workers, bool) or not isinstance(workers, int) or workers < 1):
+        raise ValueError("workers must be a positive integer")
+
+def imap_shared_forecast(task_fn, tasks, forecast, workers=None):
+    """
+    Yields task_fn(forecast, task) for every task as it completes.
+    Tasks run on a process pool that receives the forecast once per worker;
+    with one worker or one task, or while MAX_CONCURRENT_POOLS pools are
+    busy, everything runs in-process.
+    Args:
+        task_fn (callable): Module-level (picklable) function.
+        tasks (list): Task arguments.
+        forecast (dict): Output of build_shared_forecast().
+        workers (int): Pool size; defaults to (and is capped at) the CPU count.
+    """
+    cpus = os.cpu_count() or 1
+    workers = min(workers or cpus, cpus)
+    if workers == 1 or len(tasks) <= 1 or not _pool_slots.acquire(blocking=False):
+        for task in tasks:
+            yield task_fn(forecast, task)
+        return
+
+    try:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), initializer=_init_worker,
+                                 initargs=(forecast,)) as pool:
+            futures = [pool.submit(_run_task, task_fn, task) for task in tasks]
+            for future in as_completed(futures):
+                yield future.result()
+    finally:
+        _pool_slots.release()
+
+def _simulate_chunk(forecast, configs):
+    return [simulate_household(forecast, config) for config in configs]
+
+def run_batch_simulation(configs, forecast, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Simulates every household against one shared forecast.
+    Chunks of households are fanned out over a process pool and summaries are
+    yielded as each chunk completes, so output order follows completion order.
+    Args:
+        configs (list[dict]): Normalized household configs.
+        forecast (dict): Output of build_shared_forecast().
+        workers (int): Pool size; defaults to (and is capped at) the CPU count.
+            1 runs in-process.
+        chunk_size (int): Households per pool task.
+    """
+    chunks = [configs[i:i + chunk_size] for i in range(0, len(configs), chunk_size)]
+    for summaries in imap_shared_forecast(_simulate_chunk, chunks, forecast, workers):
+        for summary in summaries:
+            yield summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate many household configurations against one forecast.")
+    parser.add_argument("configs", help="CSV or JSON file with one household per row/object")
+    parser.add_argument("--hours", type=int, default=24, help=f"Simulation horizon (1-{MAX_SIMULATION_HOURS})")
+    parser.add_argument("--timestep-minutes", type=int, default=None,
+                        choices=VALID_SETTINGS["simulation_timestep_minutes"]["options"],
+                        help="Simulation step (default: simulation_timestep_minutes from settings.json)")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Households per pool task")
+    parser.add_argument("--output", default=None, help="Write NDJSON summaries here instead of stdout")
+    args = parser.parse_args(argv)
+
+    if not 1 <= args.hours <= MAX_SIMULATION_HOURS:
+        parser.error(f"--hours must be between 1 and {MAX_SIMULATION_HOURS}")
+
+    configs = load_household_configs(args.configs)
+    started = time.perf_counter()
+    timestep_minutes = args.timestep_minutes or int(get_settings().get('simulation_timestep_minutes', 60))
+    forecast = build_shared_forecast(datetime.now(), args.hours, timestep_minutes)
+
+    out = open(args.output, 'w') if args.output else None
+    try:
+        count = 0
+        for summary in run_batch_simulation(configs, forecast, args.workers, args.chunk_size):
+            line = json.dumps(summary)
+            if out:
+                out.write(line + "\n")
+            else:
+                print(line, flush=True)
+            count += 1
+    finally:
+        if out:
+            out.close()
+    print(f"Simulated {count} households in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,477 @@
+# backend/benchmarks.py
+#
+# Micro and endpoint benchmarks with regression tracking:
+#
+#   python benchmarks.py                          # run, write data/benchmarks/latest.json
+#   python benchmarks.py --save-baseline          # ... and make it the baseline
+#   python benchmarks.py --compare                # run and compare against the baseline
+#   python benchmarks.py --only decision,tou      # a subset of the groups
+#   python benchmarks.py --stub-models            # ignore the joblib files
+#
+# Groups: decision (make_decision per mode and branch, and the battery
+# recurrence at 5-minute steps with power limits and losses), tou, inference
+# (single vs batched), http (/api/status, /api/forecasts, /api/simulate and
+# its Monte Carlo variant via the Flask test client, plus conditional GETs
+# answered 304 from the response cache) and dashboards (N clients polling
+# /api/status every 5s against a real threaded server).
+# Without the joblib model files, stub models with the same predict()
+# interface are used and the results are marked as such, since they are
+# not comparable with real-model runs.
+# --compare exits with status 1 when a benchmark's median regressed by more
+# than --threshold.
+
+import os
+import sys
+import json
+import time
+import socket
+import platform
+import argparse
+import tempfile
+import threading
+import subprocess
+import statistics
+import urllib.request
+import urllib.error
+from datetime import datetime
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BACKEND_DIR, 'data', 'benchmarks')
+LATEST_PATH = os.path.join(RESULTS_DIR, 'latest.json')
+BASELINE_PATH = os.path.join(RESULTS_DIR, 'baseline.json')
+
+GROUPS = ("decision", "tou", "inference", "http", "dashboards")
+
+# A benchmark counts as regressed when its median is this much slower than the baseline
+DEFAULT_REGRESSION_THRESHOLD = 0.25
+
+# Dashboard scenario: each client polls /api/status at this interval
+DASHBOARD_POLL_SECONDS = 5.0
+
+# make_decision() inputs that take each mode down each of its branches:
+# (solar, wind, demand, battery charge, buy price, sell price)
+DECISION_CASES = {
+    "Self-Sufficiency": {
+        "surplus_charge": (4.0, 1.0, 2.0, 5.0, 0.20, 0.08),
+        "surplus_export": (4.0, 1.0, 2.0, 10.0, 0.20, 0.08),
+        "deficit_discharge": (0.5, 0.2, 3.0, 8.0, 0.20, 0.08),
+        "deficit_import": (0.5, 0.2, 3.0, 2.0, 0.20, 0.08),
+    },
+    "Cost Optimization": {
+        "surplus_export_high_price": (4.0, 1.0, 2.0, 5.0, 0.20, 0.25),
+        "surplus_charge_low_price": (4.0, 1.0, 2.0, 5.0, 0.10, 0.05),
+        "surplus_charge": (4.0, 1.0, 2.0, 5.0, 0.20, 0.08),
+        "deficit_discharge_high_price": (0.5, 0.2, 3.0, 8.0, 0.30, 0.08),
+        "deficit_discharge": (0.5, 0.2, 3.0, 8.0, 0.20, 0.08),
+        "deficit_import": (0.5, 0.2, 3.0, 2.0, 0.20, 0.08),
+    },
+    "Environmental": {
+        "surplus_charge": (4.0, 1.0, 2.0, 5.0, 0.20, 0.08),
+        "surplus_export": (4.0, 1.0, 2.0, 10.0, 0.20, 0.08),
+        "deficit_discharge": (0.5, 0.2, 3.0, 8.0, 0.20, 0.08),
+        "deficit_import": (0.5, 0.2, 3.0, 2.0, 0.20, 0.08),
+    },
+    "Unknown": {
+        "surplus": (4.0, 1.0, 2.0, 5.0, 0.20, 0.08),
+        "deficit": (0.5, 0.2, 3.0, 8.0, 0.20, 0.08),
+    },
+}
+BATTERY_CAPACITY_KWH = 10.0
+MIN_RESERVE_PERCENT = 20
+
+
+# --- Stub models ---
+
+class StubModel:
+    """
+    Stand-in for a scikit-learn regressor when the joblib files are absent:
+    a smooth deterministic function of the feature columns.
+    """
+    def __init__(self, scale, phase):
+        self.scale = scale
+        self.phase = phase
+
+    def predict(self, features):
+        hour = features['hour'].to_numpy(dtype=float)
+        month = features['month'].to_numpy(dtype=float)
+        return self.scale * (1.0 + np.sin((hour - self.phase) * np.pi / 12) * 0.5
+                             + np.cos(month * np.pi / 6) * 0.2)
+
+def install_models(use_stubs):
+    """
+    Loads the real models unless told not to or they are missing, in which
+    case stub models are installed in their place.
+    Returns:
+        str: "joblib" or "stub".
+    """
+    import forecasting
+    missing = [f for f in forecasting.MODEL_FILES.values()
+               if not os.path.exists(os.path.join(forecasting.MODEL_DIR, f))]
+    if not use_stubs and not missing and forecasting.load_models():
+        return "joblib"
+    forecasting.solar_model = StubModel(0.6, 6)
+    forecasting.wind_model = StubModel(0.3, 0)
+    forecasting.demand_model = StubModel(1.2, 12)
+    forecasting.clear_prediction_cache()
+    if forecasting.FORECAST_TABLES_ENABLED:
+        # Tables from the stubs, so tables saved from the real models are not picked up
+        forecasting._tables = forecasting._compile_tables(datetime.now().year, forecasting.FORECAST_TABLE_YEARS,
+                                                          forecasting._model_signature())
+    return "stub"
+
+
+# --- Timing ---
+
+def time_call(fn, min_seconds=0.2, repeat=5, setup=None):
+    """
+    Times `fn()` in `repeat` rounds of at least `min_seconds` each (the loop
+    count is calibrated first). If given, `setup()` runs before every call and
+    is not timed.
+    Returns:
+        dict: Per-call median/min/max in microseconds, loops per round and rounds.
+    """
+    def run(loops):
+        total = 0.0
+        for _ in range(loops):
+            if setup is not None:
+                setup()
+            started = time.perf_counter()
+            fn()
+            total += time.perf_counter() - started
+        return total
+
+    loops = 1
+    while True:
+        elapsed = run(loops)
+        if elapsed >= min_seconds / 10 or loops >= 1 << 20:
+            break
+        loops *= 2
+    loops = max(1, int(loops * (min_seconds / max(elapsed, 1e-9))))
+    per_call = [run(loops) / loops * 1e6 for _ in range(repeat)]
+    return {
+        "median_us": round(statistics.median(per_call), 3),
+        "min_us": round(min(per_call), 3),
+        "max_us": round(max(per_call), 3),
+        "loops": loops,
+        "rounds": repeat,
+    }
+
+
+# --- Benchmark groups ---
+
+def bench_decision(quick):
+    from decision_engine import make_decision
+    results = {}
+    for mode, cases in DECISION_CASES.items():
+        for case, (solar, wind, demand, charge, buy, sell) in cases.items():
+            call = lambda: make_decision(solar, wind, demand, charge, BATTERY_CAPACITY_KWH,
+                                         MIN_RESERVE_PERCENT, buy, sell, mode)
+            action = call()["recommended_action"]
+            result = time_call(call, min_seconds=0.05 if quick else 0.2)
+            result["action"] = action
+            results[f"decision/{mode}/{case}"] = result
+
+    from simulation import simulate_battery
+    rng = np.random.default_rng(0)
+    for days in (1, 365):
+        steps = days * 288
+        inputs = (rng.uniform(0, 4, steps), rng.uniform(0, 2, steps), rng.uniform(0, 4, steps),
+                  rng.choice([0.10, 0.30], steps), rng.choice([0.05, 0.21], steps))
+        results[f"decision/simulate_5min_{days}d"] = time_call(
+            lambda: simulate_battery(*inputs, 5.0, BATTERY_CAPACITY_KWH, MIN_RESERVE_PERCENT, "Cost Optimization",
+                                     timestep_hours=5 / 60, max_charge_kw=3.0, max_discharge_kw=3.0,
+                                     round_trip_efficiency=0.9),
+            min_seconds=0.05 if quick else 0.2, repeat=3)
+    return results
+
+def bench_tou(quick):
+    from utils import get_current_tou_prices, get_tou_price_arrays
+    min_seconds = 0.05 if quick else 0.2
+    hours = list(range(24))
+    return {
+        "tou/get_current_tou_prices": time_call(lambda: get_current_tou_prices(17), min_seconds),
+        "tou/get_current_tou_prices_x24": time_call(lambda: [get_current_tou_prices(h) for h in hours], min_seconds),
+        "tou/get_tou_price_arrays_24": time_call(lambda: get_tou_price_arrays(hours), min_seconds),
+        "tou/get_tou_price_arrays_8760": time_call(lambda: get_tou_price_arrays(np.arange(8760) % 24), min_seconds),
+    }
+
+def bench_inference(quick):
+    import forecasting
+    min_seconds = 0.1 if quick else 0.5
+    # 2024 lies outside the compiled forecast tables, so these go through the models
+    start = datetime(2024, 6, 1)
+    results = {}
+    for hours in (24, 168):
+        times = forecasting.forecast_times(start, hours)
+        results[f"inference/single_loop_cold_{hours}h"] = time_call(
+            lambda: [forecasting.make_predictions_for_time(t) for t in times], min_seconds, repeat=3,
+            setup=forecasting.clear_prediction_cache)
+        results[f"inference/batched_cold_{hours}h"] = time_call(
+            lambda: forecasting.make_predictions_for_times(times), min_seconds, repeat=3,
+            setup=forecasting.clear_prediction_cache)
+        forecasting.make_predictions_for_times(times)
+        results[f"inference/single_loop_cached_{hours}h"] = time_call(
+            lambda: [forecasting.make_predictions_for_time(t) for t in times], min_seconds)
+        results[f"inference/batched_cached_{hours}h"] = time_call(
+            lambda: forecasting.make_predictions_for_times(times), min_seconds)
+
+    if forecasting.get_forecast_table_info()["in_use"]:
+        table_start = datetime(datetime.now().year, 6, 1)
+        for hours in (24, 168, 8760):
+            times = forecasting.forecast_times(table_start, hours)
+            results[f"inference/tables_single_loop_{hours}h"] = time_call(
+                lambda: [forecasting.make_predictions_for_time(t) for t in times], min_seconds)
+            results[f"inference/tables_batched_{hours}h"] = time_call(
+                lambda: forecasting.make_predictions_for_times(times), min_seconds)
+    return results
+
+def bench_http(quick):
+    import app
+    import forecasting
+    from response_cache import clear_response_cache
+    client = app.app.test_client()
+    min_seconds = 0.2 if quick else 1.0
+
+    def get(path, expect=200, headers=None):
+        def call():
+            response = client.get(path, headers=headers)
+            if response.status_code != expect:
+                raise RuntimeError(f"GET {path}: {response.status_code}")
+        return call
+
+    def revalidate(path):
+        # Conditional GET with the ETag of the current body: answered 304 from the response cache
+        return get(path, 304, {"If-None-Match": client.get(path).headers["ETag"]})
+
+    return {
+        "http/status": time_call(get("/api/status"), min_seconds),
+        "http/status_cold_cache": time_call(get("/api/status"), min_seconds, repeat=3,
+                                            setup=forecasting.clear_prediction_cache),
+        # The uncached cases empty the response cache before every call, so they time the computation
+        "http/forecasts": time_call(get("/api/forecasts"), min_seconds, setup=clear_response_cache),
+        "http/forecasts_cached": time_call(get("/api/forecasts"), min_seconds),
+        "http/forecasts_not_modified": time_call(revalidate("/api/forecasts"), min_seconds),
+        "http/simulate_24h": time_call(get("/api/simulate?hours=24"), min_seconds, setup=clear_response_cache),
+        "http/simulate_168h": time_call(get("/api/simulate?hours=168"), min_seconds, setup=clear_response_cache),
+        "http/simulate_168h_cached": time_call(get("/api/simulate?hours=168"), min_seconds),
+        "http/simulate_168h_not_modified": time_call(revalidate("/api/simulate?hours=168"), min_seconds),
+        "http/simulate_8760h": time_call(get("/api/simulate?hours=8760"), min_seconds, repeat=3,
+                                         setup=clear_response_cache),
+        "http/montecarlo_10000x24h": time_call(get("/api/simulate/montecarlo?scenarios=10000&hours=24&seed=0"),
+                                               min_seconds, repeat=3),
+    }
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def run_dashboards(base_url, clients, duration, poll_seconds=DASHBOARD_POLL_SECONDS):
+    """
+    `clients` threads each request /api/status every `poll_seconds` (with
+    staggered starts, like browsers opened at different times) for `duration`
+    seconds.
+    Returns:
+        dict: Request count, errors and p50/p99/max latency in ms.
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def dashboard(offset):
+        if stop.wait(offset):
+            return
+        while True:
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(base_url + "/api/status", timeout=30) as response:
+                    response.read()
+                with lock:
+                    latencies.append(time.perf_counter() - started)
+            except (urllib.error.URLError, OSError):
+                with lock:
+                    errors[0] += 1
+            if stop.wait(max(0.0, poll_seconds - (time.perf_counter() - started))):
+                return
+
+    threads = [threading.Thread(target=dashboard, args=(poll_seconds * i / clients,), daemon=True)
+               for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    ms = sorted(latency * 1000 for latency in latencies)
+    pick = lambda p: round(ms[min(len(ms) - 1, int(round(p / 100 * (len(ms) - 1))))], 3) if ms else 0.0
+    return {
+        "clients": clients,
+        "requests": len(ms),
+        "errors": errors[0],
+        "median_us": round(pick(50) * 1000, 3),
+        "p99_ms": pick(99),
+        "max_ms": round(ms[-1], 3) if ms else 0.0,
+    }
+
+def bench_dashboards(quick, clients_list=(10, 50, 200)):
+    from werkzeug.serving import make_server, WSGIRequestHandler
+    import app
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    duration = 2 * DASHBOARD_POLL_SECONDS if quick else 6 * DASHBOARD_POLL_SECONDS
+    port = _free_port()
+    server = make_server("127.0.0.1", port, app.app, threaded=True, request_handler=QuietHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        return {f"dashboards/{clients}_clients": run_dashboards(f"http://127.0.0.1:{port}", clients, duration)
+                for clients in clients_list}
+    finally:
+        server.shutdown()
+
+BENCHMARKS = {
+    "decision": bench_decision,
+    "tou": bench_tou,
+    "inference": bench_inference,
+    "http": bench_http,
+    "dashboards": bench_dashboards,
+}
+
+
+# --- Results ---
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def run_benchmarks(groups=GROUPS, quick=False, use_stubs=False, dashboard_clients=None):
+    """
+    Runs the selected benchmark groups.
+    Returns:
+        dict: Environment info and {benchmark name: timings}.
+    """
+    # Keep the benchmark's decisions out of the real event log
+    import event_log
+    event_log.LOG_DIR = tempfile.mkdtemp(prefix="synapse-bench-logs-")
+    models = install_models(use_stubs)
+
+    results = {}
+    for group in groups:
+        started = time.perf_counter()
+        if group == "dashboards" and dashboard_clients:
+            results.update(bench_dashboards(quick, dashboard_clients))
+        else:
+            results.update(BENCHMARKS[group](quick))
+        print(f"{group}: {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "models": models,
+        "quick": quick,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "benchmarks": results,
+    }
+
+def compare_results(current, baseline, threshold=DEFAULT_REGRESSION_THRESHOLD):
+    """
+    Compares medians benchmark by benchmark.
+    Returns:
+        list[dict]: One row per benchmark present in both runs, with the
+        ratio current / baseline and a "regressed" flag.
+    """
+    rows = []
+    for name, result in current["benchmarks"].items():
+        base = baseline["benchmarks"].get(name)
+        if not base or not base.get("median_us"):
+            continue
+        ratio = result["median_us"] / base["median_us"]
+        rows.append({
+            "name": name,
+            "baseline_us": base["median_us"],
+            "current_us": result["median_us"],
+            "ratio": round(ratio, 3),
+            "regressed": ratio > 1 + threshold,
+        })
+    return rows
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+
+def _print_results(results):
+    print(f"{'benchmark':<56}{'median':>14}{'min':>14}")
+    for name, result in results["benchmarks"].items():
+        if "p99_ms" in result:
+            print(f"{name:<56}{result['median_us']:>11.1f} us   p99 {result['p99_ms']:.1f} ms, "
+                  f"{result['requests']} requests, {result['errors']} errors")
+        else:
+            print(f"{name:<56}{result['median_us']:>11.1f} us{result['min_us']:>11.1f} us")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the decision engine, inference and HTTP endpoints.")
+    parser.add_argument("--only", default=",".join(GROUPS), help="Comma-separated groups: " + ", ".join(GROUPS))
+    parser.add_argument("--quick", action="store_true", help="Shorter rounds (noisier)")
+    parser.add_argument("--stub-models", action="store_true", help="Use stub models even if the joblib files exist")
+    parser.add_argument("--clients", default=None, help="Comma-separated dashboard counts, e.g. 10,50,200")
+    parser.add_argument("--output", default=LATEST_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Also store this run as the baseline")
+    parser.add_argument("--compare", action="store_true", help="Compare against the baseline; exit 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                        help="Allowed slowdown before a benchmark counts as regressed (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    groups = [group.strip() for group in args.only.split(",") if group.strip()]
+    unknown = [group for group in groups if group not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown group(s): {', '.join(unknown)}")
+    clients = [int(c) for c in args.clients.split(",")] if args.clients else None
+
+    results = run_benchmarks(groups, args.quick, args.stub_models, clients)
+    _write_json(args.output, results)
+    _print_results(results)
+    print(f"\nResults written to {args.output} ({results['models']} models)")
+    if args.save_baseline:
+        _write_json(args.baseline, results)
+        print(f"Baseline saved to {args.baseline}")
+
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"No baseline at {args.baseline}; run with --save-baseline first")
+            return 1
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("models") != results["models"]:
+            print(f"Warning: baseline used {baseline.get('models')} models, this run {results['models']}")
+        rows = compare_results(results, baseline, args.threshold)
+        print(f"\n{'benchmark':<56}{'baseline':>14}{'current':>14}{'ratio':>8}")
+        for row in rows:
+            flag = "  REGRESSED" if row["regressed"] else ""
+            print(f"{row['name']:<56}{row['baseline_us']:>11.1f} us{row['current_us']:>11.1f} us"
+                  f"{row['ratio']:>8.2f}{flag}")
+        regressed = [row["name"] for row in rows if row["regressed"]]
+        if regressed:
+            print(f"\n{len(regressed)} regression(s) above {args.threshold:.0%}")
+            return 1
+        print(f"\nNo regressions above {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,7 @@
 # backend/decision_engine.py
 
+import numpy as np
+
 def make_decision(
     current_solar_production, # kW
     current_wind_production,  # kW
@@ -9,17 +11,30 @@ def make_decision(
     battery_min_reserve,      # Percentage (0-100) - This is now the user-defined minimum
     buying_price_per_kwh,     # $/kWh
     selling_price_per_kwh,    # $/kWh
-    operating_mode            # "Cost Optimization", "Self-Sufficiency", "Environmental"
+    operating_mode,           # "Cost Optimization", "Self-Sufficiency", "Environmental"
+    timestep_hours=1.0,       # Length of the step the flows are held for
+    max_charge_kw=None,       # Battery charge power limit (None: unlimited)
+    max_discharge_kw=None,    # Battery discharge power limit (None: unlimited)
+    round_trip_efficiency=1.0 # Fraction of charged energy that comes back out
 ):
     """
     Determines optimal energy flow based on current conditions and user-defined operating mode.
     
     Returns a dictionary of recommended power flows and an action message.
+    Flows are average kW over the step; the battery moves by
+    power_to_battery * timestep_hours * sqrt(round_trip_efficiency) kWh when
+    charging and power_from_battery * timestep_hours / sqrt(round_trip_efficiency)
+    when discharging (see battery_step_limits()).
     """
     
     # Calculate absolute battery reserve from percentage
     min_battery_reserve_kwh = (battery_min_reserve / 100) * battery_capacity
 
+    # Most power the battery can absorb / deliver over this step
+    charge_room, discharge_room = battery_step_limits(
+        current_battery_charge, battery_capacity, min_battery_reserve_kwh,
+        timestep_hours, max_charge_kw, max_discharge_kw, round_trip_efficiency)
+
     # Initialize all power flows to zero
     power_to_home = 0
     power_to_battery = 0
@@ -47,7 +62,7 @@ def make_decision(
 
             # 2. Charge battery with surplus, respecting user reserve and max capacity
             if surplus_after_home > 0 and current_battery_charge < battery_capacity:
-                charge_amount = min(surplus_after_home, battery_capacity - current_battery_charge)
+                charge_amount = min(surplus_after_home, charge_room)
                 power_to_battery = charge_amount
                 surplus_after_home -= charge_amount
                 recommended_action = "CHARGE_BATTERY" if charge_amount > 0 else recommended_action
@@ -64,7 +79,7 @@ def make_decision(
 
             # 2. Discharge battery for remaining demand, respecting user reserve
             if remaining_demand > 0 and current_battery_charge > min_battery_reserve_kwh:
-                discharge_amount = min(remaining_demand, current_battery_charge - min_battery_reserve_kwh)
+                discharge_amount = min(remaining_demand, discharge_room)
                 power_from_battery = discharge_amount
                 remaining_demand -= discharge_amount
                 recommended_action = "DISCHARGE_BATTERY" if recommended_action == "NO_ACTION" else recommended_action
@@ -89,12 +104,12 @@ def make_decision(
                     power_to_grid = surplus_after_home
                     recommended_action = "EXPORT_TO_GRID"
                 elif buying_price_per_kwh < 0.15: # Grid price is low, good time to store if it makes sense
-                    charge_amount = min(surplus_after_home, battery_capacity - current_battery_charge)
+                    charge_amount = min(surplus_after_home, charge_room)
                     power_to_battery = charge_amount
                     surplus_after_home -= charge_amount
                     recommended_action = "CHARGE_BATTERY_LOW_GRID_PRICE" if charge_amount > 0 else recommended_action
                 else: # Neutral prices, maybe still charge battery if there's surplus
-                     charge_amount = min(surplus_after_home, battery_capacity - current_battery_charge)
+                     charge_amount = min(surplus_after_home, charge_room)
                      power_to_battery = charge_amount
                      surplus_after_home -= charge_amount
                      recommended_action = "CHARGE_BATTERY" if charge_amount > 0 else recommended_action
@@ -112,12 +127,12 @@ def make_decision(
             # Consider discharging battery or importing from grid
             if current_battery_charge > min_battery_reserve_kwh: # Battery has available charge
                 if buying_price_per_kwh > selling_price_per_kwh and buying_price_per_kwh > 0.25: # High buying price, discharge battery
-                    discharge_amount = min(deficit, current_battery_charge - min_battery_reserve_kwh)
+                    discharge_amount = min(deficit, discharge_room)
                     power_from_battery = discharge_amount
                     deficit -= discharge_amount
                     recommended_action = "DISCHARGE_BATTERY_HIGH_GRID_PRICE" if discharge_amount > 0 else recommended_action
                 else: # Neutral or low buying prices, maybe still discharge battery
-                    discharge_amount = min(deficit, current_battery_charge - min_battery_reserve_kwh)
+                    discharge_amount = min(deficit, discharge_room)
                     power_from_battery = discharge_amount
                     deficit -= discharge_amount
                     recommended_action = "DISCHARGE_BATTERY" if discharge_amount > 0 else recommended_action
@@ -141,7 +156,7 @@ def make_decision(
 
             # 2. Charge battery with surplus (prioritize storing renewable energy)
             if surplus_after_home > 0 and current_battery_charge < battery_capacity:
-                charge_amount = min(surplus_after_home, battery_capacity - current_battery_charge)
+                charge_amount = min(surplus_after_home, charge_room)
                 power_to_battery = charge_amount
                 surplus_after_home -= charge_amount
                 recommended_action = "CHARGE_BATTERY_RENEWABLE_PRIORITY" if charge_amount > 0 else recommended_action
@@ -158,7 +173,7 @@ def make_decision(
 
             # 2. Discharge battery for remaining demand (prefer stored renewables)
             if remaining_demand > 0 and current_battery_charge > min_battery_reserve_kwh:
-                discharge_amount = min(remaining_demand, current_battery_charge - min_battery_reserve_kwh)
+                discharge_amount = min(remaining_demand, discharge_room)
                 power_from_battery = discharge_amount
                 remaining_demand -= discharge_amount
                 recommended_action = "DISCHARGE_BATTERY_RENEWABLE" if discharge_amount > 0 else recommended_action
@@ -178,7 +193,7 @@ def make_decision(
             surplus = total_generation - remaining_demand
             
             if current_battery_charge < battery_capacity:
-                charge_amount = min(surplus, battery_capacity - current_battery_charge)
+                charge_amount = min(surplus, charge_room)
                 power_to_battery = charge_amount
                 surplus -= charge_amount
             power_to_grid = surplus # Export remaining
@@ -188,7 +203,7 @@ def make_decision(
             deficit = remaining_demand - total_generation
             
             if current_battery_charge > min_battery_reserve_kwh:
-                discharge_amount = min(deficit, current_battery_charge - min_battery_reserve_kwh)
+                discharge_amount = min(deficit, discharge_room)
                 power_from_battery = discharge_amount
                 deficit -= discharge_amount
             power_from_grid = deficit # Import remaining
@@ -211,4 +226,195 @@ def make_decision(
         "recommended_action": recommended_action,
         "current_operating_mode": operating_mode, # For debugging/info
         "actual_min_reserve_kwh": round(min_battery_reserve_kwh, 2) # For debugging/info
-    }
\ No newline at end of file
+    }
+
+def battery_step_limits(charge, capacity, min_reserve_kwh, timestep_hours=1.0,
+                        max_charge_kw=None, max_discharge_kw=None, round_trip_efficiency=1.0):
+    """
+    Charge and discharge power (kW) the battery can take this step: the
+    headroom to capacity / above the reserve spread over the step, through the
+    charge or discharge half of the round-trip losses, capped by the power
+    limits. Works on scalars and arrays. With the defaults this is exactly
+    (capacity - charge, charge - min_reserve_kwh).
+    Returns:
+        tuple: (charge_room_kw, discharge_room_kw)
+    """
+    efficiency = round_trip_efficiency ** 0.5
+    charge_room = (capacity - charge) / (timestep_hours * efficiency)
+    discharge_room = (charge - min_reserve_kwh) * efficiency / timestep_hours
+    if max_charge_kw is not None:
+        charge_room = np.minimum(charge_room, np.float64(max_charge_kw))
+    if max_discharge_kw is not None:
+        discharge_room = np.minimum(discharge_room, np.float64(max_discharge_kw))
+    return charge_room, discharge_room
+
+# --- Batch (vectorized) decision engine ---
+
+# Lookahead mode handled by dispatch_planner.py rather than make_decision()
+OPTIMAL_DISPATCH_MODE = "Optimal Dispatch"
+
+# Every action string the engines can return; batch results carry the index
+ACTION_NAMES = (
+    "NO_ACTION",
+    "USE_OWN_GENERATION",
+    "CHARGE_BATTERY",
+    "EXPORT_SURPLUS",
+    "DISCHARGE_BATTERY",
+    "IMPORT_FROM_GRID",
+    "EXPORT_TO_GRID",
+    "CHARGE_BATTERY_LOW_GRID_PRICE",
+    "DISCHARGE_BATTERY_HIGH_GRID_PRICE",
+    "USE_OWN_GENERATION_RENEWABLE",
+    "CHARGE_BATTERY_RENEWABLE_PRIORITY",
+    "EXPORT_RENEWABLE_SURPLUS",
+    "DISCHARGE_BATTERY_RENEWABLE",
+    "IMPORT_FROM_GRID_LAST_RESORT",
+    "DEFAULT_SURPLUS_HANDLING",
+    "DEFAULT_DEFICIT_HANDLING",
+    # Only produced by the "Optimal Dispatch" planner (dispatch_planner.py)
+    "CHARGE_BATTERY_FROM_GRID",
+    "DISCHARGE_BATTERY_TO_GRID",
+    "HOLD_BATTERY_FOR_PEAK",
+)
+ACTION_CODES = {name: code for code, name in enumerate(ACTION_NAMES)}
+
+FLOW_KEYS = ("power_to_home", "power_to_battery", "power_from_battery", "power_from_grid", "power_to_grid")
+
+
+def _round_flow(values):
+    # Same as max(0, round(x, 2)) in make_decision()
+    values = np.round(values, 2)
+    return np.where(values > 0, values, 0.0)
+
+def make_decisions_batch(
+    solar_production,      # kW, array
+    wind_production,       # kW, array
+    demand,                # kW, array
+    battery_charge,        # kWh, array or scalar
+    battery_capacity,      # kWh, array or scalar
+    battery_min_reserve,   # Percentage (0-100), array or scalar
+    buying_price_per_kwh,  # $/kWh, array or scalar
+    selling_price_per_kwh, # $/kWh, array or scalar
+    operating_mode,        # One mode for the whole batch
+    timestep_hours=1.0,
+    max_charge_kw=None,
+    max_discharge_kw=None,
+    round_trip_efficiency=1.0
+):
+    """
+    Vectorized make_decision() for many independent timesteps.
+
+    Each element is decided exactly as make_decision() would decide it for the
+    same inputs; the battery charge is taken as given per element, so this does
+    not carry state between steps (see simulation.py for that).
+
+    Returns a dictionary of float arrays keyed like make_decision()'s flows, plus
+    "action_codes" (indexes into ACTION_NAMES) and "actual_min_reserve_kwh".
+    """
+    solar, wind, demand, charge, capacity, reserve_percent, buy, sell = np.broadcast_arrays(
+        *[np.asarray(v, dtype=float) for v in (
+            solar_production, wind_production, demand, battery_charge, battery_capacity,
+            battery_min_reserve, buying_price_per_kwh, selling_price_per_kwh)]
+    )
+
+    min_reserve_kwh = (reserve_percent / 100) * capacity
+    total_generation = solar + wind
+
+    surplus_case = total_generation >= demand
+    surplus = total_generation - demand
+    deficit = demand - total_generation
+
+    has_room = charge < capacity
+    above_reserve = charge > min_reserve_kwh
+    charge_room, discharge_room = battery_step_limits(charge, capacity, min_reserve_kwh, timestep_hours,
+                                                      max_charge_kw, max_discharge_kw, round_trip_efficiency)
+    charge_amount = np.minimum(surplus, charge_room)
+    discharge_amount = np.minimum(deficit, discharge_room)
+
+    zeros = np.zeros(solar.shape)
+    codes = np.zeros(solar.shape, dtype=np.int8)
+
+    power_to_home = np.where(surplus_case, demand, total_generation)
+
+    if operating_mode in ("Self-Sufficiency", "Environmental"):
+        if operating_mode == "Self-Sufficiency":
+            own, charged, discharged = "USE_OWN_GENERATION", "CHARGE_BATTERY", None
+        else:
+            own, charged, discharged = ("USE_OWN_GENERATION_RENEWABLE", "CHARGE_BATTERY_RENEWABLE_PRIORITY",
+                                        "DISCHARGE_BATTERY_RENEWABLE")
+
+        charging = surplus_case & (surplus > 0) & has_room
+        discharging = ~surplus_case & above_reserve
+        power_to_battery = np.where(charging, charge_amount, zeros)
+        power_from_battery = np.where(discharging, discharge_amount, zeros)
+        leftover_surplus = np.where(charging, surplus - charge_amount, surplus)
+        leftover_deficit = np.where(discharging, deficit - discharge_amount, deficit)
+        power_to_grid = np.where(surplus_case & (leftover_surplus > 0), leftover_surplus, zeros)
+        power_from_grid = np.where(~surplus_case & (leftover_deficit > 0), leftover_deficit, zeros)
+
+        codes[:] = ACTION_CODES[own]
+        codes[charging & (charge_amount > 0)] = ACTION_CODES[charged]
+        if discharged is not None:
+            codes[discharging & (discharge_amount > 0)] = ACTION_CODES[discharged]
+
+    elif operating_mode == "Cost Optimization":
+        sell_high = (sell > buy) & (sell > 0.20)
+        buy_low = buy < 0.15
+        buy_high = (buy > sell) & (buy > 0.25)
+
+        exporting = surplus_case & has_room & sell_high
+        charging = surplus_case & has_room & ~sell_high
+        discharging = ~surplus_case & above_reserve
+        power_to_battery = np.where(charging, charge_amount, zeros)
+        power_from_battery = np.where(discharging, discharge_amount, zeros)
+        leftover_surplus = np.where(charging, surplus - charge_amount, surplus)
+        leftover_deficit = np.where(discharging, deficit - discharge_amount, deficit)
+        power_to_grid = np.where(surplus_case & (exporting | (leftover_surplus > 0)), leftover_surplus, zeros)
+        power_from_grid = np.where(~surplus_case & (leftover_deficit > 0), leftover_deficit, zeros)
+
+        charged = charging & (charge_amount > 0)
+        discharged = discharging & (discharge_amount > 0)
+        codes[exporting] = ACTION_CODES["EXPORT_TO_GRID"]
+        codes[charged & buy_low] = ACTION_CODES["CHARGE_BATTERY_LOW_GRID_PRICE"]
+        codes[charged & ~buy_low] = ACTION_CODES["CHARGE_BATTERY"]
+        codes[discharged & buy_high] = ACTION_CODES["DISCHARGE_BATTERY_HIGH_GRID_PRICE"]
+        codes[discharged & ~buy_high] = ACTION_CODES["DISCHARGE_BATTERY"]
+        no_action = codes == ACTION_CODES["NO_ACTION"]
+        codes[no_action & surplus_case & (leftover_surplus > 0)] = ACTION_CODES["EXPORT_TO_GRID"]
+        codes[no_action & ~surplus_case & (leftover_deficit > 0)] = ACTION_CODES["IMPORT_FROM_GRID"]
+
+    else: # Default or unknown mode
+        charging = surplus_case & has_room
+        discharging = ~surplus_case & above_reserve
+        power_to_battery = np.where(charging, charge_amount, zeros)
+        power_from_battery = np.where(discharging, discharge_amount, zeros)
+        power_to_grid = np.where(surplus_case, np.where(charging, surplus - charge_amount, surplus), zeros)
+        power_from_grid = np.where(surplus_case, zeros, np.where(discharging, deficit - discharge_amount, deficit))
+
+        codes[:] = np.where(surplus_case, ACTION_CODES["DEFAULT_SURPLUS_HANDLING"],
+                            ACTION_CODES["DEFAULT_DEFICIT_HANDLING"])
+
+    return {
+        "power_to_home": _round_flow(power_to_home),
+        "power_to_battery": _round_flow(power_to_battery),
+        "power_from_battery": _round_flow(power_from_battery),
+        "power_from_grid": _round_flow(power_from_grid),
+        "power_to_grid": _round_flow(power_to_grid),
+        "action_codes": codes,
+        "actual_min_reserve_kwh": np.round(min_reserve_kwh, 2),
+    }
+
+def action_names(action_codes):
+    """Maps an array of action codes back to make_decision() action strings."""
+    return [ACTION_NAMES[code] for code in np.asarray(action_codes).tolist()]
+
+def batch_decision_at(batch, index, operating_mode):
+    """
+    Returns element `index` of a make_decisions_batch() result shaped exactly
+    like the dictionary make_decision() returns.
+    """
+    decision = {key: batch[key][index] for key in FLOW_KEYS}
+    decision["recommended_action"] = ACTION_NAMES[batch["action_codes"][index]]
+    decision["current_operating_mode"] = operating_mode
+    decision["actual_min_reserve_kwh"] = batch["actual_min_reserve_kwh"][index]
+    return decision
@@ -0,0 +1,318 @@
+# backend/dispatch_planner.py
+
+import time
+import threading
+import argparse
+from datetime import datetime
+
+import numpy as np
+
+from decision_engine import ACTION_CODES, ACTION_NAMES, FLOW_KEYS, OPTIMAL_DISPATCH_MODE
+
+# State-of-charge grid resolution. The grid is coarsened for large batteries so
+# a step never needs more than DEFAULT_MAX_STATES^2 cost evaluations.
+DEFAULT_SOC_STEP_KWH = 0.1
+DEFAULT_MAX_STATES = 101
+
+# Plans for /api/status are reused within the same step, settings/tariff/model
+# version and state-of-charge grid level
+PLAN_CACHE_MAX_ENTRIES = 32
+
+_EPSILON = 1e-9
+
+
+def _round_flows(values):
+    # Same rounding and clamping as the end of make_decision()
+    values = np.round(values, 2)
+    return np.where(values > 0, values, 0.0)
+
+def _step_cost(net_import, buy, sell):
+    # Positive net is bought at the buying price, negative net sold at the selling price
+    return np.where(net_import > 0, net_import * buy, net_import * sell)
+
+def _soc_grid(capacity, soc_step_kwh, max_states):
+    if capacity <= 0:
+        return np.zeros(1)
+    states = int(min(max_states, np.ceil(capacity / soc_step_kwh) + 1))
+    return np.linspace(0.0, capacity, max(states, 2))
+
+def _soc_level(charge, capacity, soc_step_kwh=DEFAULT_SOC_STEP_KWH, max_states=DEFAULT_MAX_STATES):
+    """Index of the state-of-charge grid level nearest to charge."""
+    soc = _soc_grid(capacity, soc_step_kwh, max_states)
+    return int(np.argmin(np.abs(soc - charge)))
+
+def plan_dispatch(solar_kwh, wind_kwh, demand_kwh, buying_prices, selling_prices,
+                  initial_charge_kwh, battery_capacity_kwh, battery_min_reserve,
+                  allow_grid_charge=True, soc_step_kwh=DEFAULT_SOC_STEP_KWH, max_states=DEFAULT_MAX_STATES,
+                  timestep_hours=1.0, max_charge_kw=None, max_discharge_kw=None, round_trip_efficiency=1.0):
+    """
+    Cost-minimizing battery schedule by dynamic programming over a discretized
+    state of charge.
+
+    Each step may move the battery to any grid level that keeps it at or above
+    the user reserve (discharging), within the power limits over the step and,
+    without grid charging, only charge from the renewable surplus. Moves are in
+    stored energy; the meter sees them through the charge / discharge half of
+    the round-trip efficiency. Energy left at the end is valued at the cheapest
+    buying price of the horizon, so the plan does not drain the battery just
+    because the horizon ends.
+
+    Returns the same dictionary as simulation.simulate_battery(), so callers can
+    use either interchangeably.
+    """
+    solar = np.asarray(solar_kwh, dtype=float)
+    wind = np.asarray(wind_kwh, dtype=float)
+    demand = np.asarray(demand_kwh, dtype=float)
+    buy = np.asarray(buying_prices, dtype=float)
+    sell = np.asarray(selling_prices, dtype=float)
+    n = len(solar)
+
+    capacity = float(battery_capacity_kwh)
+    min_reserve_kwh = (battery_min_reserve / 100) * capacity
+    dt = float(timestep_hours)
+    efficiency = float(round_trip_efficiency) ** 0.5
+    generation = solar + wind
+    # Energy over each step (kWh)
+    net_demand = (demand - generation) * dt
+    surplus = np.maximum(generation - demand, 0.0) * dt
+
+    soc = _soc_grid(capacity, soc_step_kwh, max_states)
+    delta = soc[None, :] - soc[:, None] # delta[i, j]: move from level i to level j
+    # Energy through the meter for each move: more than stored when charging, less when discharging
+    metered = np.where(delta > 0, delta / efficiency, delta * efficiency)
+
+    def move_allowed(delta, metered, target):
+        allowed = (delta >= 0) | (target >= min_reserve_kwh - _EPSILON)
+        if max_charge_kw is not None:
+            allowed &= metered <= max_charge_kw * dt + _EPSILON
+        if max_discharge_kw is not None:
+            allowed &= -metered <= max_discharge_kw * dt + _EPSILON
+        return allowed
+
+    valid = move_allowed(delta, metered, soc[None, :])
+    terminal_price = float(buy.min()) if n else 0.0
+
+    # Backward pass: value[j] is the cheapest cost-to-go from level j
+    value = -soc * terminal_price
+    policy = np.zeros((n, len(soc)), dtype=np.int32)
+    for t in range(n - 1, 0, -1):
+        allowed = valid if allow_grid_charge else valid & (metered <= surplus[t] + _EPSILON)
+        total = _step_cost(net_demand[t] + metered, buy[t], sell[t]) + value[None, :]
+        total = np.where(allowed, total, np.inf)
+        policy[t] = np.argmin(total, axis=1)
+        value = total[np.arange(len(soc)), policy[t]]
+
+    # Forward pass from the actual (off-grid) initial charge
+    targets = np.zeros(n)
+    charge = float(initial_charge_kwh)
+    if n:
+        first_delta = soc - charge
+        first_metered = np.where(first_delta > 0, first_delta / efficiency, first_delta * efficiency)
+        allowed = move_allowed(first_delta, first_metered, soc)
+        if not allow_grid_charge:
+            allowed &= first_metered <= surplus[0] + _EPSILON
+        if not allowed.any(): # Cannot reach any level (e.g. above capacity): stay nearest
+            allowed = soc == soc[np.argmin(np.abs(first_delta))]
+        first_total = np.where(allowed, _step_cost(net_demand[0] + first_metered, buy[0], sell[0]) + value, np.inf)
+        level = int(np.argmin(first_total))
+        targets[0] = soc[level]
+        for t in range(1, n):
+            level = policy[t, level]
+            targets[t] = soc[level]
+
+    return _execute_plan(targets, generation, demand, buy, sell, charge, capacity, min_reserve_kwh, dt, efficiency)
+
+def _execute_plan(targets, generation, demand, buy, sell, initial_charge, capacity, min_reserve_kwh,
+                  dt=1.0, efficiency=1.0):
+    """
+    Turns target charge levels into rounded power flows (kW over steps of dt
+    hours) and the battery trajectory; efficiency is the one-way efficiency.
+    """
+    n = len(targets)
+    flows = np.zeros((n, 5))
+    action_codes = np.zeros(n, dtype=np.int8)
+    charge_end = np.zeros(n)
+    step_cost = np.zeros(n)
+
+    own_to_home = np.minimum(generation, demand)
+    surplus = np.maximum(generation - demand, 0.0)
+    deficit = np.maximum(demand - generation, 0.0)
+
+    charge = initial_charge
+    total_import = total_export = net_cost = 0.0
+    for t in range(n):
+        move = targets[t] - charge
+        to_battery = max(move, 0.0) / (dt * efficiency)
+        from_battery = max(-move, 0.0) * efficiency / dt
+        solar_to_battery = min(to_battery, surplus[t])
+        grid_to_battery = to_battery - solar_to_battery
+        battery_to_home = min(from_battery, deficit[t])
+
+        raw = np.array([
+            own_to_home[t],
+            to_battery,
+            from_battery,
+            deficit[t] - battery_to_home + grid_to_battery,
+            surplus[t] - solar_to_battery + (from_battery - battery_to_home),
+        ])
+        rounded = _round_flows(raw)
+        flows[t] = rounded
+
+        if grid_to_battery > 0.005:
+            action = "CHARGE_BATTERY_FROM_GRID"
+        elif rounded[1] > 0:
+            action = "CHARGE_BATTERY"
+        elif rounded[2] > 0:
+            action = "DISCHARGE_BATTERY_TO_GRID" if from_battery - battery_to_home > 0.005 else "DISCHARGE_BATTERY"
+        elif deficit[t] > 0:
+            action = "HOLD_BATTERY_FOR_PEAK" if charge > min_reserve_kwh + 0.005 else "IMPORT_FROM_GRID"
+        elif surplus[t] > 0:
+            action = "EXPORT_TO_GRID"
+        else:
+            action = "NO_ACTION"
+        action_codes[t] = ACTION_CODES[action]
+
+        charge += rounded[1] * dt * efficiency
+        charge -= rounded[2] * dt / efficiency
+        charge = max(0.0, min(charge, capacity))
+
+        cost = ((rounded[3] * buy[t]) - (rounded[4] * sell[t])) * dt
+        total_import += rounded[3] * dt
+        total_export += rounded[4] * dt
+        net_cost += cost
+        charge_end[t] = charge
+        step_cost[t] = cost
+
+    return {
+        "flows": flows,
+        "action_codes": action_codes,
+        "battery_charge_kwh": charge_end,
+        "step_cost": step_cost,
+        "total_grid_import_kwh": np.float64(total_import),
+        "total_grid_export_kwh": np.float64(total_export),
+        "net_grid_cost": np.float64(net_cost),
+        "final_battery_charge_kwh": np.float64(charge),
+    }
+
+
+# --- Status integration ---
+
+_plan_cache = {}
+_plan_cache_lock = threading.Lock()
+
+def current_dispatch_decision(settings, settings_version, now=None, horizon_hours=24):
+    """
+    Decision for the current step under OPTIMAL_DISPATCH_MODE, shaped like
+    make_decision()'s result. The 24h plan behind it is solved at most once per
+    simulation step (an hour by default), settings, tariff and model version
+    and battery charge (to the planner's state-of-charge grid), so a measured
+    charge that moves away from the one planned for gets a fresh plan.
+    """
+    # Imported here so the planner can be used without loading the models
+    from forecasting import make_predictions_for_steps, ensure_models_loaded, get_model_version
+    from simulation import battery_params
+    from utils import get_step_price_arrays, get_tou_version
+
+    now = now or datetime.now()
+    timestep_minutes = int(settings.get('simulation_timestep_minutes', 60))
+    step_bucket = now.replace(minute=now.minute - now.minute % timestep_minutes, second=0, microsecond=0)
+    ensure_models_loaded() # a first load bumps the model version
+    charge = settings.get('battery_current_charge_kwh', 5.0)
+    level = _soc_level(charge, settings.get('battery_capacity_kwh', 10.0))
+    key = (step_bucket, settings_version, get_tou_version(), get_model_version(), level, horizon_hours)
+    with _plan_cache_lock:
+        plan = _plan_cache.get(key)
+
+    if plan is None:
+        steps = horizon_hours * 60 // timestep_minutes
+        times, solar, wind, demand = make_predictions_for_steps(now, steps, timestep_minutes)
+        buying, selling = get_step_price_arrays(times, timestep_minutes)
+        plan = plan_dispatch(
+            solar * settings.get('solar_capacity_kw', 5.0),
+            wind * settings.get('wind_capacity_kw', 2.0),
+            demand, buying, selling,
+            initial_charge_kwh=charge,
+            battery_capacity_kwh=settings.get('battery_capacity_kwh', 10.0),
+            battery_min_reserve=settings.get('min_battery_reserve_user_percent', 20),
+            allow_grid_charge=settings.get('allow_grid_charge', True),
+            timestep_hours=timestep_minutes / 60,
+            **battery_params(settings)
+        )
+        with _plan_cache_lock:
+            if len(_plan_cache) >= PLAN_CACHE_MAX_ENTRIES:
+                _plan_cache.clear()
+            _plan_cache[key] = plan
+
+    decision = {key: plan["flows"][0, k] for k, key in enumerate(FLOW_KEYS)}
+    decision["recommended_action"] = ACTION_NAMES[plan["action_codes"][0]]
+    decision["current_operating_mode"] = OPTIMAL_DISPATCH_MODE
+    decision["actual_min_reserve_kwh"] = round(
+        (settings.get('min_battery_reserve_user_percent', 20) / 100) * settings.get('battery_capacity_kwh', 10.0), 2)
+    return decision
+
+
+# --- Benchmark: python dispatch_planner.py [--hours 24] ---
+
+def benchmark(hours=24, start_dt=None, repeats=5):
+    """
+    Compares the planner with the greedy operating modes on the current model
+    forecast and settings. Cost is also reported net of the energy left in the
+    battery (valued at the cheapest buying price) so modes that end with
+    different charge levels compare fairly.
+    """
+    from forecasting import make_predictions_for_horizon
+    from settings_store import get_settings
+    from simulation import simulate_battery
+    from utils import get_tou_price_arrays
+
+    settings = get_settings()
+    times, solar, wind, demand = make_predictions_for_horizon(start_dt or datetime.now(), hours)
+    buying, selling = get_tou_price_arrays([dt.hour for dt in times])
+    solar = solar * settings['solar_capacity_kw']
+    wind = wind * settings['wind_capacity_kw']
+    common = dict(
+        initial_charge_kwh=settings['battery_current_charge_kwh'],
+        battery_capacity_kwh=settings['battery_capacity_kwh'],
+        battery_min_reserve=settings['min_battery_reserve_user_percent'],
+    )
+    terminal_price = min(buying)
+
+    rows = []
+    for mode in ["Cost Optimization", "Self-Sufficiency", "Environmental", OPTIMAL_DISPATCH_MODE]:
+        timings = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            if mode == OPTIMAL_DISPATCH_MODE:
+                result = plan_dispatch(solar, wind, demand, buying, selling,
+                                       allow_grid_charge=settings['allow_grid_charge'], **common)
+            else:
+                result = simulate_battery(solar, wind, demand, buying, selling, operating_mode=mode, **common)
+            timings.append(time.perf_counter() - started)
+        net_cost = float(result["net_grid_cost"])
+        final_charge = float(result["final_battery_charge_kwh"])
+        rows.append({
+            "operating_mode": mode,
+            "net_grid_cost": round(net_cost, 2),
+            "final_battery_charge_kwh": round(final_charge, 2),
+            "cost_net_of_stored_energy": round(net_cost - (final_charge - common["initial_charge_kwh"]) * terminal_price, 2),
+            "runtime_ms": round(min(timings) * 1000, 3),
+        })
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the dispatch planner against the greedy modes.")
+    parser.add_argument("--hours", type=int, default=24)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    rows = benchmark(args.hours, repeats=args.repeats)
+    header = f"{'mode':<20}{'net cost $':>12}{'final kWh':>12}{'adj. cost $':>14}{'runtime ms':>12}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(f"{row['operating_mode']:<20}{row['net_grid_cost']:>12.2f}{row['final_battery_charge_kwh']:>12.2f}"
+              f"{row['cost_net_of_stored_energy']:>14.2f}{row['runtime_ms']:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
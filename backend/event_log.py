@@ -0,0 +1,400 @@
+# backend/event_log.py
+
+import os
+import json
+import time
+import queue
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+# Several server processes (asgi_app.py --workers N) append to the same
+# segments. An flock on LOG_LOCK_NAME serializes their writes, and each process
+# indexes what the others appended before it writes or queries. Without fcntl
+# (Windows, where there is no fork() either) there is only ever one process.
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+LOG_DIR = os.path.join(os.path.dirname(__file__), 'data', 'logs')
+SEGMENT_PREFIX = 'events-'
+SEGMENT_SUFFIX = '.ndjson'
+LOG_LOCK_NAME = 'events.lock'
+
+# A new segment is started once the current one reaches this size; the oldest
+# segments are deleted beyond MAX_SEGMENTS (about 1 GB of events).
+SEGMENT_MAX_BYTES = 16 * 1024 * 1024
+MAX_SEGMENTS = 64
+
+# The writer drains up to this many events per write and fsyncs at most once
+# per FSYNC_INTERVAL_SECONDS
+WRITE_BATCH_SIZE = 1000
+WRITE_QUEUE_SIZE = 50000
+FSYNC_INTERVAL_SECONDS = 1.0
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+_INITIAL_INDEX_CAPACITY = 4096
+_QUERY_CHUNK = 65536
+
+
+# --- In-memory index ---
+# One row per stored event, in seq order: (seq, epoch time, type code, segment,
+# byte offset, byte length). Queries filter these arrays and then read only
+# the lines of the page they return.
+
+_index = None
+_index_size = 0
+_type_codes = {}
+_segments = [] # [{"path", "first_seq"}], oldest first
+_tail_offset = 0 # bytes of the newest segment already indexed
+_next_seq = 1
+_state_lock = threading.Lock()
+# Held (with the file lock) while this process reads or appends segments
+_sync_lock = threading.Lock()
+_lock_file = None
+_lock_file_pid = None
+
+_queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+_writer = None
+_writer_pid = None
+_stats = {"logged": 0, "written": 0, "dropped": 0, "fsyncs": 0, "rotations": 0}
+
+
+def _new_index(capacity):
+    return {
+        "seq": np.zeros(capacity, dtype=np.int64),
+        "ts": np.zeros(capacity),
+        "type": np.zeros(capacity, dtype=np.int16),
+        "segment": np.zeros(capacity, dtype=np.int64), # first_seq of the segment
+        "offset": np.zeros(capacity, dtype=np.int64),
+        "length": np.zeros(capacity, dtype=np.int32),
+    }
+
+def _index_append(rows):
+    global _index, _index_size
+    n = len(rows)
+    if _index_size + n > len(_index["seq"]):
+        capacity = max(_index_size + n, 2 * len(_index["seq"]))
+        grown = _new_index(capacity)
+        for key, array in _index.items():
+            grown[key][:_index_size] = array[:_index_size]
+        _index = grown
+    for field, values in zip(("seq", "ts", "type", "segment", "offset", "length"), zip(*rows)):
+        _index[field][_index_size:_index_size + n] = values
+    _index_size += n
+
+def _index_drop_segment(first_seq):
+    global _index_size
+    keep = _index["segment"][:_index_size] != first_seq
+    kept = int(keep.sum())
+    for array in _index.values():
+        array[:kept] = array[:_index_size][keep]
+    _index_size = kept
+
+def _type_code(event_type):
+    code = _type_codes.get(event_type)
+    if code is None:
+        code = _type_codes[event_type] = len(_type_codes) + 1
+    return code
+
+def _segment_path(first_seq):
+    return os.path.join(LOG_DIR, f"{SEGMENT_PREFIX}{first_seq:012d}{SEGMENT_SUFFIX}")
+
+def _segment_files():
+    """(first_seq, path) of the segments on disk, oldest first."""
+    names = sorted(name for name in os.listdir(LOG_DIR)
+                   if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX))
+    return [(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]), os.path.join(LOG_DIR, name)) for name in names]
+
+@contextmanager
+def _file_lock(exclusive):
+    """Serializes segment access with other threads and (through flock) other processes."""
+    global _lock_file, _lock_file_pid
+    with _sync_lock:
+        if fcntl is None:
+            yield
+            return
+        # flock is per open file, so a forked child opens its own
+        if _lock_file is None or _lock_file_pid != os.getpid():
+            _lock_file = open(os.path.join(LOG_DIR, LOG_LOCK_NAME), 'ab')
+            _lock_file_pid = os.getpid()
+        fcntl.flock(_lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(_lock_file, fcntl.LOCK_UN)
+
+def _read_segment(path, first_seq, offset, truncate):
+    """Index rows for the complete lines of a segment from offset on, and the offset after them."""
+    rows = []
+    try:
+        with open(path, 'rb+' if truncate else 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Torn write from a crash: cut it off so new events start on a clean line
+                    if truncate:
+                        f.truncate(offset)
+                    break
+                try:
+                    event = json.loads(line)
+                    rows.append((event["seq"], event["ts"], _type_code(event["type"]), first_seq, offset, len(line)))
+                except (ValueError, KeyError):
+                    pass
+                offset += len(line)
+    except FileNotFoundError:
+        pass
+    return rows, offset
+
+def _sync(truncate=False):
+    """
+    Brings the index up to date with the segments on disk: lines appended
+    since the last sync (by any process, or an earlier run on first use) and
+    segments other processes rotated in or deleted. Callers hold _file_lock();
+    truncate (cutting off torn lines) needs it exclusive.
+    """
+    global _tail_offset, _next_seq
+    on_disk = _segment_files()
+    present = {first_seq for first_seq, _ in on_disk}
+    with _state_lock:
+        for segment in [s for s in _segments if s["first_seq"] not in present]:
+            _segments.remove(segment)
+            _index_drop_segment(segment["first_seq"])
+        tail = _segments[-1]["first_seq"] if _segments else None
+        offset = _tail_offset
+    for first_seq, path in on_disk:
+        if tail is not None and first_seq < tail:
+            continue
+        rows, end = _read_segment(path, first_seq, offset if first_seq == tail else 0, truncate)
+        with _state_lock:
+            if first_seq != tail:
+                _segments.append({"path": path, "first_seq": first_seq})
+            if rows:
+                _index_append(rows)
+                _next_seq = max(_next_seq, rows[-1][0] + 1)
+            _tail_offset = end
+
+def _ensure_started():
+    """
+    Starts this process's writer thread on first use. The thread loads the
+    index from disk before writing, so the caller does not wait for it.
+    """
+    global _index, _writer, _writer_pid
+    if _writer is not None and _writer_pid == os.getpid():
+        return
+    with _state_lock:
+        if _writer is not None and _writer_pid == os.getpid():
+            return
+        os.makedirs(LOG_DIR, exist_ok=True)
+        if _index is None:
+            _index = _new_index(_INITIAL_INDEX_CAPACITY)
+        # A forked child keeps the parent's index but needs its own writer
+        _writer = threading.Thread(target=_run_writer, name="event-log-writer", daemon=True)
+        _writer_pid = os.getpid()
+        _writer.start()
+
+
+# --- Writer ---
+
+def log_event(event_type, message, data=None):
+    """
+    Queues an event for the background writer and returns immediately. The
+    writer numbers it (seq) when it is appended.
+    Events are dropped (and counted) if the writer falls WRITE_QUEUE_SIZE behind.
+    Returns:
+        bool: False if the event was dropped.
+    """
+    _ensure_started()
+    now = time.time()
+    event = {
+        "seq": None,
+        "ts": now,
+        "timestamp": datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S"),
+        "type": event_type,
+        "message": message,
+        "data": data or {},
+    }
+    with _state_lock:
+        _stats["logged"] += 1
+        if _queue.full():
+            _stats["dropped"] += 1
+            return False
+        _queue.put_nowait(event)
+    return True
+
+def _open_segment(first_seq):
+    """Starts a new segment (callers hold the exclusive file lock) and deletes the oldest beyond MAX_SEGMENTS."""
+    global _tail_offset
+    path = _segment_path(first_seq)
+    open(path, 'ab').close()
+    with _state_lock:
+        _segments.append({"path": path, "first_seq": first_seq})
+        _tail_offset = 0
+        _stats["rotations"] += 1
+        while len(_segments) > MAX_SEGMENTS:
+            oldest = _segments.pop(0)
+            _index_drop_segment(oldest["first_seq"])
+            try:
+                os.remove(oldest["path"])
+            except FileNotFoundError:
+                pass
+    return path
+
+def _write_batch(f, batch):
+    """
+    Numbers and appends a batch to the newest segment, rotating first if it
+    is full.
+    Args:
+        f: This writer's open handle (None or the handle of an older segment
+            are replaced).
+    Returns:
+        The handle now open on the newest segment.
+    """
+    global _tail_offset, _next_seq
+    with _file_lock(exclusive=True):
+        # Other processes may have appended (or rotated) since our last write
+        _sync(truncate=True)
+        with _state_lock:
+            path = _segments[-1]["path"] if _segments else None
+            full = path is None or _tail_offset >= SEGMENT_MAX_BYTES
+            first_seq = _next_seq
+        if full:
+            path = _open_segment(first_seq)
+        if f is None or f.name != path:
+            if f is not None:
+                os.fsync(f.fileno())
+                f.close()
+            f = open(path, 'ab')
+
+        for i, event in enumerate(batch):
+            event["seq"] = first_seq + i
+        lines = [(json.dumps(event, default=float) + "\n").encode() for event in batch]
+        f.write(b"".join(lines))
+        f.flush()
+        with _state_lock:
+            segment = _segments[-1]["first_seq"]
+            offset = _tail_offset
+            rows = []
+            for event, line in zip(batch, lines):
+                rows.append((event["seq"], event["ts"], _type_code(event["type"]), segment, offset, len(line)))
+                offset += len(line)
+            _index_append(rows)
+            _tail_offset = offset
+            _next_seq = first_seq + len(batch)
+            _stats["written"] += len(batch)
+    return f
+
+def _run_writer():
+    f = None
+    last_fsync = time.monotonic()
+    dirty = False
+    try:
+        with _file_lock(exclusive=True):
+            _sync(truncate=True)
+    except OSError as e:
+        print(f"Error loading event log: {e}")
+    while True:
+        try:
+            batch = [_queue.get(timeout=FSYNC_INTERVAL_SECONDS)]
+        except queue.Empty:
+            batch = []
+        while batch and len(batch) < WRITE_BATCH_SIZE:
+            try:
+                batch.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        try:
+            if batch:
+                f = _write_batch(f, batch)
+                dirty = True
+            if dirty and time.monotonic() - last_fsync >= FSYNC_INTERVAL_SECONDS:
+                os.fsync(f.fileno())
+                _stats["fsyncs"] += 1
+                last_fsync = time.monotonic()
+                dirty = False
+        except OSError as e:
+            print(f"Error writing event log: {e}")
+            _stats["dropped"] += len(batch)
+
+def flush(timeout=5.0):
+    """Waits until every event logged so far is on disk (for tests and shutdown)."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with _state_lock:
+            if _stats["written"] + _stats["dropped"] >= _stats["logged"]:
+                return True
+        time.sleep(0.01)
+    return False
+
+
+# --- Queries ---
+
+def query_events(cursor=None, limit=DEFAULT_PAGE_SIZE, types=None, start=None, end=None):
+    """
+    Newest-first page of events.
+    Args:
+        cursor (int): Only events with seq below this (the previous page's next_cursor).
+        limit (int): Page size, capped at MAX_PAGE_SIZE.
+        types (list[str]): Event types to include; all when omitted.
+        start, end (float): Epoch-seconds time range, inclusive.
+    Returns:
+        dict: "events" and "next_cursor" (None on the last page).
+    """
+    _ensure_started()
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    # Pick up what other server processes appended since this one last looked
+    with _file_lock(exclusive=False):
+        _sync()
+    with _state_lock:
+        n = _index_size
+        hi = n if cursor is None else int(np.searchsorted(_index["seq"][:n], cursor, side='left'))
+        # Scan backwards a chunk at a time so the newest pages stay cheap
+        rows = []
+        chunk_end = hi
+        while chunk_end > 0 and len(rows) <= limit:
+            chunk_start = max(0, chunk_end - _QUERY_CHUNK)
+            mask = np.ones(chunk_end - chunk_start, dtype=bool)
+            if types:
+                codes = [_type_codes[t] for t in types if t in _type_codes]
+                mask &= np.isin(_index["type"][chunk_start:chunk_end], codes)
+            if start is not None:
+                mask &= _index["ts"][chunk_start:chunk_end] >= start
+            if end is not None:
+                mask &= _index["ts"][chunk_start:chunk_end] <= end
+            rows.extend((chunk_start + np.flatnonzero(mask))[::-1][:limit + 1 - len(rows)].tolist())
+            chunk_end = chunk_start
+        page = [(int(_index["seq"][r]), int(_index["segment"][r]), int(_index["offset"][r]), int(_index["length"][r]))
+                for r in rows[:limit]]
+        has_more = len(rows) > limit
+
+    events = []
+    handles = {}
+    try:
+        for seq, segment, offset, length in page:
+            f = handles.get(segment)
+            if f is None:
+                f = handles[segment] = open(_segment_path(segment), 'rb')
+            f.seek(offset)
+            try:
+                events.append(json.loads(f.read(length)))
+            except ValueError:
+                print(f"Event log: unreadable entry {seq} in segment {segment}")
+    except FileNotFoundError:
+        pass # Segment rotated away while reading
+    finally:
+        for f in handles.values():
+            f.close()
+    return {"events": events, "next_cursor": page[-1][0] if has_more and page else None}
+
+def get_event_log_stats():
+    with _state_lock:
+        stats = dict(_stats)
+        stats.update(indexed=_index_size, segments=len(_segments), queued=_queue.qsize(),
+                     types=sorted(_type_codes))
+    return stats
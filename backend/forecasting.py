@@ -0,0 +1,610 @@
+# backend/forecasting.py
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import numpy as np
+
+from metrics import inc
+
+# pandas, joblib and scikit-learn (pulled in by unpickling) are imported on
+# first use, so importing this module does not pay for them.
+
+# Load AI models
+MODEL_DIR = os.path.join(os.path.dirname(__file__), 'models')
+MODEL_FILES = {
+    "solar": 'solar_production_model.joblib',
+    "wind": 'wind_production_model.joblib',
+    "demand": 'household_demand_model.joblib',
+}
+
+FEATURES = ['hour', 'dayofweek', 'month', 'year']
+
+# Arrays in (uncompressed) model files are memory-mapped read-only, so server
+# worker processes share the page cache instead of each holding a private copy.
+# Set SYNAPSE_MODEL_MMAP=0 to load fully into memory.
+MODEL_MMAP_MODE = None if os.environ.get('SYNAPSE_MODEL_MMAP') == '0' else 'r'
+
+# After a failed load, predictions fall back to zeros and the load is retried
+# at most this often instead of on every request
+MODEL_RETRY_SECONDS = 30.0
+
+# Hours outside this window never produce solar output
+SOLAR_FIRST_HOUR = 6
+SOLAR_LAST_HOUR = 19
+
+# The models only see (hour, dayofweek, month, year), so their whole output
+# for a year is a 12 x 7 x 24 grid. Serving reads predictions for the current
+# and next year from tables compiled from the models (O(1) indexing, no
+# scikit-learn on the hot path); other years still go through the models.
+# SYNAPSE_FORECAST_TABLES=0 serves everything through the models.
+FORECAST_TABLES_ENABLED = os.environ.get('SYNAPSE_FORECAST_TABLES') != '0'
+FORECAST_TABLES_PATH = os.path.join(MODEL_DIR, 'compiled', 'forecast_tables.npz')
+FORECAST_TABLE_YEARS = 2
+# How often serving checks whether the model files changed (or the year rolled
+# over) and the tables need a rebuild
+FORECAST_TABLE_CHECK_SECONDS = 10.0
+
+# Model outputs only depend on (hour, dayofweek, month, year), so they are
+# memoized per feature tuple. 4096 entries is more than a year of hours.
+PREDICTION_CACHE_MAX_ENTRIES = 4096
+
+solar_model = None
+wind_model = None
+demand_model = None
+
+_models_lock = threading.Lock()
+_model_state = {
+    "status": "not_loaded", # not_loaded | loading | loaded | failed
+    "error": None,
+    "load_seconds": {},
+    "warmup_seconds": None,
+    "loaded_at": None,
+}
+_last_failed_attempt = None
+_warmup_thread = None
+# Bumped by every load attempt; cached responses built on older models are stale
+_model_version = 0
+
+_tables = None
+_tables_checked_at = 0.0
+_tables_rebuild_thread = None
+
+_prediction_cache = OrderedDict()
+_prediction_cache_lock = threading.Lock()
+_prediction_cache_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+
+def _load_models_locked():
+    global solar_model, wind_model, demand_model, _last_failed_attempt, _model_version
+    _model_state["status"] = "loading"
+    load_seconds = {}
+    try:
+        import joblib
+        models = {}
+        for name, filename in MODEL_FILES.items():
+            started = time.perf_counter()
+            models[name] = joblib.load(os.path.join(MODEL_DIR, filename), mmap_mode=MODEL_MMAP_MODE)
+            load_seconds[name] = round(time.perf_counter() - started, 4)
+        solar_model, wind_model, demand_model = models["solar"], models["wind"], models["demand"]
+        _model_state.update(status="loaded", error=None, loaded_at=datetime.now().isoformat())
+        print("Models loaded successfully!")
+        if FORECAST_TABLES_ENABLED:
+            _ensure_tables_locked()
+    except Exception as e:
+        print(f"Error loading models: {e}")
+        solar_model = None
+        wind_model = None
+        demand_model = None
+        _model_state.update(status="failed", error=str(e), loaded_at=None)
+        inc("synapse_model_load_failures_total")
+        _last_failed_attempt = time.monotonic()
+    _model_state["load_seconds"] = load_seconds
+    clear_prediction_cache()
+    _model_version += 1
+    return models_loaded()
+
+def load_models():
+    """
+    (Re)loads the three models from MODEL_DIR and drops every cached prediction.
+    Returns:
+        bool: True if all models were loaded.
+    """
+    with _models_lock:
+        return _load_models_locked()
+
+def ensure_models_loaded():
+    """
+    Loads the models on first use (thread-safe; concurrent callers wait for
+    the one load). A failed load is retried after MODEL_RETRY_SECONDS.
+    Returns:
+        bool: True if the models are available.
+    """
+    if models_loaded():
+        return True
+    with _models_lock:
+        if models_loaded():
+            return True
+        if (_last_failed_attempt is not None
+                and time.monotonic() - _last_failed_attempt < MODEL_RETRY_SECONDS):
+            return False
+        return _load_models_locked()
+
+def _warm_up():
+    # Tables compiled for the current model files serve predictions right
+    # away, before the models themselves have finished loading
+    if FORECAST_TABLES_ENABLED:
+        load_forecast_tables()
+    if not ensure_models_loaded():
+        return
+    # One dummy prediction pulls pandas/scikit-learn code paths into memory
+    # without touching the prediction cache
+    started = time.perf_counter()
+    _predict_uncached([datetime.now()])
+    _model_state["warmup_seconds"] = round(time.perf_counter() - started, 4)
+
+def start_model_warmup():
+    """
+    Loads the models and runs a dummy prediction on a background thread, so
+    the first request does not pay for it. Does nothing if already started.
+    """
+    global _warmup_thread
+    if _warmup_thread is None:
+        _warmup_thread = threading.Thread(target=_warm_up, name="model-warmup", daemon=True)
+        _warmup_thread.start()
+    return _warmup_thread
+
+def get_model_version():
+    """Counter bumped every time the models are (re)loaded or fail to load."""
+    return _model_version
+
+def models_loaded():
+    return all([solar_model, wind_model, demand_model])
+
+def get_model_state():
+    """Model load status, last error and per-model load/warm-up timings."""
+    # No lock: a load in progress holds it, and a health check must not wait
+    state = dict(_model_state)
+    state["load_seconds"] = dict(state["load_seconds"])
+    state["models_loaded"] = models_loaded()
+    state["forecast_tables"] = get_forecast_table_info()
+    return state
+
+
+# --- Prediction cache ---
+
+def _feature_key(dt_object):
+    return (dt_object.hour, dt_object.weekday(), dt_object.month, dt_object.year)
+
+def _cache_get(key):
+    with _prediction_cache_lock:
+        value = _prediction_cache.get(key)
+        if value is None:
+            _prediction_cache_stats["misses"] += 1
+            return None
+        _prediction_cache.move_to_end(key)
+        _prediction_cache_stats["hits"] += 1
+        return value
+
+def _cache_put(key, value):
+    with _prediction_cache_lock:
+        _prediction_cache[key] = value
+        _prediction_cache.move_to_end(key)
+        while len(_prediction_cache) > PREDICTION_CACHE_MAX_ENTRIES:
+            _prediction_cache.popitem(last=False)
+            _prediction_cache_stats["evictions"] += 1
+
+def clear_prediction_cache():
+    with _prediction_cache_lock:
+        _prediction_cache.clear()
+        _prediction_cache_stats["invalidations"] += 1
+
+def get_prediction_cache_stats():
+    """
+    Returns hit/miss counters and the current size of the prediction cache.
+    """
+    with _prediction_cache_lock:
+        stats = dict(_prediction_cache_stats)
+        stats["size"] = len(_prediction_cache)
+    stats["max_entries"] = PREDICTION_CACHE_MAX_ENTRIES
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    return stats
+
+
+# Prediction helper function
+def create_features_for_time(dt_object):
+    import pandas as pd
+    data = {'hour': [dt_object.hour], 'dayofweek': [dt_object.weekday()], 'month': [dt_object.month], 'year': [dt_object.year]}
+    return pd.DataFrame(data)
+
+def make_predictions_for_time(dt_object):
+    tables = _current_tables()
+    if tables is not None:
+        y = dt_object.year - tables["first_year"]
+        if 0 <= y < tables["years"]:
+            i = (y, dt_object.month - 1, dt_object.weekday(), dt_object.hour)
+            return tables["solar"][i], tables["wind"][i], tables["demand"][i]
+
+    if not ensure_models_loaded():
+        return 0.0, 0.0, 0.0
+
+    key = _feature_key(dt_object)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+
+    result = _predict_one(dt_object)
+    _cache_put(key, result)
+    return result
+
+def _predict_one(dt_object):
+    features = create_features_for_time(dt_object)
+    hour = features['hour'].iloc[0]
+
+    solar_pred = solar_model.predict(features)[0]
+    wind_pred = wind_model.predict(features)[0]
+    demand_pred = demand_model.predict(features)[0]
+
+    if hour < SOLAR_FIRST_HOUR or hour > SOLAR_LAST_HOUR:
+        solar_pred = 0.0
+
+    return (max(0.0, solar_pred), max(0.0, wind_pred), max(0.0, demand_pred))
+
+
+# --- Batched forecasting ---
+
+def forecast_times(start_dt, hours):
+    """
+    Returns the list of hourly datetimes covering a forecast horizon.
+    Args:
+        start_dt (datetime): First hour of the horizon.
+        hours (int): Number of hourly steps.
+    """
+    return [start_dt + timedelta(hours=i) for i in range(hours)]
+
+def create_features_for_times(dt_objects):
+    """
+    Builds the model feature matrix for many timestamps at once.
+    Args:
+        dt_objects (list[datetime]): Timestamps to forecast.
+    Returns:
+        pd.DataFrame: One row per timestamp with the FEATURES columns.
+    """
+    import pandas as pd
+    data = {
+        'hour': [dt.hour for dt in dt_objects],
+        'dayofweek': [dt.weekday() for dt in dt_objects],
+        'month': [dt.month for dt in dt_objects],
+        'year': [dt.year for dt in dt_objects],
+    }
+    return pd.DataFrame(data, columns=FEATURES)
+
+def _predict_uncached(dt_objects):
+    features = create_features_for_times(dt_objects)
+    hours = features['hour'].to_numpy()
+
+    solar_pred = np.asarray(solar_model.predict(features), dtype=float)
+    wind_pred = np.asarray(wind_model.predict(features), dtype=float)
+    demand_pred = np.asarray(demand_model.predict(features), dtype=float)
+
+    night = (hours < SOLAR_FIRST_HOUR) | (hours > SOLAR_LAST_HOUR)
+    solar_pred = np.where(night, 0.0, solar_pred)
+
+    return np.maximum(solar_pred, 0.0), np.maximum(wind_pred, 0.0), np.maximum(demand_pred, 0.0)
+
+def make_predictions_for_times(dt_objects):
+    """
+    Batched version of make_predictions_for_time().
+    Cached feature tuples are served from the prediction cache; the misses
+    go through each model once and get the night-time solar mask and the
+    zero clamp applied as array operations.
+    Args:
+        dt_objects (list[datetime]): Timestamps to forecast.
+    Returns:
+        tuple: (solar, wind, demand) float arrays, one value per timestamp.
+    """
+    n = len(dt_objects)
+    solar = np.zeros(n)
+    wind = np.zeros(n)
+    demand = np.zeros(n)
+    if n == 0:
+        return solar, wind, demand
+
+    remaining = range(n)
+    tables = _current_tables()
+    if tables is not None:
+        idx = np.array([(dt.year, dt.month - 1, dt.weekday(), dt.hour) for dt in dt_objects])
+        idx[:, 0] -= tables["first_year"]
+        covered = (idx[:, 0] >= 0) & (idx[:, 0] < tables["years"])
+        rows = tuple(idx[covered].T)
+        solar[covered], wind[covered], demand[covered] = tables["solar"][rows], tables["wind"][rows], tables["demand"][rows]
+        if covered.all():
+            return solar, wind, demand
+        remaining = np.flatnonzero(~covered)
+
+    if not ensure_models_loaded():
+        return solar, wind, demand
+
+    missing = {}
+    for i in remaining:
+        dt = dt_objects[i]
+        key = _feature_key(dt)
+        cached = _cache_get(key)
+        if cached is None:
+            missing.setdefault(key, (dt, []))[1].append(i)
+        else:
+            solar[i], wind[i], demand[i] = cached
+
+    if missing:
+        keys = list(missing)
+        solar_pred, wind_pred, demand_pred = _predict_uncached([missing[key][0] for key in keys])
+        for j, key in enumerate(keys):
+            idx = missing[key][1]
+            solar[idx], wind[idx], demand[idx] = solar_pred[j], wind_pred[j], demand_pred[j]
+            _cache_put(key, (solar_pred[j], wind_pred[j], demand_pred[j]))
+
+    return solar, wind, demand
+
+def make_predictions_for_horizon(start_dt, hours):
+    """
+    Convenience wrapper: forecasts `hours` consecutive hours from `start_dt`.
+    Returns:
+        tuple: (times, solar, wind, demand)
+    """
+    times = forecast_times(start_dt, hours)
+    solar, wind, demand = make_predictions_for_times(times)
+    return times, solar, wind, demand
+
+def make_predictions_for_steps(start_dt, steps, timestep_minutes=60):
+    """
+    Forecasts `steps` consecutive steps of `timestep_minutes` from `start_dt`.
+    The models are hourly, so shorter steps take the hourly predictions
+    linearly interpolated to each step's start.
+    Returns:
+        tuple: (times, solar, wind, demand)
+    """
+    if timestep_minutes >= 60:
+        return make_predictions_for_horizon(start_dt, steps)
+    hours = -(-steps * timestep_minutes // 60)
+    hourly = make_predictions_for_times(forecast_times(start_dt, hours + 1))
+    offsets = np.arange(steps) * (timestep_minutes / 60)
+    solar, wind, demand = (np.interp(offsets, np.arange(hours + 1), values) for values in hourly)
+    times = [start_dt + timedelta(minutes=timestep_minutes * i) for i in range(steps)]
+    return times, solar, wind, demand
+
+
+# --- Compiled forecast tables ---
+
+def _model_signature():
+    """(file, mtime_ns, size) of each model file, or None if any is missing."""
+    signature = []
+    for filename in MODEL_FILES.values():
+        try:
+            stat = os.stat(os.path.join(MODEL_DIR, filename))
+        except OSError:
+            return None
+        signature.append([filename, stat.st_mtime_ns, stat.st_size])
+    return signature
+
+def _tables_valid(tables, signature, year):
+    return (tables is not None and signature is not None and tables["signature"] == signature
+            and tables["first_year"] <= year < tables["first_year"] + tables["years"])
+
+def _grid_features(first_year, years):
+    """Feature rows for every (year, month, dayofweek, hour), in table order."""
+    import pandas as pd
+    year, month, dayofweek, hour = np.meshgrid(np.arange(first_year, first_year + years), np.arange(1, 13),
+                                               np.arange(7), np.arange(24), indexing='ij')
+    return pd.DataFrame({'hour': hour.ravel(), 'dayofweek': dayofweek.ravel(), 'month': month.ravel(),
+                         'year': year.ravel()}, columns=FEATURES)
+
+def _compile_tables(first_year, years, signature):
+    """Evaluates the loaded models over the feature grid (callers hold _models_lock)."""
+    started = time.perf_counter()
+    features = _grid_features(first_year, years)
+    shape = (years, 12, 7, 24)
+    night = (features['hour'].to_numpy() < SOLAR_FIRST_HOUR) | (features['hour'].to_numpy() > SOLAR_LAST_HOUR)
+    solar = np.where(night, 0.0, np.asarray(solar_model.predict(features), dtype=float))
+    wind = np.asarray(wind_model.predict(features), dtype=float)
+    demand = np.asarray(demand_model.predict(features), dtype=float)
+    return {
+        "solar": np.maximum(solar, 0.0).reshape(shape),
+        "wind": np.maximum(wind, 0.0).reshape(shape),
+        "demand": np.maximum(demand, 0.0).reshape(shape),
+        "first_year": first_year,
+        "years": years,
+        "signature": signature,
+        "source": "compiled",
+        "built_at": datetime.now().isoformat(timespec="seconds"),
+        "compile_seconds": round(time.perf_counter() - started, 4),
+    }
+
+def _save_tables(tables, path=FORECAST_TABLES_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, solar=tables["solar"], wind=tables["wind"], demand=tables["demand"],
+                 meta=json.dumps({key: tables[key] for key in ("first_year", "years", "signature", "built_at")}))
+    os.replace(tmp_path, path)
+
+def _read_tables(path=FORECAST_TABLES_PATH):
+    try:
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            tables = {name: data[name] for name in ("solar", "wind", "demand")}
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Could not read forecast tables: {e}")
+        return None
+    tables.update(meta, source="file", compile_seconds=None)
+    return tables
+
+def load_forecast_tables():
+    """
+    Installs the tables saved by an earlier compile if they were built from
+    the current model files and cover this year (the models are not needed).
+    Returns:
+        bool: True if valid tables are in use afterwards.
+    """
+    global _tables
+    signature = _model_signature()
+    year = datetime.now().year
+    if _tables_valid(_tables, signature, year):
+        return True
+    if not os.path.exists(FORECAST_TABLES_PATH):
+        return False
+    tables = _read_tables()
+    if not _tables_valid(tables, signature, year):
+        return False
+    _tables = tables
+    return True
+
+def _ensure_tables_locked():
+    global _tables
+    if load_forecast_tables() or not models_loaded():
+        return
+    signature = _model_signature()
+    if signature is None:
+        return
+    _tables = _compile_tables(datetime.now().year, FORECAST_TABLE_YEARS, signature)
+    try:
+        _save_tables(_tables)
+    except OSError as e:
+        print(f"Could not save forecast tables: {e}")
+
+def _rebuild_tables():
+    global _tables
+    with _models_lock:
+        tables = _tables
+        signature = _model_signature()
+        if tables is not None and tables["signature"] != signature:
+            # New model files: reload them, which recompiles (or drops) the tables
+            _tables = None
+            _load_models_locked()
+        else:
+            _ensure_tables_locked()
+
+def _current_tables():
+    """
+    The tables in use (None: serve through the models). Every
+    FORECAST_TABLE_CHECK_SECONDS this also checks the model files and the
+    year; a rebuild then runs in the background while the old tables keep
+    serving (rows outside their years go through the models).
+    """
+    global _tables_checked_at, _tables_rebuild_thread
+    tables = _tables
+    if tables is None:
+        return None
+    now = time.monotonic()
+    if now - _tables_checked_at >= FORECAST_TABLE_CHECK_SECONDS:
+        _tables_checked_at = now
+        if (not _tables_valid(tables, _model_signature(), datetime.now().year)
+                and (_tables_rebuild_thread is None or not _tables_rebuild_thread.is_alive())):
+            _tables_rebuild_thread = threading.Thread(target=_rebuild_tables, name="forecast-tables", daemon=True)
+            _tables_rebuild_thread.start()
+    return tables
+
+def get_forecast_table_info():
+    tables = _tables
+    if tables is None:
+        return {"enabled": FORECAST_TABLES_ENABLED, "in_use": False}
+    return {
+        "enabled": FORECAST_TABLES_ENABLED,
+        "in_use": True,
+        "source": tables["source"],
+        "first_year": tables["first_year"],
+        "years": tables["years"],
+        "built_at": tables["built_at"],
+        "compile_seconds": tables["compile_seconds"],
+    }
+
+def compile_forecast_tables(first_year=None, years=FORECAST_TABLE_YEARS, path=FORECAST_TABLES_PATH):
+    """
+    Evaluates the models over every (year, month, dayofweek, hour) of
+    `years` years from `first_year` (default: this year), saves the tables
+    to `path` and serves from them.
+    Returns:
+        dict: Table info.
+    Raises:
+        RuntimeError: If the models cannot be loaded.
+    """
+    global _tables
+    if not ensure_models_loaded():
+        raise RuntimeError(f"Models could not be loaded: {_model_state['error']}")
+    with _models_lock:
+        _tables = _compile_tables(first_year or datetime.now().year, years, _model_signature())
+        _save_tables(_tables, path)
+    return get_forecast_table_info()
+
+def _grid_datetime(year, month, dayofweek, hour):
+    """A datetime with exactly these features (days 1-7 cover every weekday)."""
+    first = datetime(year, month, 1, hour)
+    return first + timedelta(days=(dayofweek - first.weekday()) % 7)
+
+def validate_forecast_tables(single_row_samples=200, seed=0):
+    """
+    Checks the tables in use against the models: the whole grid against one
+    batched model.predict, and `single_row_samples` random grid points (None:
+    all of them) against the one-row path make_predictions_for_time() used
+    before the tables existed. Parity is exact equality.
+    Returns:
+        dict: Points checked and mismatches per check.
+    Raises:
+        RuntimeError: If there are no tables or models to compare.
+    """
+    if _tables is None or not ensure_models_loaded():
+        raise RuntimeError("Forecast tables and models must both be available")
+    tables = _tables
+    first_year, years = tables["first_year"], tables["years"]
+    with _models_lock:
+        fresh = _compile_tables(first_year, years, tables["signature"])
+    batched = {name: int((fresh[name] != tables[name]).sum()) for name in ("solar", "wind", "demand")}
+
+    grid = list(np.ndindex(years, 12, 7, 24))
+    if single_row_samples is not None and single_row_samples < len(grid):
+        picks = np.random.default_rng(seed).choice(len(grid), single_row_samples, replace=False)
+        grid = [grid[i] for i in picks]
+    single = {"solar": 0, "wind": 0, "demand": 0}
+    for y, m, d, h in grid:
+        expected = _predict_one(_grid_datetime(first_year + y, m + 1, d, h))
+        for name, value in zip(("solar", "wind", "demand"), expected):
+            if float(tables[name][y, m, d, h]) != float(value):
+                single[name] += 1
+    return {
+        "grid_points": int(np.prod(tables["solar"].shape)),
+        "batched_mismatches": batched,
+        "single_row_points": len(grid),
+        "single_row_mismatches": single,
+        "ok": not any(batched.values()) and not any(single.values()),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile the forecasting models into lookup tables.")
+    parser.add_argument("--first-year", type=int, default=None, help="Defaults to the current year")
+    parser.add_argument("--years", type=int, default=FORECAST_TABLE_YEARS)
+    parser.add_argument("--check", action="store_true", help="Validate the tables against model.predict")
+    parser.add_argument("--check-all", action="store_true", help="Validate every grid point one row at a time")
+    args = parser.parse_args(argv)
+
+    try:
+        info = compile_forecast_tables(args.first_year, args.years)
+    except RuntimeError as e:
+        print(e)
+        return 1
+    print(f"Compiled {args.years} year(s) from {info['first_year']} in {info['compile_seconds']}s "
+          f"-> {FORECAST_TABLES_PATH}")
+    if args.check or args.check_all:
+        result = validate_forecast_tables(None if args.check_all else 200)
+        print(json.dumps(result, indent=2))
+        return 0 if result["ok"] else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
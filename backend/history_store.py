@@ -0,0 +1,311 @@
+# backend/history_store.py
+
+import os
+import csv
+import json
+import shutil
+import argparse
+import tempfile
+import threading
+from datetime import date
+
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+HISTORY_CSV_FILEPATH = os.path.join(DATA_DIR, 'renewable_power_data.csv')
+# Derived from the CSV; rebuilt automatically whenever the CSV changes
+HISTORY_STORE_DIR = os.path.join(DATA_DIR, 'history')
+
+STORE_FORMAT_VERSION = 1
+
+# CSV header -> API column name, in storage order
+COLUMNS = {
+    "Consumption": "consumption",
+    "Wind": "wind",
+    "Solar": "solar",
+    "Wind+Solar": "wind_plus_solar",
+}
+COLUMN_NAMES = list(COLUMNS.values())
+
+STATS = ("sum", "mean", "count", "min", "max")
+RESOLUTIONS = ("daily", "monthly", "yearly")
+
+
+# --- Building the store from the CSV ---
+
+def _parse_date(text):
+    # The file mixes "MM-DD-YYYY" and "M/D/YYYY"; both are month first
+    month, day, year = text.strip().replace('/', '-').split('-')
+    return date(int(year), int(month), int(day))
+
+def _parse_value(text):
+    text = text.strip()
+    return float(text) if text else np.nan
+
+def read_history_csv(path=HISTORY_CSV_FILEPATH):
+    """
+    Parses the CSV into (dates, values) sorted by date.
+    Returns:
+        tuple: datetime64[D] array of length n and an (n, len(COLUMNS)) float
+        array with NaN for empty cells.
+    """
+    with open(path, 'r', newline='') as f:
+        reader = csv.DictReader(f)
+        rows = [(_parse_date(row['Date']), [_parse_value(row.get(header) or '') for header in COLUMNS])
+                for row in reader if row.get('Date')]
+
+    dates = np.array([row[0] for row in rows], dtype='datetime64[D]')
+    values = np.array([row[1] for row in rows], dtype=float).reshape(len(rows), len(COLUMNS))
+    order = np.argsort(dates, kind='stable')
+    return dates[order], values[order]
+
+def _period_stats(values, starts):
+    """(periods, columns, STATS) aggregates of the row groups beginning at `starts`."""
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+    sums = np.add.reduceat(filled, starts, axis=0)
+    counts = np.add.reduceat(valid.astype(np.int64), starts, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+    mins = np.fmin.reduceat(values, starts, axis=0)
+    maxs = np.fmax.reduceat(values, starts, axis=0)
+    sums = np.where(counts > 0, sums, np.nan)
+    return np.stack([sums, means, counts.astype(float), mins, maxs], axis=2)
+
+def _build_arrays(dates, values):
+    valid = ~np.isnan(values)
+    arrays = {
+        "daily_dates": dates,
+        "daily_values": values,
+        "daily_valid": valid,
+        # Prefix sums make the total / count over any row range O(1)
+        "daily_prefix_sum": np.vstack([np.zeros((1, values.shape[1])),
+                                       np.cumsum(np.where(valid, values, 0.0), axis=0)]),
+        "daily_prefix_count": np.vstack([np.zeros((1, values.shape[1]), dtype=np.int64),
+                                         np.cumsum(valid, axis=0, dtype=np.int64)]),
+    }
+    for resolution, unit in (("monthly", "M"), ("yearly", "Y")):
+        periods = dates.astype(f'datetime64[{unit}]')
+        starts = np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]]) if len(dates) else np.array([], int)
+        arrays[f"{resolution}_dates"] = periods[starts].astype('datetime64[D]')
+        arrays[f"{resolution}_stats"] = (_period_stats(values, starts) if len(starts)
+                                         else np.zeros((0, values.shape[1], len(STATS))))
+    return arrays
+
+def _source_signature(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def build_history_store(csv_path=HISTORY_CSV_FILEPATH, store_dir=HISTORY_STORE_DIR):
+    """
+    Converts the CSV into one .npy file per array plus meta.json.
+    The store is written to a temporary directory and swapped in, so readers
+    never see a half-written store.
+    """
+    dates, values = read_history_csv(csv_path)
+    arrays = _build_arrays(dates, values)
+
+    parent = os.path.dirname(store_dir)
+    tmp_dir = tempfile.mkdtemp(dir=parent, prefix='.history-')
+    try:
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), array)
+        meta = {
+            "format_version": STORE_FORMAT_VERSION,
+            "source": _source_signature(csv_path),
+            "columns": COLUMN_NAMES,
+            "stats": list(STATS),
+            "rows": int(len(dates)),
+        }
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=4)
+        if os.path.exists(store_dir):
+            shutil.rmtree(store_dir)
+        os.replace(tmp_dir, store_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return meta
+
+
+# --- Reading ---
+
+# Memory-mapped arrays of the current store; remapped when the CSV changes
+_store = None
+_store_signature = None
+_store_lock = threading.Lock()
+
+def _read_meta(store_dir):
+    try:
+        with open(os.path.join(store_dir, 'meta.json'), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def _open_store(store_dir):
+    meta = _read_meta(store_dir)
+    names = ["daily_dates", "daily_values", "daily_valid", "daily_prefix_sum", "daily_prefix_count",
+             "monthly_dates", "monthly_stats", "yearly_dates", "yearly_stats"]
+    store = {name: np.load(os.path.join(store_dir, f"{name}.npy"), mmap_mode='r') for name in names}
+    store["meta"] = meta
+    return store
+
+def get_history_store():
+    """
+    Returns the memory-mapped store, building it first if it is missing, from
+    an older format, or older than the CSV.
+    """
+    global _store, _store_signature
+    signature = _source_signature(HISTORY_CSV_FILEPATH)
+    if _store is not None and signature == _store_signature:
+        return _store
+    with _store_lock:
+        if _store is None or signature != _store_signature:
+            meta = _read_meta(HISTORY_STORE_DIR)
+            if (meta is None or meta.get("format_version") != STORE_FORMAT_VERSION
+                    or meta.get("source") != signature):
+                print("Building history store from renewable_power_data.csv")
+                build_history_store()
+            try:
+                store = _open_store(HISTORY_STORE_DIR)
+            except (FileNotFoundError, ValueError):
+                # Incomplete store (e.g. a file was deleted): rebuild once
+                build_history_store()
+                store = _open_store(HISTORY_STORE_DIR)
+            _store, _store_signature = store, signature
+    return _store
+
+def _to_day(value, name):
+    if value is None or value == "":
+        return None
+    try:
+        return np.datetime64(value, 'D')
+    except ValueError:
+        raise ValueError(f"{name} must be a date in YYYY-MM-DD format")
+
+def _json_values(array, as_int=False):
+    # NaN (missing) -> None so the result is valid JSON
+    values = np.asarray(array, dtype=float).tolist()
+    if as_int:
+        return [int(v) for v in values]
+    return [None if v != v else v for v in values]
+
+def _row_bounds(store, start_day, end_day):
+    if start_day is not None and end_day is not None and start_day > end_day:
+        raise ValueError("start must not be after end")
+    daily_dates = store["daily_dates"]
+    lo = 0 if start_day is None else int(np.searchsorted(daily_dates, start_day, side='left'))
+    hi = len(daily_dates) if end_day is None else int(np.searchsorted(daily_dates, end_day, side='right'))
+    return lo, max(lo, hi)
+
+def history_range(start=None, end=None):
+    """
+    Daily rows between two dates (inclusive) as read-only memory-mapped views.
+    Returns:
+        tuple: (dates, values, valid) where values/valid are (n, len(COLUMN_NAMES)).
+    """
+    store = get_history_store()
+    lo, hi = _row_bounds(store, _to_day(start, "start"), _to_day(end, "end"))
+    return store["daily_dates"][lo:hi], store["daily_values"][lo:hi], store["daily_valid"][lo:hi]
+
+def query_history(start=None, end=None, columns=None, resolution="daily"):
+    """
+    Slices the history between two dates (inclusive) without reading the rows
+    outside the range. Bounds are found by binary search on the date index.
+
+    Args:
+        start, end (str): YYYY-MM-DD; open-ended when omitted.
+        columns (list[str]): Subset of COLUMN_NAMES; all when omitted.
+        resolution (str): "daily" rows, or precomputed "monthly" / "yearly"
+            aggregates (every period that overlaps the range, in full).
+    Returns:
+        dict: dates, values per column (None where missing; per-stat lists
+        for aggregates) and a per-column summary (sum/mean/count) over the
+        daily rows in the range.
+    Raises:
+        ValueError: On unknown columns, resolution or malformed dates.
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"resolution must be one of {', '.join(RESOLUTIONS)}")
+    columns = columns or COLUMN_NAMES
+    unknown = [c for c in columns if c not in COLUMN_NAMES]
+    if unknown:
+        raise ValueError(f"Unknown column(s): {', '.join(unknown)}. Available: {', '.join(COLUMN_NAMES)}")
+    start_day, end_day = _to_day(start, "start"), _to_day(end, "end")
+    store = get_history_store()
+    column_index = [COLUMN_NAMES.index(c) for c in columns]
+
+    daily_dates = store["daily_dates"]
+    lo, hi = _row_bounds(store, start_day, end_day)
+
+    counts = store["daily_prefix_count"][hi] - store["daily_prefix_count"][lo]
+    sums = store["daily_prefix_sum"][hi] - store["daily_prefix_sum"][lo]
+    summary = {}
+    for c, k in zip(columns, column_index):
+        count = int(counts[k])
+        summary[c] = {
+            "count": count,
+            "missing": (hi - lo) - count,
+            "sum": round(float(sums[k]), 3) if count else None,
+            "mean": round(float(sums[k]) / count, 3) if count else None,
+        }
+
+    if resolution == "daily":
+        dates = daily_dates[lo:hi]
+        block = store["daily_values"][lo:hi]
+        values = {c: _json_values(block[:, k]) for c, k in zip(columns, column_index)}
+    else:
+        period_dates = store[f"{resolution}_dates"]
+        unit = 'M' if resolution == "monthly" else 'Y'
+        p_lo = 0 if start_day is None else int(np.searchsorted(
+            period_dates, start_day.astype(f'datetime64[{unit}]').astype('datetime64[D]'), side='left'))
+        p_hi = len(period_dates) if end_day is None else int(np.searchsorted(period_dates, end_day, side='right'))
+        p_hi = max(p_lo, p_hi)
+        dates = period_dates[p_lo:p_hi]
+        block = store[f"{resolution}_stats"][p_lo:p_hi]
+        block = np.round(block, 3)
+        values = {c: {stat: _json_values(block[:, k, s], as_int=(stat == "count")) for s, stat in enumerate(STATS)}
+                  for c, k in zip(columns, column_index)}
+
+    return {
+        "resolution": resolution,
+        "start": str(daily_dates[lo]) if hi > lo else None,
+        "end": str(daily_dates[hi - 1]) if hi > lo else None,
+        "columns": columns,
+        "rows": int(len(dates)),
+        "dates": [str(d) for d in dates],
+        "values": values,
+        "summary": summary,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the columnar history store.")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the store from the CSV")
+    parser.add_argument("--check", action="store_true", help="Compare the store against pandas")
+    args = parser.parse_args(argv)
+
+    if args.rebuild:
+        print(json.dumps(build_history_store(), indent=2))
+    if args.check:
+        import pandas as pd
+        df = pd.read_csv(HISTORY_CSV_FILEPATH)
+        df['Date'] = pd.to_datetime(df['Date'].str.replace('/', '-'), format='%m-%d-%Y')
+        df = df.sort_values('Date', kind='stable').reset_index(drop=True)
+        result = query_history("2012-03-05", "2016-11-20")
+        window = df[(df['Date'] >= '2012-03-05') & (df['Date'] <= '2016-11-20')]
+        assert result["rows"] == len(window)
+        for header, name in COLUMNS.items():
+            expected = [None if pd.isna(v) else v for v in window[header]]
+            assert result["values"][name] == expected, name
+            assert result["summary"][name]["count"] == window[header].count()
+        monthly = df.groupby(df['Date'].dt.to_period('M'))['Solar'].agg(['sum', 'count', 'min', 'max'])
+        stats = query_history(resolution="monthly", columns=["solar"])["values"]["solar"]
+        assert stats["count"] == monthly['count'].tolist()
+        got = np.array([np.nan if v is None else v for v in stats["sum"]])
+        assert np.allclose(np.nan_to_num(got), np.where(monthly['count'] > 0, monthly['sum'], 0.0), atol=1e-3)
+        print("History store matches pandas")
+
+
+if __name__ == "__main__":
+    main()
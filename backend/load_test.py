@@ -0,0 +1,173 @@
+# backend/load_test.py
+#
+# Throughput / latency comparison of the Flask app and the ASGI app:
+#
+#   python load_test.py                     # starts both servers itself
+#   python load_test.py --url http://127.0.0.1:5000 --requests 500
+#   python load_test.py --cold-start        # process start -> first /api/status
+#
+# Two scenarios per server: /api/status alone, and /api/status while other
+# clients keep requesting a one-year /api/simulate in the background.
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import subprocess
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SERVERS = {
+    "flask": [sys.executable, "-c", "import sys, app; app.app.run(port=int(sys.argv[1]), threaded=True)"],
+    "asgi": [sys.executable, "asgi_app.py", "--log-level", "warning", "--port"],
+}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _get(url, timeout=120):
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            response.read()
+            ok = response.status == 200
+    except (urllib.error.URLError, OSError):
+        ok = False
+    return time.perf_counter() - started, ok
+
+def _wait_until_up(base_url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if _get(base_url + "/api/settings", timeout=2)[1]:
+            return True
+        time.sleep(0.2)
+    return False
+
+def _percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def run_load(url, requests, concurrency):
+    """
+    Sends `requests` GETs to `url` from `concurrency` threads.
+    Returns:
+        dict: throughput, p50/p99 latency in ms and the error count.
+    """
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: _get(url), range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, ok in results if ok)
+    return {
+        "requests": requests,
+        "errors": sum(1 for _, ok in results if not ok),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 1),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 1),
+    }
+
+def run_scenarios(base_url, requests, concurrency, background_clients, simulate_hours):
+    rows = [("status", run_load(base_url + "/api/status", requests, concurrency))]
+
+    stop = threading.Event()
+    def hammer():
+        while not stop.is_set():
+            _get(f"{base_url}/api/simulate?hours={simulate_hours}")
+    threads = [threading.Thread(target=hammer, daemon=True) for _ in range(background_clients)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.5) # Let the simulations get going first
+    try:
+        rows.append((f"status + {background_clients}x simulate", run_load(base_url + "/api/status", requests, concurrency)))
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    return rows
+
+def measure_cold_start(command, timeout=120):
+    """
+    Starts a server and times process start -> first successful /api/status.
+    Returns:
+        dict: The measured wall time plus the server's own /healthz startup
+        and model load timings, or None if it never answered.
+    """
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = subprocess.Popen(command + [str(port)], cwd=BACKEND_DIR,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if _get(base_url + "/api/status", timeout=timeout)[1]:
+                first_status = time.perf_counter() - started
+                with urllib.request.urlopen(base_url + "/healthz", timeout=10) as response:
+                    health = json.loads(response.read())
+                return {
+                    "start_to_first_status_seconds": round(first_status, 3),
+                    "import_seconds": health["startup"]["import_seconds"],
+                    "model_load_seconds": health["models"]["load_seconds"],
+                    "warmup_seconds": health["models"]["warmup_seconds"],
+                }
+            time.sleep(0.05)
+        return None
+    finally:
+        process.terminate()
+        process.wait()
+
+def _print_rows(server, rows):
+    for scenario, result in rows:
+        print(f"{server:<8}{scenario:<26}{result['throughput_rps']:>10.1f}{result['p50_ms']:>10.1f}"
+              f"{result['p99_ms']:>10.1f}{result['errors']:>8}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test /api/status on the Flask and ASGI servers.")
+    parser.add_argument("--url", default=None, help="Test an already running server instead of starting both")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--background-clients", type=int, default=4, help="Concurrent /api/simulate clients")
+    parser.add_argument("--simulate-hours", type=int, default=8760)
+    parser.add_argument("--cold-start", action="store_true", help="Only measure start-up to first response")
+    args = parser.parse_args(argv)
+
+    if args.cold_start:
+        for server, command in SERVERS.items():
+            print(f"{server:<8}{json.dumps(measure_cold_start(command))}")
+        return
+
+    print(f"{'server':<8}{'scenario':<26}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    scenario_args = (args.requests, args.concurrency, args.background_clients, args.simulate_hours)
+    if args.url:
+        _print_rows("-", run_scenarios(args.url.rstrip("/"), *scenario_args))
+        return
+
+    for server, command in SERVERS.items():
+        port = _free_port()
+        process = subprocess.Popen(command + [str(port)], cwd=BACKEND_DIR,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            if not _wait_until_up(base_url):
+                print(f"{server}: server did not start")
+                continue
+            _print_rows(server, run_scenarios(base_url, *scenario_args))
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+# backend/metrics.py
+
+import os
+import time
+import bisect
+import threading
+
+# In-process metrics rendered in the Prometheus text format by /metrics.
+# Every worker process keeps its own; scrape each worker (or run one) when
+# using the pre-forking launcher.
+
+# SYNAPSE_METRICS=0 turns recording into a no-op (stage() hands back a shared
+# do-nothing context manager); /metrics then only reports the collectors.
+METRICS_ENABLED = os.environ.get('SYNAPSE_METRICS') != '0'
+
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help)
+METRICS = {
+    "synapse_stage_duration_seconds": ("histogram", "Time spent in one pipeline stage of a request."),
+    "synapse_http_request_duration_seconds": ("histogram", "Time from request start until the response is returned."),
+    "synapse_http_requests_total": ("counter", "Requests served, by route, method and status."),
+    "synapse_http_requests_in_flight": ("gauge", "Requests currently being handled."),
+    "synapse_model_load_failures_total": ("counter", "Failed attempts to load the forecasting models."),
+}
+
+_histograms = {} # (name, labels) -> [bucket counts..., +Inf count, sum]
+_counters = {}   # (name, labels) -> value
+_gauges = {}     # (name, labels) -> value
+_collectors = []
+_metrics_lock = threading.Lock()
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+def observe(name, seconds, **labels):
+    """Adds one observation to a histogram."""
+    if not METRICS_ENABLED:
+        return
+    key = (name, _labels_key(labels))
+    slot = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+    with _metrics_lock:
+        values = _histograms.get(key)
+        if values is None:
+            values = _histograms[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+        values[slot] += 1
+        values[-1] += seconds
+
+def inc(name, value=1, **labels):
+    """Increments a counter."""
+    if not METRICS_ENABLED:
+        return
+    key = (name, _labels_key(labels))
+    with _metrics_lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def add_gauge(name, delta, **labels):
+    """Moves a gauge up or down (e.g. +1 / -1 around a request)."""
+    if not METRICS_ENABLED:
+        return
+    key = (name, _labels_key(labels))
+    with _metrics_lock:
+        _gauges[key] = _gauges.get(key, 0) + delta
+
+
+class _Stage:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        observe("synapse_stage_duration_seconds", time.perf_counter() - self.started, stage=self.name)
+        return False
+
+class _NoStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NO_STAGE = _NoStage()
+
+def stage(name):
+    """
+    Times a block into synapse_stage_duration_seconds{stage=name}:
+
+        with stage("predict"):
+            ...
+    """
+    return _Stage(name) if METRICS_ENABLED else _NO_STAGE
+
+
+# --- Collectors ---
+
+def register_collector(fn):
+    """
+    Registers a function called at every scrape. It returns a list of
+    (name, type, help, [(labels dict, value), ...]) for values that live
+    elsewhere (cache counters, queue sizes, ...).
+    """
+    _collectors.append(fn)
+    return fn
+
+
+# --- Exposition ---
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+def render_metrics():
+    """
+    All metrics in the Prometheus text exposition format (version 0.0.4).
+    Returns:
+        str: The /metrics body.
+    """
+    with _metrics_lock:
+        histograms = {key: list(values) for key, values in _histograms.items()}
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+
+    families = {}
+    for (name, labels), values in histograms.items():
+        lines = families.setdefault(name, [])
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + (float("inf"),), values[:-1]):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"{name}_bucket{_format_labels(labels, ('le', le))} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(values[-1])}")
+        lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+    for samples in (counters, gauges):
+        for (name, labels), value in samples.items():
+            families.setdefault(name, []).append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    out = []
+    for name, lines in families.items():
+        metric_type, help_text = METRICS.get(name, ("untyped", ""))
+        out.append(f"# HELP {name} {help_text}")
+        out.append(f"# TYPE {name} {metric_type}")
+        out.extend(lines)
+    for collector in _collectors:
+        try:
+            collected = collector()
+        except Exception as e:
+            print(f"Error in metrics collector {collector.__name__}: {e}")
+            continue
+        for name, metric_type, help_text, samples in collected:
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                out.append(f"{name}{_format_labels(_labels_key(labels))} {_format_value(value)}")
+    return "\n".join(out) + "\n"
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def reset_metrics():
+    """Drops every recorded histogram, counter and gauge (collectors stay)."""
+    with _metrics_lock:
+        _histograms.clear()
+        _counters.clear()
+        _gauges.clear()
@@ -0,0 +1,330 @@
+# backend/monte_carlo.py
+
+import sys
+import json
+import time
+import argparse
+import itertools
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from decision_engine import make_decisions_batch, FLOW_KEYS, OPTIMAL_DISPATCH_MODE
+from simulation import simulate_battery, battery_params
+from history_store import history_range, COLUMN_NAMES
+
+# Probabilistic version of /api/simulate: the point forecast is perturbed into
+# many scenarios and all of them go through the decision policy and battery
+# recurrence together, one (scenarios,) array operation per hour.
+#
+# Noise comes from renewable_power_data.csv: each day's solar, wind and
+# consumption divided by its centered RESIDUAL_WINDOW_DAYS-day mean is how far
+# that day strayed from the local level (weather, events), a ratio with mean
+# ~1. Each scenario day draws one historical day's (solar, wind, demand)
+# ratios from the same calendar month, which keeps the correlation between the
+# three series and the season's volatility, and scales that day's hourly
+# forecast by them. The daily file says nothing about hour-to-hour noise, so
+# the hours of one day move together.
+
+DEFAULT_SCENARIOS = 10000
+MAX_SCENARIOS = 100000
+# scenarios x hours per request (memory is ~10 float arrays of this size)
+MAX_SCENARIO_HOURS = 2000000
+PERCENTILES = (10, 50, 90)
+
+RESIDUAL_WINDOW_DAYS = 7
+MIN_WINDOW_DAYS = 5 # Valid days needed in a window for its mean to count
+MAX_RATIO = 4.0
+MIN_POOL_DAYS = 30  # Months with fewer usable days draw from the whole file
+
+_SERIES = ("solar", "wind", "consumption")
+_COLUMNS = [COLUMN_NAMES.index(name) for name in _SERIES]
+
+_residuals = None
+_residuals_lock = threading.Lock()
+
+
+# --- Noise calibration ---
+
+def _calibrate():
+    dates, values, valid = history_range()
+    n = len(dates)
+    kernel = np.ones(RESIDUAL_WINDOW_DAYS)
+    ratios = np.full((n, len(_SERIES)), np.nan)
+    for j, col in enumerate(_COLUMNS):
+        ok = valid[:, col] & (np.asarray(values[:, col]) > 0)
+        x = np.where(ok, values[:, col], 0.0)
+        window_sum = np.convolve(x, kernel, mode='same')
+        window_count = np.convolve(ok.astype(float), kernel, mode='same')
+        usable = ok & (window_count >= MIN_WINDOW_DAYS)
+        ratios[usable, j] = x[usable] / (window_sum[usable] / window_count[usable])
+
+    usable = ~np.isnan(ratios).any(axis=1)
+    ratios = np.clip(ratios[usable], 0.0, MAX_RATIO)
+    months = np.asarray(dates[usable]).astype('datetime64[M]').astype(int) % 12 + 1
+    all_rows = np.arange(len(ratios))
+    pools = {}
+    for month in range(1, 13):
+        rows = np.flatnonzero(months == month)
+        pools[month] = rows if len(rows) >= MIN_POOL_DAYS else all_rows
+    return {
+        "ratios": ratios,
+        "pools": pools,
+        "days": int(len(ratios)),
+        "std": {name: round(float(ratios[:, j].std()), 4) for j, name in enumerate(("solar", "wind", "demand"))},
+        "correlation": np.round(np.corrcoef(ratios.T), 3).tolist() if len(ratios) > 1 else None,
+    }
+
+def get_residuals():
+    """Day ratios from renewable_power_data.csv, computed once per process."""
+    global _residuals
+    if _residuals is None:
+        with _residuals_lock:
+            if _residuals is None:
+                _residuals = _calibrate()
+    return _residuals
+
+def scenario_factors(start_dt, hours, scenarios, rng):
+    """
+    Multiplicative (solar, wind, demand) factors per scenario and hour.
+    Returns:
+        np.ndarray: (3, scenarios, hours).
+    Raises:
+        ValueError: If the history holds no usable days.
+    """
+    residuals = get_residuals()
+    if not residuals["days"]:
+        raise ValueError("renewable_power_data.csv has no usable days to calibrate the noise")
+    first_day = start_dt.date()
+    hour_days = np.array([((start_dt + timedelta(hours=i)).date() - first_day).days for i in range(hours)])
+    n_days = int(hour_days[-1]) + 1
+    daily = np.empty((3, scenarios, n_days))
+    for k in range(n_days):
+        pool = residuals["pools"][(first_day + timedelta(days=k)).month]
+        daily[:, :, k] = residuals["ratios"][rng.choice(pool, size=scenarios)].T
+    return daily[:, :, hour_days]
+
+
+# --- Vectorized recurrence ---
+
+def simulate_scenarios(solar_kwh, wind_kwh, demand_kwh, buying_prices, selling_prices,
+                       initial_charge_kwh, battery_capacity_kwh, battery_min_reserve, operating_mode,
+                       timestep_hours=1.0, max_charge_kw=None, max_discharge_kw=None, round_trip_efficiency=1.0):
+    """
+    simulation.simulate_battery() for many scenarios at once: the per-step
+    decision is make_decisions_batch() over the scenario axis, so every
+    scenario is decided exactly like make_decision() would.
+    Args:
+        solar_kwh, wind_kwh, demand_kwh (np.ndarray): (scenarios, steps).
+        buying_prices, selling_prices (array): (steps,), shared by all scenarios.
+        timestep_hours, max_charge_kw, max_discharge_kw, round_trip_efficiency:
+            As for simulate_battery().
+    Returns:
+        dict: (scenarios, steps) arrays "battery_charge_kwh" (end of step),
+        "grid_import_kwh", "grid_export_kwh" (energy over the step) and "step_cost".
+    """
+    scenarios, hours = solar_kwh.shape
+    capacity = float(battery_capacity_kwh)
+    dt = float(timestep_hours)
+    efficiency = float(round_trip_efficiency) ** 0.5
+    charge = np.full(scenarios, float(initial_charge_kwh))
+    out = {key: np.empty((scenarios, hours)) for key in ("battery_charge_kwh", "grid_import_kwh",
+                                                         "grid_export_kwh", "step_cost")}
+    for t in range(hours):
+        decision = make_decisions_batch(solar_kwh[:, t], wind_kwh[:, t], demand_kwh[:, t], charge, capacity,
+                                        battery_min_reserve, buying_prices[t], selling_prices[t], operating_mode,
+                                        dt, max_charge_kw, max_discharge_kw, round_trip_efficiency)
+        charge = np.clip(charge + decision["power_to_battery"] * dt * efficiency
+                         - decision["power_from_battery"] * dt / efficiency, 0.0, capacity)
+        from_grid = decision["power_from_grid"]
+        to_grid = decision["power_to_grid"]
+        out["battery_charge_kwh"][:, t] = charge
+        out["grid_import_kwh"][:, t] = from_grid * dt
+        out["grid_export_kwh"][:, t] = to_grid * dt
+        out["step_cost"][:, t] = ((from_grid * buying_prices[t]) - (to_grid * selling_prices[t])) * dt
+    return out
+
+
+def _bands(values, digits=2):
+    """P10/P50/P90 over the scenario axis (axis 0)."""
+    bands = np.round(np.percentile(values, PERCENTILES, axis=0), digits)
+    return {f"p{p}": band.tolist() for p, band in zip(PERCENTILES, bands)}
+
+def _summary(values, digits=2):
+    summary = {f"p{p}": round(float(v), digits) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+    summary["mean"] = round(float(values.mean()), digits)
+    return summary
+
+def run_monte_carlo(settings, start_time, hours=24, scenarios=DEFAULT_SCENARIOS, seed=None, forecast=None):
+    """
+    Runs `scenarios` perturbed copies of the /api/simulate horizon.
+    Args:
+        settings (dict): Household settings (capacities, charge, reserve, battery limits, mode).
+            Scenarios always run hourly, whatever "simulation_timestep_minutes" is.
+        start_time (datetime): First simulated hour.
+        hours (int): Horizon length.
+        scenarios (int): Number of scenarios.
+        seed (int): Random seed; a random one is drawn (and returned) when omitted.
+        forecast (dict): Point forecast shaped like build_shared_forecast();
+            computed from the models when omitted.
+    Returns:
+        dict: Hourly P10/P50/P90 bands for battery charge, grid import/export
+        and cumulative cost, the same bands for the horizon totals, and the
+        deterministic (unperturbed) totals for comparison.
+    Raises:
+        ValueError: On out-of-range sizes or an unsupported operating mode.
+    """
+    if not 1 <= scenarios <= MAX_SCENARIOS:
+        raise ValueError(f"scenarios must be between 1 and {MAX_SCENARIOS}")
+    if scenarios * hours > MAX_SCENARIO_HOURS:
+        raise ValueError(f"scenarios x hours must be at most {MAX_SCENARIO_HOURS}")
+    operating_mode = settings.get('operating_mode', 'Cost Optimization')
+    if operating_mode == OPTIMAL_DISPATCH_MODE:
+        raise ValueError(f"{OPTIMAL_DISPATCH_MODE} plans with lookahead and cannot be run per scenario; "
+                         f"pick one of the other operating modes")
+
+    started = time.perf_counter()
+    if forecast is None:
+        from batch_simulation import build_shared_forecast
+        forecast = build_shared_forecast(start_time, hours)
+    if seed is None:
+        seed = int(np.random.default_rng().integers(2 ** 31))
+    rng = np.random.default_rng(seed)
+
+    solar = forecast["solar_per_kw"] * settings.get('solar_capacity_kw', 5.0)
+    wind = forecast["wind_per_kw"] * settings.get('wind_capacity_kw', 2.0)
+    demand = forecast["demand_kwh"]
+    household = dict(
+        initial_charge_kwh=settings.get('battery_current_charge_kwh', 5.0),
+        battery_capacity_kwh=settings.get('battery_capacity_kwh', 10.0),
+        battery_min_reserve=settings.get('min_battery_reserve_user_percent', 20),
+        operating_mode=operating_mode,
+        **battery_params(settings)
+    )
+
+    factors = scenario_factors(start_time, hours, scenarios, rng)
+    result = simulate_scenarios(solar * factors[0], wind * factors[1], demand * factors[2],
+                                forecast["buying_prices"], forecast["selling_prices"], **household)
+    cumulative_cost = np.cumsum(result["step_cost"], axis=1)
+
+    point = simulate_battery(solar, wind, demand, forecast["buying_prices"], forecast["selling_prices"], **household)
+
+    hourly_bands = {
+        "battery_charge_kwh": _bands(result["battery_charge_kwh"]),
+        "grid_import_kwh": _bands(result["grid_import_kwh"]),
+        "grid_export_kwh": _bands(result["grid_export_kwh"]),
+        "cumulative_cost": _bands(cumulative_cost),
+    }
+    times = [start_time + timedelta(hours=i) for i in range(hours)]
+    hourly = []
+    for i, dt in enumerate(times):
+        row = {"hour": dt.hour, "timestamp": dt.isoformat()}
+        for key, bands in hourly_bands.items():
+            row[key] = {name: band[i] for name, band in bands.items()}
+        hourly.append(row)
+
+    residuals = get_residuals()
+    return {
+        "timestamp_start": start_time.isoformat(),
+        "simulation_duration_hours": hours,
+        "scenarios": scenarios,
+        "seed": seed,
+        "operating_mode": operating_mode,
+        "percentiles": list(PERCENTILES),
+        "hourly": hourly,
+        "totals": {
+            "net_grid_cost": _summary(cumulative_cost[:, -1]),
+            "grid_import_kwh": _summary(result["grid_import_kwh"].sum(axis=1)),
+            "grid_export_kwh": _summary(result["grid_export_kwh"].sum(axis=1)),
+            "final_battery_charge_kwh": _summary(result["battery_charge_kwh"][:, -1]),
+        },
+        "deterministic": {
+            "net_grid_cost": round(float(point["net_grid_cost"]), 2),
+            "total_grid_import_kwh": round(float(point["total_grid_import_kwh"]), 2),
+            "total_grid_export_kwh": round(float(point["total_grid_export_kwh"]), 2),
+            "final_battery_charge_kwh": round(float(point["final_battery_charge_kwh"]), 2),
+        },
+        "noise": {
+            "source": "renewable_power_data.csv",
+            "calibration_days": residuals["days"],
+            "window_days": RESIDUAL_WINDOW_DAYS,
+            "ratio_std": residuals["std"],
+        },
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def check_parity(hours=168, seed=0):
+    """
+    Runs unperturbed and random inputs through simulate_scenarios() and
+    simulation.simulate_battery() for every mode; they must agree exactly.
+    Returns:
+        bool: True on exact parity.
+    """
+    rng = np.random.default_rng(seed)
+    scenarios = 50
+    solar = rng.uniform(0, 4, (scenarios, hours)) * (rng.random((scenarios, hours)) > 0.3)
+    wind = rng.uniform(0, 2, (scenarios, hours))
+    demand = rng.uniform(0, 4, (scenarios, hours))
+    buy = rng.choice([0.10, 0.15, 0.22, 0.30], hours)
+    sell = rng.choice([0.05, 0.08, 0.21, 0.35], hours)
+    # Hourly with an ideal battery, and 15-minute steps with power limits and losses
+    battery_cases = [{}, dict(timestep_hours=0.25, max_charge_kw=2.5, max_discharge_kw=3.0, round_trip_efficiency=0.9)]
+    ok = True
+    for mode, battery in itertools.product(("Self-Sufficiency", "Cost Optimization", "Environmental", "Unknown Mode"),
+                                           battery_cases):
+        result = simulate_scenarios(solar, wind, demand, buy, sell, 3.0, 10.0, 20, mode, **battery)
+        dt = battery.get("timestep_hours", 1.0)
+        for s in range(scenarios):
+            expected = simulate_battery(solar[s], wind[s], demand[s], buy, sell, 3.0, 10.0, 20, mode, **battery)
+            same = (np.array_equal(result["battery_charge_kwh"][s], expected["battery_charge_kwh"])
+                    and np.array_equal(result["grid_import_kwh"][s],
+                                       expected["flows"][:, FLOW_KEYS.index("power_from_grid")] * dt)
+                    and np.array_equal(result["grid_export_kwh"][s],
+                                       expected["flows"][:, FLOW_KEYS.index("power_to_grid")] * dt)
+                    and np.array_equal(result["step_cost"][s], expected["step_cost"]))
+            if not same:
+                print(f"Mismatch: {mode} {battery}, scenario {s}")
+                ok = False
+                break
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monte Carlo battery simulation with P10/P50/P90 bands.")
+    parser.add_argument("--hours", type=int, default=24)
+    parser.add_argument("--scenarios", type=int, default=DEFAULT_SCENARIOS)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="Print the full result as JSON")
+    parser.add_argument("--check", action="store_true", help="Check parity with simulate_battery()")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        ok = check_parity()
+        print("Parity with simulate_battery(): " + ("OK" if ok else "FAILED"))
+        return 0 if ok else 1
+
+    from settings_store import get_settings
+    try:
+        result = run_monte_carlo(get_settings(), datetime.now(), args.hours, args.scenarios, args.seed)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.json:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+        return 0
+    print(f"{result['scenarios']} scenarios x {result['simulation_duration_hours']}h "
+          f"({result['operating_mode']}, seed {result['seed']}) in {result['elapsed_seconds']}s")
+    print(f"{'':<26}{'P10':>10}{'P50':>10}{'P90':>10}{'point':>10}")
+    deterministic = result["deterministic"]
+    for key, point_key in (("net_grid_cost", "net_grid_cost"), ("grid_import_kwh", "total_grid_import_kwh"),
+                           ("grid_export_kwh", "total_grid_export_kwh"),
+                           ("final_battery_charge_kwh", "final_battery_charge_kwh")):
+        t = result["totals"][key]
+        print(f"{key:<26}{t['p10']:>10.2f}{t['p50']:>10.2f}{t['p90']:>10.2f}{deterministic[point_key]:>10.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
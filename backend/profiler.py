@@ -0,0 +1,124 @@
+# backend/profiler.py
+
+import os
+import sys
+import time
+import threading
+from collections import Counter
+
+# Opt-in sampling profiler, switched on and off at runtime through
+# /api/profiler. While running, a background thread snapshots every other
+# thread's Python stack each interval and counts identical stacks; nothing
+# is hooked into the code being profiled, so it costs nothing when stopped.
+# Stacks are reported root-first in the "folded" format flame graph tools read.
+
+DEFAULT_INTERVAL_SECONDS = 0.01
+MIN_INTERVAL_SECONDS = 0.001
+# A forgotten profiler stops itself after this long
+MAX_DURATION_SECONDS = 600
+MAX_STACK_DEPTH = 64
+# Distinct stacks kept; further new stacks are only counted as "truncated"
+MAX_DISTINCT_STACKS = 20000
+
+_profile = Counter()
+_profile_lock = threading.Lock()
+_profiler_thread = None
+_stop = threading.Event()
+_state = {
+    "running": False,
+    "interval_seconds": DEFAULT_INTERVAL_SECONDS,
+    "started_at": None,
+    "stopped_at": None,
+    "samples": 0,
+    "truncated": 0,
+}
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+def _fold(frame):
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+def _sample_loop(interval, deadline):
+    own_id = threading.get_ident()
+    names = {}
+    while not _stop.wait(interval):
+        if time.monotonic() >= deadline:
+            break
+        frames = sys._current_frames()
+        if len(names) != len(frames):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+        with _profile_lock:
+            for thread_id, frame in frames.items():
+                if thread_id == own_id:
+                    continue
+                stack = names.get(thread_id, "thread") + ";" + _fold(frame)
+                if stack in _profile or len(_profile) < MAX_DISTINCT_STACKS:
+                    _profile[stack] += 1
+                else:
+                    _state["truncated"] += 1
+            _state["samples"] += 1
+    with _profile_lock:
+        _state["running"] = False
+        _state["stopped_at"] = time.time()
+
+def start_profiler(interval_seconds=DEFAULT_INTERVAL_SECONDS, duration_seconds=MAX_DURATION_SECONDS, reset=True):
+    """
+    Starts sampling (restarting with the new interval if already running).
+    Args:
+        interval_seconds (float): Time between samples.
+        duration_seconds (float): Stops automatically after this long
+            (capped at MAX_DURATION_SECONDS).
+        reset (bool): Drop the stacks collected by earlier runs.
+    Raises:
+        ValueError: On a non-positive duration or too small an interval.
+    """
+    global _profiler_thread
+    interval_seconds = float(interval_seconds)
+    duration_seconds = min(float(duration_seconds), MAX_DURATION_SECONDS)
+    if interval_seconds < MIN_INTERVAL_SECONDS:
+        raise ValueError(f"interval must be at least {MIN_INTERVAL_SECONDS * 1000:g} ms")
+    if duration_seconds <= 0:
+        raise ValueError("duration must be positive")
+
+    stop_profiler()
+    with _profile_lock:
+        if reset:
+            _profile.clear()
+            _state.update(samples=0, truncated=0)
+        _state.update(running=True, interval_seconds=interval_seconds, started_at=time.time(), stopped_at=None)
+    _stop.clear()
+    _profiler_thread = threading.Thread(target=_sample_loop, name="sampling-profiler", daemon=True,
+                                        args=(interval_seconds, time.monotonic() + duration_seconds))
+    _profiler_thread.start()
+
+def stop_profiler():
+    """Stops sampling; the collected stacks are kept until the next reset."""
+    global _profiler_thread
+    if _profiler_thread is not None:
+        _stop.set()
+        _profiler_thread.join()
+        _profiler_thread = None
+
+def get_profile(limit=50):
+    """
+    Returns:
+        dict: Profiler state plus the `limit` most frequent stacks as
+        {"stack", "count"} (all of them when limit is None).
+    """
+    with _profile_lock:
+        result = dict(_state)
+        result["distinct_stacks"] = len(_profile)
+        result["stacks"] = [{"stack": stack, "count": count} for stack, count in _profile.most_common(limit)]
+    return result
+
+def get_folded_profile():
+    """All collected stacks as folded text ("frame;frame;frame count" per line)."""
+    with _profile_lock:
+        return "".join(f"{stack} {count}\n" for stack, count in _profile.most_common())
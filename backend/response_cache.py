@@ -0,0 +1,149 @@
+# backend/response_cache.py
+
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+# orjson is optional: when it is installed responses are encoded with it
+# (several times faster than json, and it takes NumPy scalars and arrays
+# as-is), otherwise with json using the same settings as Flask's jsonify.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Rendered /api/forecasts and /api/simulate bodies. Entries are keyed on the
+# request parameters, the time bucket the payload belongs to and the
+# settings / tariff / model versions, so a change to any of them makes the
+# next request miss instead of anything having to be invalidated.
+RESPONSE_CACHE_MAX_ENTRIES = 64
+# Bodies above this are still served, just not kept (e.g. an 8760h simulation)
+RESPONSE_CACHE_MAX_BODY_BYTES = 8 * 1024 * 1024
+RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Clients may keep cached bodies but must revalidate them (If-None-Match) on
+# every use, so a settings change shows up on the next poll
+CACHE_CONTROL = "private, no-cache"
+
+_entries = OrderedDict() # key -> (body, etag)
+_entries_bytes = 0
+_building = {}           # key -> lock held while the body for key is built
+_cache_lock = threading.Lock()
+_cache_stats = {"hits": 0, "misses": 0, "not_modified": 0, "evictions": 0, "uncacheable": 0}
+
+
+def dumps_json(data):
+    """
+    Encodes a response payload with sorted keys and compact separators.
+    Returns:
+        bytes: UTF-8 JSON.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, option=orjson.OPT_SORT_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+        except TypeError:
+            pass # e.g. an int beyond 64 bits; json copes
+    return json.dumps(data, sort_keys=True, separators=(",", ":")).encode()
+
+def make_etag(body):
+    """Strong entity tag for a response body."""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+def etag_matches(if_none_match, etag):
+    """
+    True if an If-None-Match header value matches etag (weak comparison, as
+    RFC 9110 prescribes for If-None-Match).
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+def time_bucket(now, minutes=60):
+    """Start of the `minutes`-long bucket (aligned to the hour) that `now` falls in."""
+    return now.replace(minute=now.minute - now.minute % minutes, second=0, microsecond=0)
+
+def response_key(route, bucket, *params):
+    """
+    Cache key for a response: route, time bucket, request parameters and the
+    versions of everything else the payload is computed from.
+    """
+    # Imported here so the encoder above can be used without loading them
+    from settings_store import get_settings_version
+    from utils import get_tou_version
+    from forecasting import get_model_version
+    return (route, bucket, params, get_settings_version(), get_tou_version(), get_model_version())
+
+def peek_response(key):
+    """Returns the cached (body, etag) for key, or None."""
+    with _cache_lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            _entries.move_to_end(key)
+            _cache_stats["hits"] += 1
+        return entry
+
+def cached_response(key, render):
+    """
+    Returns (body, etag) for key, calling render() for the encoded body (see
+    dumps_json()) on a miss. Concurrent misses on the same key wait for one
+    render instead of each computing the payload.
+    """
+    entry = peek_response(key)
+    if entry is not None:
+        return entry
+    with _cache_lock:
+        lock = _building.setdefault(key, threading.Lock())
+    with lock:
+        entry = peek_response(key)
+        if entry is not None:
+            return entry
+        try:
+            body = render()
+            entry = (body, make_etag(body))
+            _store(key, entry)
+        finally:
+            with _cache_lock:
+                _building.pop(key, None)
+    return entry
+
+def _store(key, entry):
+    global _entries_bytes
+    size = len(entry[0])
+    with _cache_lock:
+        _cache_stats["misses"] += 1
+        if size > RESPONSE_CACHE_MAX_BODY_BYTES:
+            _cache_stats["uncacheable"] += 1
+            return
+        _entries[key] = entry
+        _entries_bytes += size
+        while len(_entries) > RESPONSE_CACHE_MAX_ENTRIES or _entries_bytes > RESPONSE_CACHE_MAX_BYTES:
+            _, (evicted, _) = _entries.popitem(last=False)
+            _entries_bytes -= len(evicted)
+            _cache_stats["evictions"] += 1
+
+def record_not_modified():
+    with _cache_lock:
+        _cache_stats["not_modified"] += 1
+
+def clear_response_cache():
+    global _entries_bytes
+    with _cache_lock:
+        _entries.clear()
+        _entries_bytes = 0
+
+def get_response_cache_stats():
+    """
+    Returns hit/miss/304 counters and the current size of the response cache.
+    """
+    with _cache_lock:
+        stats = dict(_cache_stats)
+        stats["size"] = len(_entries)
+        stats["bytes"] = _entries_bytes
+    stats["max_entries"] = RESPONSE_CACHE_MAX_ENTRIES
+    stats["encoder"] = "orjson" if orjson is not None else "json"
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    return stats
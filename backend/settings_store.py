@@ -0,0 +1,166 @@
+# backend/settings_store.py
+
+import os
+import json
+import tempfile
+import threading
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+SETTINGS_FILEPATH = os.path.join(DATA_DIR, 'settings.json')
+
+DEFAULT_SETTINGS = {
+    "solar_capacity_kw": 5.0,
+    "wind_capacity_kw": 2.0,
+    "battery_capacity_kwh": 10.0,
+    "battery_current_charge_kwh": 5.0,
+    "battery_min_reserve_percent": 20, # Hard minimum for battery discharge
+    "allow_grid_charge": True,
+    "operating_mode": "Cost Optimization",
+    "min_battery_reserve_user_percent": 20,
+    "simulation_timestep_minutes": 60,
+    "battery_max_charge_kw": 0.0, # 0 = no limit
+    "battery_max_discharge_kw": 0.0, # 0 = no limit
+    "battery_round_trip_efficiency": 1.0
+}
+
+VALID_SETTINGS = {
+    "solar_capacity_kw": {'type': float, 'min': 0.0},
+    "wind_capacity_kw": {'type': float, 'min': 0.0},
+    "battery_capacity_kwh": {'type': float, 'min': 0.0},
+    "battery_current_charge_kwh": {'type': float, 'min': 0.0}, # This would typically not be user-editable
+    "battery_min_reserve_percent": {'type': int, 'min': 0, 'max': 100},
+    "allow_grid_charge": {'type': bool},
+    "operating_mode": {'type': str, 'options': ["Cost Optimization", "Self-Sufficiency", "Environmental", "Optimal Dispatch"]},
+    "min_battery_reserve_user_percent": {'type': int, 'min': 0, 'max': 100},
+    "simulation_timestep_minutes": {'type': int, 'options': [5, 10, 15, 30, 60]},
+    "battery_max_charge_kw": {'type': float, 'min': 0.0},
+    "battery_max_discharge_kw": {'type': float, 'min': 0.0},
+    "battery_round_trip_efficiency": {'type': float, 'min': 0.5, 'max': 1.0}
+}
+
+
+class SettingsValidationError(ValueError):
+    """Raised when a settings update contains an invalid value."""
+
+
+# In-memory copy of settings.json; reloaded only when the file's mtime changes
+_settings = None
+_settings_mtime_ns = None
+_settings_version = 0
+_settings_lock = threading.RLock()
+
+
+def _file_mtime_ns():
+    try:
+        return os.stat(SETTINGS_FILEPATH).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def _write_atomic(settings):
+    """Writes settings to a temp file in DATA_DIR and renames it over settings.json."""
+    if not os.path.exists(DATA_DIR):
+        os.makedirs(DATA_DIR)
+    fd, tmp_path = tempfile.mkstemp(dir=DATA_DIR, prefix='.settings-', suffix='.json.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(settings, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, SETTINGS_FILEPATH)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _load_locked():
+    global _settings, _settings_mtime_ns, _settings_version
+    current_settings = {}
+    try:
+        with open(SETTINGS_FILEPATH, 'r') as f:
+            file_settings = json.load(f)
+            for key, default_value in DEFAULT_SETTINGS.items():
+                current_settings[key] = file_settings.get(key, default_value)
+
+    except (FileNotFoundError, json.JSONDecodeError):
+        print("Settings file not found or corrupted. Creating with default values.")
+        current_settings = dict(DEFAULT_SETTINGS)
+        _write_atomic(current_settings)
+
+    _settings = current_settings
+    _settings_mtime_ns = _file_mtime_ns()
+    _settings_version += 1
+
+def get_settings():
+    """
+    Returns a copy of the current settings.
+    Served from memory; settings.json is only re-read when its mtime changes
+    (e.g. it was edited by hand while the server is running).
+    """
+    if _settings is None or _file_mtime_ns() != _settings_mtime_ns:
+        with _settings_lock:
+            if _settings is None or _file_mtime_ns() != _settings_mtime_ns:
+                _load_locked()
+    return dict(_settings)
+
+def get_settings_version():
+    """Monotonic counter bumped every time the in-memory settings change."""
+    get_settings()
+    return _settings_version
+
+def validate_settings_update(payload):
+    """
+    Validates and type-converts a partial settings update.
+    Args:
+        payload (dict): Incoming key/value pairs.
+    Returns:
+        dict: The converted values for every known key in the payload.
+    Raises:
+        SettingsValidationError: On the first invalid value.
+    """
+    changes = {}
+    for key, value in payload.items():
+        if key not in VALID_SETTINGS:
+            print(f"Warning: Attempted to update unknown setting key: {key}")
+            continue
+        rule = VALID_SETTINGS[key]
+        try:
+            converted_value = rule['type'](value)
+        except (ValueError, TypeError):
+            raise SettingsValidationError(f"Invalid type or format for {key}: expected {rule['type'].__name__}")
+
+        if 'options' in rule and converted_value not in rule['options']:
+            raise SettingsValidationError(f"Invalid option for {key}: {value}")
+        if 'min' in rule and converted_value < rule['min']:
+            raise SettingsValidationError(f"{key} must be at least {rule['min']}")
+        if 'max' in rule and converted_value > rule['max']:
+            raise SettingsValidationError(f"{key} must be at most {rule['max']}")
+        changes[key] = converted_value
+    return changes
+
+def update_settings(payload):
+    """
+    Validates a partial update and writes it through to settings.json.
+    Updates are serialized under a lock and the file is replaced atomically;
+    nothing is written when the values are unchanged.
+    Returns:
+        tuple: (settings, updated) where `updated` is False if the payload
+        contained no known keys.
+    Raises:
+        SettingsValidationError: If any value is invalid (nothing is applied).
+        OSError: If the file could not be written.
+    """
+    global _settings, _settings_mtime_ns, _settings_version
+    with _settings_lock:
+        settings = get_settings()
+        changes = validate_settings_update(payload)
+        if not changes:
+            return settings, False
+
+        new_settings = dict(settings)
+        new_settings.update(changes)
+        if new_settings != settings:
+            _write_atomic(new_settings)
+            _settings = new_settings
+            _settings_mtime_ns = _file_mtime_ns()
+            _settings_version += 1
+        return dict(new_settings), True
@@ -0,0 +1,285 @@
+# backend/simulation.py
+
+import numpy as np
+
+from decision_engine import ACTION_CODES, OPTIMAL_DISPATCH_MODE
+
+# Numba is optional: when it is installed the kernel is compiled, otherwise the
+# same code runs as a plain Python loop over lists.
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+MAX_SIMULATION_HOURS = 8760
+
+# Step lengths the simulation accepts (settings "simulation_timestep_minutes")
+TIMESTEP_OPTIONS_MINUTES = (5, 10, 15, 30, 60)
+
+MODE_CODES = {
+    "Self-Sufficiency": 0,
+    "Cost Optimization": 1,
+    "Environmental": 2,
+}
+DEFAULT_MODE_CODE = 3 # Unknown mode -> make_decision()'s default branch
+
+_NO_ACTION = ACTION_CODES["NO_ACTION"]
+_USE_OWN_GENERATION = ACTION_CODES["USE_OWN_GENERATION"]
+_CHARGE_BATTERY = ACTION_CODES["CHARGE_BATTERY"]
+_EXPORT_TO_GRID = ACTION_CODES["EXPORT_TO_GRID"]
+_CHARGE_BATTERY_LOW_GRID_PRICE = ACTION_CODES["CHARGE_BATTERY_LOW_GRID_PRICE"]
+_DISCHARGE_BATTERY = ACTION_CODES["DISCHARGE_BATTERY"]
+_DISCHARGE_BATTERY_HIGH_GRID_PRICE = ACTION_CODES["DISCHARGE_BATTERY_HIGH_GRID_PRICE"]
+_IMPORT_FROM_GRID = ACTION_CODES["IMPORT_FROM_GRID"]
+_USE_OWN_GENERATION_RENEWABLE = ACTION_CODES["USE_OWN_GENERATION_RENEWABLE"]
+_CHARGE_BATTERY_RENEWABLE_PRIORITY = ACTION_CODES["CHARGE_BATTERY_RENEWABLE_PRIORITY"]
+_DISCHARGE_BATTERY_RENEWABLE = ACTION_CODES["DISCHARGE_BATTERY_RENEWABLE"]
+_DEFAULT_SURPLUS_HANDLING = ACTION_CODES["DEFAULT_SURPLUS_HANDLING"]
+_DEFAULT_DEFICIT_HANDLING = ACTION_CODES["DEFAULT_DEFICIT_HANDLING"]
+
+
+def _round2(x):
+    # Bit-for-bit what make_decision() gets from round(np.float64, 2)
+    return round(x * 100.0) / 100.0
+
+def _decide_step(solar, wind, demand, charge, capacity, min_reserve_kwh, buy, sell, mode_code,
+                 charge_room, discharge_room):
+    """
+    make_decision() policy for one timestep, without the result dict.
+    charge_room / discharge_room are decision_engine.battery_step_limits().
+    Returns (to_home, to_battery, from_battery, from_grid, to_grid, action_code).
+    """
+    to_home = 0.0
+    to_battery = 0.0
+    from_battery = 0.0
+    from_grid = 0.0
+    to_grid = 0.0
+    action = _NO_ACTION
+
+    generation = solar + wind
+
+    if mode_code == 1: # Cost Optimization
+        if generation >= demand:
+            to_home = demand
+            surplus = generation - demand
+            if charge < capacity:
+                if sell > buy and sell > 0.20:
+                    to_grid = surplus
+                    action = _EXPORT_TO_GRID
+                else:
+                    amount = min(surplus, charge_room)
+                    to_battery = amount
+                    surplus -= amount
+                    if amount > 0:
+                        action = _CHARGE_BATTERY_LOW_GRID_PRICE if buy < 0.15 else _CHARGE_BATTERY
+            if surplus > 0:
+                to_grid = surplus
+                if action == _NO_ACTION:
+                    action = _EXPORT_TO_GRID
+        else:
+            deficit = demand - generation
+            to_home = generation
+            if charge > min_reserve_kwh:
+                amount = min(deficit, discharge_room)
+                from_battery = amount
+                deficit -= amount
+                if amount > 0:
+                    if buy > sell and buy > 0.25:
+                        action = _DISCHARGE_BATTERY_HIGH_GRID_PRICE
+                    else:
+                        action = _DISCHARGE_BATTERY
+            if deficit > 0:
+                from_grid = deficit
+                if action == _NO_ACTION:
+                    action = _IMPORT_FROM_GRID
+
+    elif mode_code == 0 or mode_code == 2: # Self-Sufficiency / Environmental
+        if generation >= demand:
+            to_home = demand
+            surplus = generation - demand
+            action = _USE_OWN_GENERATION if mode_code == 0 else _USE_OWN_GENERATION_RENEWABLE
+            if surplus > 0 and charge < capacity:
+                amount = min(surplus, charge_room)
+                to_battery = amount
+                surplus -= amount
+                if amount > 0:
+                    action = _CHARGE_BATTERY if mode_code == 0 else _CHARGE_BATTERY_RENEWABLE_PRIORITY
+            if surplus > 0:
+                to_grid = surplus
+        else:
+            to_home = generation
+            remaining = demand - generation
+            action = _USE_OWN_GENERATION if mode_code == 0 else _USE_OWN_GENERATION_RENEWABLE
+            if remaining > 0 and charge > min_reserve_kwh:
+                amount = min(remaining, discharge_room)
+                from_battery = amount
+                remaining -= amount
+                if mode_code == 2 and amount > 0:
+                    action = _DISCHARGE_BATTERY_RENEWABLE
+            if remaining > 0:
+                from_grid = remaining
+
+    else: # Default branch
+        if generation >= demand:
+            to_home = demand
+            surplus = generation - demand
+            if charge < capacity:
+                amount = min(surplus, charge_room)
+                to_battery = amount
+                surplus -= amount
+            to_grid = surplus
+            action = _DEFAULT_SURPLUS_HANDLING
+        else:
+            to_home = generation
+            deficit = demand - generation
+            if charge > min_reserve_kwh:
+                amount = min(deficit, discharge_room)
+                from_battery = amount
+                deficit -= amount
+            from_grid = deficit
+            action = _DEFAULT_DEFICIT_HANDLING
+
+    return (max(0.0, _round2(to_home)), max(0.0, _round2(to_battery)), max(0.0, _round2(from_battery)),
+            max(0.0, _round2(from_grid)), max(0.0, _round2(to_grid)), action)
+
+def _simulate_kernel(solar, wind, demand, buy, sell, initial_charge, capacity, min_reserve_kwh, mode_code,
+                     dt, efficiency, max_charge_kw, max_discharge_kw,
+                     flows, action_codes, charge_end, step_cost, totals):
+    """
+    Battery state recurrence over preallocated output arrays.
+    Flows are kW held for dt hours; efficiency is the one-way (charge or
+    discharge) efficiency and the power limits are inf when unlimited.
+    flows is (n, 5) in FLOW_KEYS order; totals receives (import, export, net cost).
+    Returns the final battery charge.
+    """
+    charge = initial_charge
+    total_import = 0.0
+    total_export = 0.0
+    net_cost = 0.0
+    for i in range(len(solar)):
+        charge_room = min((capacity - charge) / (dt * efficiency), max_charge_kw)
+        discharge_room = min((charge - min_reserve_kwh) * efficiency / dt, max_discharge_kw)
+        to_home, to_battery, from_battery, from_grid, to_grid, action = _decide_step(
+            solar[i], wind[i], demand[i], charge, capacity, min_reserve_kwh, buy[i], sell[i], mode_code,
+            charge_room, discharge_room)
+
+        charge += to_battery * dt * efficiency
+        charge -= from_battery * dt / efficiency
+        charge = max(0.0, min(charge, capacity))
+
+        cost = ((from_grid * buy[i]) - (to_grid * sell[i])) * dt
+        total_import += from_grid * dt
+        total_export += to_grid * dt
+        net_cost += cost
+
+        flows[i, 0] = to_home
+        flows[i, 1] = to_battery
+        flows[i, 2] = from_battery
+        flows[i, 3] = from_grid
+        flows[i, 4] = to_grid
+        action_codes[i] = action
+        charge_end[i] = charge
+        step_cost[i] = cost
+
+    totals[0] = total_import
+    totals[1] = total_export
+    totals[2] = net_cost
+    return charge
+
+
+if njit is not None:
+    _round2 = njit(cache=True)(_round2)
+    _decide_step = njit(cache=True)(_decide_step)
+    _simulate_kernel = njit(cache=True)(_simulate_kernel)
+
+
+def simulate_battery(solar_kwh, wind_kwh, demand_kwh, buying_prices, selling_prices,
+                     initial_charge_kwh, battery_capacity_kwh, battery_min_reserve, operating_mode,
+                     allow_grid_charge=True, timestep_hours=1.0, max_charge_kw=None, max_discharge_kw=None,
+                     round_trip_efficiency=1.0):
+    """
+    Runs the make_decision() policy and the battery state recurrence over a
+    whole horizon of steps. "Optimal Dispatch" is handed to the lookahead
+    planner in dispatch_planner.py instead.
+
+    Args:
+        solar_kwh, wind_kwh, demand_kwh (array): Per-step average power (kW, which is
+            kWh per hour), already scaled to capacity.
+        buying_prices, selling_prices (array): Per-step TOU prices in $/kWh.
+        initial_charge_kwh (float): Battery charge before the first step.
+        battery_capacity_kwh (float): Max battery capacity.
+        battery_min_reserve (int): User reserve in percent of capacity.
+        operating_mode (str): Operating mode name.
+        allow_grid_charge (bool): Only used by the dispatch planner.
+        timestep_hours (float): Length of each step (1/12 for 5-minute steps).
+        max_charge_kw, max_discharge_kw (float): Battery power limits, None for unlimited.
+        round_trip_efficiency (float): Split evenly between charging and discharging.
+    Returns:
+        dict: "flows" (n, 5) array of kW in decision_engine.FLOW_KEYS order,
+        "action_codes", "battery_charge_kwh" (end of each step), "step_cost", the
+        three totals (kWh and $) and "final_battery_charge_kwh".
+    """
+    if operating_mode == OPTIMAL_DISPATCH_MODE:
+        from dispatch_planner import plan_dispatch
+        return plan_dispatch(solar_kwh, wind_kwh, demand_kwh, buying_prices, selling_prices,
+                             initial_charge_kwh, battery_capacity_kwh, battery_min_reserve,
+                             allow_grid_charge=allow_grid_charge, timestep_hours=timestep_hours,
+                             max_charge_kw=max_charge_kw, max_discharge_kw=max_discharge_kw,
+                             round_trip_efficiency=round_trip_efficiency)
+
+    solar = np.ascontiguousarray(solar_kwh, dtype=float)
+    wind = np.ascontiguousarray(wind_kwh, dtype=float)
+    demand = np.ascontiguousarray(demand_kwh, dtype=float)
+    buy = np.ascontiguousarray(buying_prices, dtype=float)
+    sell = np.ascontiguousarray(selling_prices, dtype=float)
+    n = len(solar)
+
+    flows = np.zeros((n, 5))
+    action_codes = np.zeros(n, dtype=np.int8)
+    charge_end = np.zeros(n)
+    step_cost = np.zeros(n)
+    totals = np.zeros(3)
+
+    capacity = float(battery_capacity_kwh)
+    min_reserve_kwh = (battery_min_reserve / 100) * capacity
+    mode_code = MODE_CODES.get(operating_mode, DEFAULT_MODE_CODE)
+
+    if njit is None:
+        # Plain Python floats are much faster to loop over than NumPy scalars
+        solar, wind, demand, buy, sell = solar.tolist(), wind.tolist(), demand.tolist(), buy.tolist(), sell.tolist()
+
+    final_charge = _simulate_kernel(solar, wind, demand, buy, sell, float(initial_charge_kwh), capacity,
+                                    min_reserve_kwh, mode_code, float(timestep_hours),
+                                    float(round_trip_efficiency) ** 0.5,
+                                    np.inf if max_charge_kw is None else float(max_charge_kw),
+                                    np.inf if max_discharge_kw is None else float(max_discharge_kw),
+                                    flows, action_codes, charge_end, step_cost, totals)
+
+    return {
+        "flows": flows,
+        "action_codes": action_codes,
+        "battery_charge_kwh": charge_end,
+        "step_cost": step_cost,
+        "total_grid_import_kwh": totals[0],
+        "total_grid_export_kwh": totals[1],
+        "net_grid_cost": totals[2],
+        "final_battery_charge_kwh": np.float64(final_charge),
+    }
+
+def battery_params(settings):
+    """
+    simulate_battery() keyword arguments for the battery power limits and
+    efficiency in a settings (or household config) dict; a limit of 0 means
+    unlimited.
+    """
+    max_charge = float(settings.get("battery_max_charge_kw") or 0)
+    max_discharge = float(settings.get("battery_max_discharge_kw") or 0)
+    return {
+        "max_charge_kw": max_charge if max_charge > 0 else None,
+        "max_discharge_kw": max_discharge if max_discharge > 0 else None,
+        "round_trip_efficiency": float(settings.get("battery_round_trip_efficiency", 1.0)),
+    }
+
+def settings_timestep_hours(settings):
+    """Simulation step length in hours from settings["simulation_timestep_minutes"]."""
+    return int(settings.get("simulation_timestep_minutes", 60)) / 60
@@ -0,0 +1,221 @@
+# backend/sizing.py
+
+import sys
+import json
+import time
+import argparse
+import itertools
+from datetime import datetime
+
+from simulation import simulate_battery, battery_params, MAX_SIMULATION_HOURS
+from settings_store import get_settings, validate_settings_update, SettingsValidationError
+from batch_simulation import build_shared_forecast, imap_shared_forecast, validate_workers
+
+# Rough installed cost per unit, only used to rank grid points for the Pareto
+# front. Callers should pass their own quotes via `unit_costs`.
+DEFAULT_UNIT_COSTS = {
+    "battery_per_kwh": 500.0,
+    "solar_per_kw": 1200.0,
+    "wind_per_kw": 2500.0,
+}
+
+MAX_SWEEP_POINTS = 20000
+
+# A larger battery that lowers net cost by less than this (in $ over the horizon)
+# for `DEFAULT_PRUNE_PATIENCE` consecutive steps ends the walk along that axis.
+DEFAULT_MIN_IMPROVEMENT = 0.01
+DEFAULT_PRUNE_PATIENCE = 2
+
+
+def capital_cost(point, unit_costs):
+    return (point["battery_capacity_kwh"] * unit_costs["battery_per_kwh"]
+            + point["solar_capacity_kw"] * unit_costs["solar_per_kw"]
+            + point["wind_capacity_kw"] * unit_costs["wind_per_kw"])
+
+def _sweep_line(forecast, line):
+    """
+    Walks one (solar, wind, mode) line of the grid in ascending battery size.
+    Once extra capacity stops paying off the rest of the line is reported as
+    pruned instead of simulated.
+    """
+    solar_kw, wind_kw, mode = line["solar_capacity_kw"], line["wind_capacity_kw"], line["operating_mode"]
+    solar = forecast["solar_per_kw"] * solar_kw
+    wind = forecast["wind_per_kw"] * wind_kw
+
+    points = []
+    best_cost = None
+    stalled = 0
+    for battery_kwh in line["battery_capacities"]:
+        point = {
+            "battery_capacity_kwh": battery_kwh,
+            "solar_capacity_kw": solar_kw,
+            "wind_capacity_kw": wind_kw,
+            "operating_mode": mode,
+        }
+        if line["prune"] and stalled >= line["patience"]:
+            point["pruned"] = True
+            points.append(point)
+            continue
+
+        result = simulate_battery(
+            solar, wind, forecast["demand_kwh"], forecast["buying_prices"], forecast["selling_prices"],
+            initial_charge_kwh=battery_kwh * line["initial_charge_fraction"],
+            battery_capacity_kwh=battery_kwh,
+            battery_min_reserve=line["min_reserve_percent"],
+            operating_mode=mode,
+            allow_grid_charge=line["allow_grid_charge"],
+            timestep_hours=forecast["timestep_minutes"] / 60,
+            **line["battery"]
+        )
+        net_cost = float(result["net_grid_cost"])
+        point.update({
+            "pruned": False,
+            "net_grid_cost": round(net_cost, 2),
+            "total_grid_import_kwh": round(float(result["total_grid_import_kwh"]), 2),
+            "total_grid_export_kwh": round(float(result["total_grid_export_kwh"]), 2),
+            "final_battery_charge_kwh": round(float(result["final_battery_charge_kwh"]), 2),
+        })
+        points.append(point)
+
+        if best_cost is not None and best_cost - net_cost < line["min_improvement"]:
+            stalled += 1
+        else:
+            stalled = 0
+        best_cost = net_cost if best_cost is None else min(best_cost, net_cost)
+    return points
+
+def pareto_front(points):
+    """
+    Points not dominated in (capital_cost, net_grid_cost), cheapest first.
+    """
+    candidates = sorted((p for p in points if not p["pruned"]),
+                        key=lambda p: (p["capital_cost"], p["net_grid_cost"]))
+    front = []
+    best_net_cost = None
+    for point in candidates:
+        if best_net_cost is None or point["net_grid_cost"] < best_net_cost:
+            front.append(point)
+            best_net_cost = point["net_grid_cost"]
+    return front
+
+def _validated_axis(key, values):
+    # A string or dict would otherwise be swept character by character / key by key
+    if not isinstance(values, (list, tuple)):
+        raise SettingsValidationError(f"{key} must be a list of values")
+    converted = [validate_settings_update({key: value})[key] for value in values]
+    if not converted:
+        raise SettingsValidationError(f"{key} needs at least one value")
+    return sorted(set(converted)) if key != "operating_mode" else list(dict.fromkeys(converted))
+
+def run_sweep(battery_capacities, solar_capacities, wind_capacities, operating_modes, hours=24,
+              start_dt=None, workers=None, prune=True, min_improvement=DEFAULT_MIN_IMPROVEMENT,
+              patience=DEFAULT_PRUNE_PATIENCE, unit_costs=None):
+    """
+    Evaluates battery x solar x wind x mode over one shared forecast.
+
+    The models run once; each (solar, wind, mode) line is simulated on the
+    process pool, walking battery sizes upward and pruning once extra storage
+    stops lowering the net grid cost.
+    Initial charge, reserve, battery power limits, efficiency and the
+    simulation timestep come from the current settings (the charge as a
+    fraction of the configured capacity so every battery size starts equally full).
+    Returns:
+        dict: "points" (the cost surface, one entry per grid point), "pareto_front"
+        and evaluation counts.
+    Raises:
+        ValueError: On invalid axes, hours or workers, or too many points.
+    """
+    validate_workers(workers)
+    battery_capacities = _validated_axis("battery_capacity_kwh", battery_capacities)
+    solar_capacities = _validated_axis("solar_capacity_kw", solar_capacities)
+    wind_capacities = _validated_axis("wind_capacity_kw", wind_capacities)
+    operating_modes = _validated_axis("operating_mode", operating_modes)
+    total_points = len(battery_capacities) * len(solar_capacities) * len(wind_capacities) * len(operating_modes)
+    if total_points > MAX_SWEEP_POINTS:
+        raise ValueError(f"Sweep has {total_points} points, the limit is {MAX_SWEEP_POINTS}")
+    if not 1 <= hours <= MAX_SIMULATION_HOURS:
+        raise ValueError(f"hours must be between 1 and {MAX_SIMULATION_HOURS}")
+
+    unit_costs = dict(DEFAULT_UNIT_COSTS, **(unit_costs or {}))
+    settings = get_settings()
+    configured_capacity = settings.get('battery_capacity_kwh', 10.0)
+    initial_charge_fraction = (min(1.0, settings.get('battery_current_charge_kwh', 5.0) / configured_capacity)
+                               if configured_capacity > 0 else 0.0)
+
+    started = time.perf_counter()
+    forecast = build_shared_forecast(start_dt or datetime.now(), hours,
+                                     int(settings.get('simulation_timestep_minutes', 60)))
+
+    lines = [{
+        "solar_capacity_kw": solar_kw,
+        "wind_capacity_kw": wind_kw,
+        "operating_mode": mode,
+        "battery_capacities": battery_capacities,
+        "initial_charge_fraction": initial_charge_fraction,
+        "min_reserve_percent": settings.get('min_battery_reserve_user_percent', 20),
+        "allow_grid_charge": settings.get('allow_grid_charge', True),
+        "battery": battery_params(settings),
+        "prune": prune,
+        "min_improvement": min_improvement,
+        "patience": patience,
+    } for solar_kw, wind_kw, mode in itertools.product(solar_capacities, wind_capacities, operating_modes)]
+
+    points = []
+    for line_points in imap_shared_forecast(_sweep_line, lines, forecast, workers):
+        points.extend(line_points)
+    for point in points:
+        point["capital_cost"] = round(capital_cost(point, unit_costs), 2)
+    points.sort(key=lambda p: (p["operating_mode"], p["solar_capacity_kw"], p["wind_capacity_kw"],
+                               p["battery_capacity_kwh"]))
+
+    pruned = sum(1 for p in points if p["pruned"])
+    return {
+        "timestamp_start": forecast["timestamp_start"],
+        "simulation_duration_hours": hours,
+        "timestep_minutes": forecast["timestep_minutes"],
+        "axes": {
+            "battery_capacity_kwh": battery_capacities,
+            "solar_capacity_kw": solar_capacities,
+            "wind_capacity_kw": wind_capacities,
+            "operating_mode": operating_modes,
+        },
+        "unit_costs": unit_costs,
+        "points": points,
+        "pareto_front": pareto_front(points),
+        "evaluated_points": len(points) - pruned,
+        "pruned_points": pruned,
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def _float_list(text):
+    return [float(v) for v in text.split(",") if v.strip()]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep battery / PV / wind sizes and operating modes.")
+    parser.add_argument("--battery", type=_float_list, default=[0, 5, 10, 15, 20], help="Comma-separated kWh values")
+    parser.add_argument("--solar", type=_float_list, default=[0, 3, 5, 8], help="Comma-separated kW values")
+    parser.add_argument("--wind", type=_float_list, default=[0, 2], help="Comma-separated kW values")
+    parser.add_argument("--modes", default="Cost Optimization,Self-Sufficiency,Environmental",
+                        help="Comma-separated operating modes")
+    parser.add_argument("--hours", type=int, default=24)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--no-prune", action="store_true", help="Simulate every grid point")
+    parser.add_argument("--output", default=None, help="Write the JSON result here instead of stdout")
+    args = parser.parse_args(argv)
+
+    try:
+        result = run_sweep(args.battery, args.solar, args.wind, args.modes.split(","), hours=args.hours,
+                           workers=args.workers, prune=not args.no_prune)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    else:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# backend/status_feed.py
+
+import queue
+import threading
+import time
+
+# One snapshot is computed per tick and fanned out to every subscriber
+STATUS_FEED_TICK_SECONDS = 5.0
+STATUS_FEED_KEEPALIVE_SECONDS = 15.0
+
+# Every Nth tick is sent as a full snapshot so clients that missed a delta resync
+STATUS_FEED_FULL_EVERY_TICKS = 12
+
+# Messages buffered per client; a client that falls this far behind is resynced
+STATUS_FEED_QUEUE_SIZE = 8
+
+
+def diff_status(old, new):
+    """
+    Recursive diff of two status snapshots.
+    Returns:
+        dict: Only the keys of `new` whose values differ from `old` (nested dicts
+        are diffed key by key). Keys removed from `new` are not reported.
+    """
+    changes = {}
+    for key, value in new.items():
+        previous = old.get(key)
+        if isinstance(value, dict) and isinstance(previous, dict):
+            nested = diff_status(previous, value)
+            if nested:
+                changes[key] = nested
+        elif key not in old or previous != value:
+            changes[key] = value
+    return changes
+
+
+_subscribers = set()
+_subscribers_lock = threading.Lock()
+_producer = None
+_latest_snapshot = None
+_tick = 0
+
+
+def _publish(subscriber, message):
+    try:
+        subscriber.put_nowait(message)
+    except queue.Full:
+        # Slow client: drop its backlog and start it over from a full snapshot
+        with subscriber.mutex:
+            subscriber.queue.clear()
+        subscriber.put_nowait(("snapshot", _latest_snapshot))
+
+def _run_producer(build_snapshot):
+    global _producer, _latest_snapshot, _tick
+    while True:
+        started = time.monotonic()
+        try:
+            snapshot = build_snapshot()
+        except Exception as e:
+            print(f"Error building status snapshot: {e}")
+            snapshot = None
+
+        with _subscribers_lock:
+            if not _subscribers:
+                # Nobody is listening: stop ticking until the next subscribe()
+                _producer = None
+                _latest_snapshot = None
+                return
+            if snapshot is not None:
+                previous = _latest_snapshot
+                _latest_snapshot = snapshot
+                _tick += 1
+                if previous is None or _tick % STATUS_FEED_FULL_EVERY_TICKS == 0:
+                    message = ("snapshot", snapshot)
+                else:
+                    changes = diff_status(previous, snapshot)
+                    message = ("delta", changes) if changes else None
+                if message is not None:
+                    for subscriber in _subscribers:
+                        _publish(subscriber, message)
+
+        time.sleep(max(0.0, STATUS_FEED_TICK_SECONDS - (time.monotonic() - started)))
+
+def subscribe_status_feed(build_snapshot):
+    """
+    Registers a new feed client and starts the producer thread if needed.
+    Args:
+        build_snapshot (callable): Returns the current status dict; only called
+            from the producer thread, once per tick.
+    Returns:
+        queue.Queue: Receives ("snapshot" | "delta", dict) messages. The latest
+        snapshot is queued right away when one is available.
+    """
+    global _producer
+    subscriber = queue.Queue(maxsize=STATUS_FEED_QUEUE_SIZE)
+    with _subscribers_lock:
+        _subscribers.add(subscriber)
+        if _latest_snapshot is not None:
+            subscriber.put_nowait(("snapshot", _latest_snapshot))
+        if _producer is None:
+            _producer = threading.Thread(target=_run_producer, args=(build_snapshot,),
+                                         name="status-feed", daemon=True)
+            _producer.start()
+    return subscriber
+
+def unsubscribe_status_feed(subscriber):
+    with _subscribers_lock:
+        _subscribers.discard(subscriber)
+
+def next_status_message(subscriber, timeout=None):
+    """Next (event, data) message for a subscriber, or None after `timeout` seconds."""
+    try:
+        return subscriber.get(timeout=timeout)
+    except queue.Empty:
+        return None
+
+def get_subscriber_count():
+    with _subscribers_lock:
+        return len(_subscribers)
@@ -0,0 +1,334 @@
+# backend/telemetry.py
+
+import os
+import math
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+# Every server process (asgi_app.py --workers N) maps the same ring files from
+# TELEMETRY_DIR, so whichever worker answers sees the latest readings. An flock
+# on TELEMETRY_LOCK_NAME serializes their writes against reads. Without fcntl
+# (Windows, where there is no fork() either) the rings stay in process memory.
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+TELEMETRY_DIR = os.path.join(os.path.dirname(__file__), 'data', 'telemetry')
+TELEMETRY_LOCK_NAME = 'telemetry.lock'
+RING_SUFFIX = '.ring'
+
+# Measured signals: power in kW, battery charge in kWh
+SIGNALS = ("solar", "wind", "demand", "battery", "grid")
+
+# Raw samples kept per signal (one day at 1 Hz). Older samples only live on in
+# the rollups below, so memory is fixed however long the process runs.
+RAW_CAPACITY = 86400
+
+# Rollup name -> (bucket width in seconds, buckets kept)
+ROLLUPS = {
+    "1min": (60, 7 * 24 * 60),        # 7 days
+    "15min": (900, 90 * 24 * 4),      # 90 days
+    "1h": (3600, 2 * 365 * 24),       # 2 years
+}
+RESOLUTIONS = ("raw",) + tuple(ROLLUPS)
+
+# Readings older than this are not used as "live" values by /api/status
+STALE_AFTER_SECONDS = 300
+
+MAX_SAMPLES_PER_POST = 100000
+
+# Samples timestamped further ahead of the server clock than this are rejected:
+# one future sample would make every later real one look out of order (and
+# stay "live" forever), e.g. epoch milliseconds sent as seconds
+MAX_CLOCK_SKEW_SECONDS = 60
+
+_ROLLUP_FIELDS = ("start", "sum", "count", "min", "max", "last")
+
+# Ring layout: int64 header words, then one float64 column per field. The
+# header holds the format, capacity and field count (a ring file written with
+# other constants is cleared), the head (next slot to write) and size, and on
+# raw rings the accepted / dropped-out-of-order counters of that signal.
+_RING_FORMAT = 1
+_HEADER_WORDS = 8
+_HEAD, _SIZE, _ACCEPTED, _DROPPED = 3, 4, 5, 6
+
+
+def _new_ring(capacity, fields, path=None):
+    """A ring in process memory, or mapped shared from `path` (created if missing)."""
+    nbytes = 8 * (_HEADER_WORDS + capacity * len(fields))
+    if path is None:
+        buffer = np.zeros(nbytes, dtype=np.uint8)
+    else:
+        if not os.path.exists(path) or os.path.getsize(path) != nbytes:
+            with open(path, 'wb') as f:
+                f.truncate(nbytes)
+        buffer = np.memmap(path, dtype=np.uint8, mode='r+', shape=(nbytes,))
+    header = buffer[:8 * _HEADER_WORDS].view(np.int64)
+    if tuple(header[:3]) != (_RING_FORMAT, capacity, len(fields)):
+        if header.any(): # written with other constants; a new file is already zeros
+            buffer[:] = 0
+        header[:3] = (_RING_FORMAT, capacity, len(fields))
+    columns = buffer[8 * _HEADER_WORDS:].view(np.float64).reshape(len(fields), capacity)
+    ring = {field: columns[k] for k, field in enumerate(fields)}
+    ring.update(capacity=capacity, header=header)
+    return ring
+
+def _new_series(prefix=None):
+    """Raw and rollup rings of one signal; with a path prefix they are shared ring files."""
+    def path(name):
+        return f"{prefix}-{name}{RING_SUFFIX}" if prefix else None
+    series = {"raw": _new_ring(RAW_CAPACITY, ("t", "v"), path("raw"))}
+    for name, (_, capacity) in ROLLUPS.items():
+        series[name] = _new_ring(capacity, _ROLLUP_FIELDS, path(name))
+    return series
+
+_series = None # opened on first use by _locked()
+_shared_dir = None
+_lock_file = None
+_lock_file_pid = None
+_telemetry_lock = threading.Lock()
+
+
+@contextmanager
+def _locked(exclusive):
+    """
+    Yields the per-signal series, locked against other threads and (through
+    flock) other processes. The ring files are opened on first use.
+    """
+    global _series, _shared_dir, _lock_file, _lock_file_pid
+    with _telemetry_lock:
+        if _series is None:
+            if fcntl is None:
+                _series = {signal: _new_series() for signal in SIGNALS}
+            else:
+                os.makedirs(TELEMETRY_DIR, exist_ok=True)
+                _shared_dir = TELEMETRY_DIR
+        if _shared_dir is None:
+            yield _series
+            return
+        # flock is per open file, so a forked child opens its own
+        if _lock_file is None or _lock_file_pid != os.getpid():
+            _lock_file = open(os.path.join(_shared_dir, TELEMETRY_LOCK_NAME), 'ab')
+            _lock_file_pid = os.getpid()
+        fcntl.flock(_lock_file, fcntl.LOCK_EX if exclusive or _series is None else fcntl.LOCK_SH)
+        try:
+            if _series is None:
+                _series = {signal: _new_series(os.path.join(_shared_dir, signal)) for signal in SIGNALS}
+            yield _series
+        finally:
+            fcntl.flock(_lock_file, fcntl.LOCK_UN)
+
+
+def _ring_write(ring, columns):
+    """Appends rows (dict of equal-length arrays) after the newest one, overwriting the oldest."""
+    n = len(next(iter(columns.values())))
+    if n == 0:
+        return
+    capacity = ring["capacity"]
+    if n > capacity:
+        columns = {k: v[-capacity:] for k, v in columns.items()}
+        n = capacity
+    header = ring["header"]
+    head = int(header[_HEAD])
+    idx = (head + np.arange(n)) % capacity
+    for field, values in columns.items():
+        ring[field][idx] = values
+    header[_HEAD] = (head + n) % capacity
+    header[_SIZE] = min(capacity, int(header[_SIZE]) + n)
+
+def _ring_size(ring):
+    return int(ring["header"][_SIZE])
+
+def _ring_order(ring):
+    """Slot indices of the stored rows, oldest first."""
+    size, capacity = _ring_size(ring), ring["capacity"]
+    return (int(ring["header"][_HEAD]) - size + np.arange(size)) % capacity
+
+def _last_slot(ring):
+    return (int(ring["header"][_HEAD]) - 1) % ring["capacity"]
+
+def _update_rollup(ring, width, t, v):
+    """Folds time-ordered samples into the rollup; only the newest bucket can still be open."""
+    buckets = np.floor(t / width) * width
+    if _ring_size(ring):
+        last = _last_slot(ring)
+        same = buckets == ring["start"][last]
+        if same.any():
+            ring["sum"][last] += v[same].sum()
+            ring["count"][last] += same.sum()
+            ring["min"][last] = min(ring["min"][last], v[same].min())
+            ring["max"][last] = max(ring["max"][last], v[same].max())
+            ring["last"][last] = v[same][-1]
+            buckets, v = buckets[~same], v[~same]
+    if len(buckets) == 0:
+        return
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)] - 1
+    _ring_write(ring, {
+        "start": buckets[starts],
+        "sum": np.add.reduceat(v, starts),
+        "count": np.diff(np.r_[starts, len(buckets)]).astype(float),
+        "min": np.minimum.reduceat(v, starts),
+        "max": np.maximum.reduceat(v, starts),
+        "last": v[ends],
+    })
+
+def _is_finite_number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return False
+    try:
+        return math.isfinite(value)
+    except OverflowError: # int beyond float range
+        return False
+
+def _parse_timestamp(value, index, now):
+    t = None
+    if _is_finite_number(value):
+        t = float(value)
+    elif isinstance(value, str):
+        try:
+            t = datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            pass
+    if t is None:
+        raise ValueError(f"samples[{index}].timestamp must be epoch seconds or an ISO 8601 string")
+    if t > now + MAX_CLOCK_SKEW_SECONDS:
+        raise ValueError(f"samples[{index}].timestamp is more than {MAX_CLOCK_SKEW_SECONDS}s in the future")
+    return t
+
+def ingest_samples(samples):
+    """
+    Stores a batch of readings. Each sample holds a timestamp (epoch seconds
+    or ISO 8601; defaults to now) and any subset of SIGNALS.
+    Per signal, samples must be newer than the last stored one; older ones are
+    dropped and counted rather than rejected. Timestamps more than
+    MAX_CLOCK_SKEW_SECONDS ahead of the server clock are rejected.
+    Returns:
+        dict: accepted and dropped reading counts for this batch.
+    Raises:
+        ValueError: If any sample is malformed (nothing is stored).
+    """
+    if not isinstance(samples, list):
+        raise ValueError("samples must be a list")
+    if len(samples) > MAX_SAMPLES_PER_POST:
+        raise ValueError(f"At most {MAX_SAMPLES_PER_POST} samples per request")
+
+    now = time.time()
+    columns = {signal: ([], []) for signal in SIGNALS}
+    for i, sample in enumerate(samples):
+        if not isinstance(sample, dict):
+            raise ValueError(f"samples[{i}] must be an object")
+        t = _parse_timestamp(sample["timestamp"], i, now) if sample.get("timestamp") is not None else now
+        for signal in SIGNALS:
+            value = sample.get(signal)
+            if value is None:
+                continue
+            if not _is_finite_number(value):
+                raise ValueError(f"samples[{i}].{signal} must be a finite number")
+            columns[signal][0].append(t)
+            columns[signal][1].append(float(value))
+
+    accepted = dropped = 0
+    with _locked(exclusive=True) as all_series:
+        for signal, (times, values) in columns.items():
+            if not times:
+                continue
+            t = np.asarray(times)
+            v = np.asarray(values)
+            order = np.argsort(t, kind='stable')
+            t, v = t[order], v[order]
+
+            series = all_series[signal]
+            raw = series["raw"]
+            n = len(t)
+            if _ring_size(raw):
+                newer = t > raw["t"][_last_slot(raw)]
+                t, v = t[newer], v[newer]
+            raw["header"][_DROPPED] += n - len(t)
+            raw["header"][_ACCEPTED] += len(t)
+            dropped += n - len(t)
+            if len(t) == 0:
+                continue
+            _ring_write(raw, {"t": t, "v": v})
+            for name, (width, _) in ROLLUPS.items():
+                _update_rollup(series[name], width, t, v)
+            accepted += len(t)
+    return {"accepted": accepted, "dropped_out_of_order": dropped}
+
+def latest_readings(max_age_seconds=STALE_AFTER_SECONDS, now=None):
+    """
+    Newest reading per signal in O(1).
+    Returns:
+        dict: signal -> {"timestamp", "value"} for signals with a reading no
+        older than `max_age_seconds` (None: any age).
+    """
+    now = time.time() if now is None else now
+    readings = {}
+    with _locked(exclusive=False) as all_series:
+        for signal in SIGNALS:
+            raw = all_series[signal]["raw"]
+            if not _ring_size(raw):
+                continue
+            last = _last_slot(raw)
+            t = float(raw["t"][last])
+            if max_age_seconds is None or now - t <= max_age_seconds:
+                readings[signal] = {"timestamp": t, "value": float(raw["v"][last])}
+    return readings
+
+def query_series(signal, resolution="raw", start=None, end=None):
+    """
+    Stored readings of one signal between two epoch times (inclusive).
+    Returns:
+        dict: "timestamps" and "values" for raw data, or the bucket starts with
+        mean/min/max/last/count lists for a rollup.
+    Raises:
+        ValueError: On an unknown signal or resolution.
+    """
+    if signal not in SIGNALS:
+        raise ValueError(f"signal must be one of {', '.join(SIGNALS)}")
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"resolution must be one of {', '.join(RESOLUTIONS)}")
+
+    with _locked(exclusive=False) as all_series:
+        ring = all_series[signal][resolution]
+        order = _ring_order(ring)
+        time_field = "t" if resolution == "raw" else "start"
+        times = ring[time_field][order]
+        lo = 0 if start is None else int(np.searchsorted(times, start, side='left'))
+        hi = len(times) if end is None else int(np.searchsorted(times, end, side='right'))
+        rows = order[lo:hi]
+        if resolution == "raw":
+            return {"signal": signal, "resolution": resolution,
+                    "timestamps": ring["t"][rows].tolist(), "values": ring["v"][rows].tolist()}
+        counts = ring["count"][rows]
+        return {
+            "signal": signal,
+            "resolution": resolution,
+            "bucket_seconds": ROLLUPS[resolution][0],
+            "timestamps": ring["start"][rows].tolist(),
+            "mean": np.round(ring["sum"][rows] / counts, 4).tolist(),
+            "min": ring["min"][rows].tolist(),
+            "max": ring["max"][rows].tolist(),
+            "last": ring["last"][rows].tolist(),
+            "count": counts.astype(int).tolist(),
+        }
+
+def get_telemetry_stats():
+    """Counters and stored row counts, totalled over all server processes when shared."""
+    with _locked(exclusive=False) as all_series:
+        raws = [all_series[signal]["raw"]["header"] for signal in SIGNALS]
+        stats = {
+            "accepted": int(sum(header[_ACCEPTED] for header in raws)),
+            "dropped_out_of_order": int(sum(header[_DROPPED] for header in raws)),
+            "stored": {signal: {name: _ring_size(ring) for name, ring in all_series[signal].items()}
+                       for signal in SIGNALS},
+            "shared": _shared_dir is not None,
+        }
+        stats["memory_bytes"] = sum(array.nbytes for series in all_series.values() for ring in series.values()
+                                    for array in ring.values() if isinstance(array, np.ndarray))
+    return stats
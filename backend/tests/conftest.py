@@ -0,0 +1,8 @@
+# backend/tests/conftest.py
+
+import os
+import sys
+
+# Backend modules import each other as top-level modules (python app.py is run
+# from backend/), so the tests need backend/ on the path too
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,54 @@
+# backend/tests/test_decision_engine.py
+
+import itertools
+
+import numpy as np
+import pytest
+
+from decision_engine import make_decision, make_decisions_batch, batch_decision_at
+
+MODES = ["Self-Sufficiency", "Cost Optimization", "Environmental", "Unknown Mode"]
+# (buying, selling) pairs hitting every price branch of Cost Optimization
+PRICES = [(0.10, 0.05), (0.15, 0.08), (0.30, 0.12), (0.20, 0.22), (0.30, 0.35), (0.12, 0.21)]
+# (solar, wind, demand): surplus, exact balance and deficit
+FLOWS = [(3.0, 1.0, 2.0), (1.5, 0.5, 2.0), (0.5, 0.2, 2.0), (0.0, 0.0, 0.0), (0.0, 0.0, 1.7), (4.0, 0.0, 0.0)]
+# Battery charge relative to capacity 10 kWh and reserve 30%: empty, below/at
+# reserve, mid, nearly full, full, over
+CHARGES = [0.0, 2.0, 3.0, 5.0, 9.5, 10.0, 12.0]
+# (timestep_hours, max_charge_kw, max_discharge_kw, round_trip_efficiency)
+STEPS = [(1.0, None, None, 1.0), (0.25, 3.0, 2.5, 0.9), (5 / 60, None, 1.5, 0.85)]
+
+# Actions each mode must reach over CASES, so every branch is compared
+EXPECTED_ACTIONS = {
+    "Self-Sufficiency": {"CHARGE_BATTERY", "USE_OWN_GENERATION"},
+    "Cost Optimization": {"CHARGE_BATTERY", "CHARGE_BATTERY_LOW_GRID_PRICE", "DISCHARGE_BATTERY",
+                          "DISCHARGE_BATTERY_HIGH_GRID_PRICE", "EXPORT_TO_GRID", "IMPORT_FROM_GRID", "NO_ACTION"},
+    "Environmental": {"CHARGE_BATTERY_RENEWABLE_PRIORITY", "DISCHARGE_BATTERY_RENEWABLE",
+                      "USE_OWN_GENERATION_RENEWABLE"},
+    "Unknown Mode": {"DEFAULT_DEFICIT_HANDLING", "DEFAULT_SURPLUS_HANDLING"},
+}
+
+
+def _cases():
+    cases = [(s, w, d, c, 10.0, 30, b, sp) for (s, w, d), c, (b, sp) in itertools.product(FLOWS, CHARGES, PRICES)]
+    rng = np.random.default_rng(7)
+    for _ in range(500):
+        cases.append((rng.uniform(0, 5), rng.uniform(0, 2), rng.uniform(0, 4), rng.uniform(0, 12),
+                      rng.choice([0.0, 5.0, 10.0]), int(rng.integers(0, 101)),
+                      rng.choice([0.10, 0.15, 0.25, 0.30]), rng.choice([0.05, 0.12, 0.21, 0.40])))
+    return cases
+
+CASES = _cases()
+
+
+@pytest.mark.parametrize("step", STEPS, ids=["hourly", "15min_limits_eff", "5min_discharge_limit"])
+@pytest.mark.parametrize("mode", MODES)
+def test_batch_matches_scalar(mode, step):
+    columns = [np.array(col, dtype=float) for col in zip(*CASES)]
+    batch = make_decisions_batch(*columns, mode, *step)
+    actions = set()
+    for i, case in enumerate(CASES):
+        expected = make_decision(*[np.float64(v) for v in case], mode, *step)
+        assert batch_decision_at(batch, i, mode) == expected, f"{mode} {step} {case}"
+        actions.add(expected["recommended_action"])
+    assert EXPECTED_ACTIONS[mode] <= actions
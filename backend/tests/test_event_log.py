@@ -0,0 +1,64 @@
+# backend/tests/test_event_log.py
+
+import os
+import importlib
+
+import pytest
+
+import event_log
+
+
+@pytest.fixture
+def log(tmp_path):
+    module = importlib.reload(event_log)
+    module.LOG_DIR = str(tmp_path)
+    yield module
+    importlib.reload(event_log)
+
+def _all_events(log):
+    events, cursor = [], None
+    while True:
+        page = log.query_events(cursor=cursor, limit=log.MAX_PAGE_SIZE)
+        events.extend(page["events"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return events
+
+def test_events_survive_a_restart(log):
+    for i in range(10):
+        log.log_event("TEST", f"event {i}", {"i": i})
+    assert log.flush()
+    assert [e["seq"] for e in _all_events(log)] == list(range(10, 0, -1))
+
+    log_dir = log.LOG_DIR
+    restarted = importlib.reload(event_log)
+    restarted.LOG_DIR = log_dir
+    restarted.log_event("TEST", "after restart")
+    assert restarted.flush()
+    events = _all_events(restarted)
+    assert events[0]["seq"] == 11 and events[0]["message"] == "after restart"
+    assert len(events) == 11
+
+@pytest.mark.skipif(not hasattr(os, "fork") or event_log.fcntl is None, reason="needs fork() and flock")
+def test_forked_workers_share_one_log(log, monkeypatch):
+    # Small segments so the workers also rotate underneath each other
+    monkeypatch.setattr(log, "SEGMENT_MAX_BYTES", 4096)
+    workers, per_worker = 4, 300
+    children = []
+    for w in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                for i in range(per_worker):
+                    log.log_event("TEST", f"worker {w} event {i}", {"worker": w})
+                ok = log.flush(timeout=30)
+            finally:
+                os._exit(0 if ok else 1)
+        children.append(pid)
+    assert all(os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1]) == 0 for pid in children)
+
+    events = _all_events(log)
+    seqs = [e["seq"] for e in events]
+    assert len(events) == workers * per_worker
+    assert seqs == list(range(workers * per_worker, 0, -1)) # unique, gap-free, newest first
+    assert {e["data"]["worker"] for e in events} == set(range(workers))
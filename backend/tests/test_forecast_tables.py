@@ -0,0 +1,44 @@
+# backend/tests/test_forecast_tables.py
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+import forecasting
+from forecasting import compile_forecast_tables, make_predictions_for_time, make_predictions_for_times
+
+
+@pytest.fixture
+def tables(tmp_path, monkeypatch):
+    if not forecasting.ensure_models_loaded():
+        pytest.skip("trained models are not available")
+    monkeypatch.setattr(forecasting, "_tables", forecasting._tables) # restored after the test
+    forecasting.clear_prediction_cache()
+    first_year = datetime.now().year
+    compile_forecast_tables(first_year, years=1, path=str(tmp_path / "forecast_tables.npz"))
+    return first_year
+
+def _timestamps(first_year):
+    start = datetime(first_year, 1, 1)
+    # Night and solar hours, every weekday, sub-hourly minutes and month ends
+    times = [start + timedelta(days=d, hours=h, minutes=m) for d in (0, 3, 45, 180, 364)
+             for h in (0, 5, 6, 12, 19, 20, 23) for m in (0, 35)]
+    times += [datetime(first_year, m, 28, 13) + timedelta(days=d) for m in (2, 7, 12) for d in range(4)]
+    return [t for t in times if t.year == first_year]
+
+def test_table_lookups_equal_model_predictions(tables):
+    times = _timestamps(tables)
+    assert forecasting.get_forecast_table_info()["in_use"]
+
+    expected = forecasting._predict_uncached(times)
+    for got, want in zip(make_predictions_for_times(times), expected):
+        np.testing.assert_array_equal(got, want)
+    for dt, want in zip(times, zip(*expected)):
+        got = tuple(float(v) for v in make_predictions_for_time(dt))
+        assert got == tuple(float(v) for v in want) == tuple(float(v) for v in forecasting._predict_one(dt))
+
+def test_rows_outside_the_tables_fall_back_to_the_models(tables):
+    times = [datetime(tables + 1, 6, 1, 12), datetime(tables, 6, 1, 12), datetime(tables - 1, 6, 1, 3)]
+    for got, want in zip(make_predictions_for_times(times), forecasting._predict_uncached(times)):
+        np.testing.assert_array_equal(got, want)
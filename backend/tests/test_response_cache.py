@@ -0,0 +1,56 @@
+# backend/tests/test_response_cache.py
+
+import threading
+import time
+
+import pytest
+
+import response_cache
+from response_cache import cached_response, etag_matches, dumps_json, make_etag
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    response_cache.clear_response_cache()
+    yield
+    response_cache.clear_response_cache()
+
+@pytest.mark.parametrize("header, matches", [
+    (None, False),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"xyz", W/"abc"', True),
+    ("*", True),
+    ('"xyz"', False),
+])
+def test_etag_matches(header, matches):
+    assert etag_matches(header, '"abc"') is matches
+
+def test_concurrent_misses_render_once():
+    calls = []
+
+    def render():
+        calls.append(1)
+        time.sleep(0.05)
+        return dumps_json({"b": 1, "a": [1.5, None]})
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cached_response(("k",), render))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    body = b'{"a":[1.5,null],"b":1}'
+    assert results == [(body, make_etag(body))] * 8
+
+def test_simulate_revalidates_with_304(monkeypatch):
+    monkeypatch.setenv("SYNAPSE_MODEL_WARMUP", "0")
+    from app import app
+    client = app.test_client()
+    first = client.get("/api/simulate?hours=1")
+    assert first.status_code == 200 and first.headers["ETag"]
+    again = client.get("/api/simulate?hours=1", headers={"If-None-Match": first.headers["ETag"]})
+    if again.status_code == 200: # the simulation step rolled over between the requests
+        again = client.get("/api/simulate?hours=1", headers={"If-None-Match": again.headers["ETag"]})
+    assert again.status_code == 304 and again.data == b""
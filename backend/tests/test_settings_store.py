@@ -0,0 +1,53 @@
+# backend/tests/test_settings_store.py
+
+import os
+import json
+
+import pytest
+
+import settings_store
+from settings_store import get_settings, get_settings_version, update_settings, SettingsValidationError, DEFAULT_SETTINGS
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings_store, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(settings_store, "SETTINGS_FILEPATH", str(tmp_path / "settings.json"))
+    monkeypatch.setattr(settings_store, "_settings", None)
+    monkeypatch.setattr(settings_store, "_settings_mtime_ns", None)
+    return tmp_path / "settings.json"
+
+def _read(path):
+    return json.loads(path.read_text())
+
+def test_missing_file_is_created_with_defaults(store):
+    assert get_settings() == DEFAULT_SETTINGS
+    assert _read(store) == DEFAULT_SETTINGS
+
+def test_updates_write_through(store):
+    get_settings()
+    version = get_settings_version()
+    settings, updated = update_settings({"solar_capacity_kw": "7.5"})
+    assert updated and settings["solar_capacity_kw"] == 7.5
+    assert _read(store)["solar_capacity_kw"] == 7.5
+    assert get_settings_version() == version + 1
+
+    update_settings({"solar_capacity_kw": 7.5}) # unchanged: nothing written
+    assert get_settings_version() == version + 1
+    assert [p.name for p in store.parent.iterdir()] == ["settings.json"] # no temp files left
+
+def test_invalid_update_applies_nothing(store):
+    get_settings()
+    with pytest.raises(SettingsValidationError):
+        update_settings({"solar_capacity_kw": 9.0, "battery_round_trip_efficiency": 2.0})
+    assert get_settings()["solar_capacity_kw"] == DEFAULT_SETTINGS["solar_capacity_kw"]
+    assert _read(store) == DEFAULT_SETTINGS
+
+def test_hand_edits_are_picked_up(store):
+    get_settings()
+    version = get_settings_version()
+    store.write_text(json.dumps(dict(DEFAULT_SETTINGS, wind_capacity_kw=4.0)))
+    stat = os.stat(store)
+    os.utime(store, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000)) # a distinct mtime
+    assert get_settings()["wind_capacity_kw"] == 4.0
+    assert get_settings_version() == version + 1
@@ -0,0 +1,74 @@
+# backend/tests/test_telemetry.py
+
+import os
+import time
+
+import pytest
+
+import telemetry
+from telemetry import ingest_samples, latest_readings, MAX_CLOCK_SKEW_SECONDS
+
+
+@pytest.fixture(autouse=True)
+def fresh_series(monkeypatch):
+    monkeypatch.setattr(telemetry, "_series", {signal: telemetry._new_series() for signal in telemetry.SIGNALS})
+
+
+@pytest.mark.parametrize("timestamp", [
+    time.time() * 1000,                          # epoch milliseconds sent as seconds
+    time.time() + MAX_CLOCK_SKEW_SECONDS + 3600,
+    "2999-01-01T00:00:00",
+    float("nan"),
+    float("inf"),
+    10 ** 400,
+])
+def test_rejects_bad_timestamps(timestamp):
+    with pytest.raises(ValueError):
+        ingest_samples([{"timestamp": timestamp, "solar": 1.0}])
+    assert latest_readings(max_age_seconds=None) == {}
+
+@pytest.mark.parametrize("value", [float("nan"), float("inf"), float("-inf"), 10 ** 400, True, "1.0"])
+def test_rejects_non_finite_values(value):
+    with pytest.raises(ValueError):
+        ingest_samples([{"timestamp": time.time(), "solar": value}])
+
+def test_bad_sample_does_not_block_later_samples():
+    now = time.time()
+    with pytest.raises(ValueError):
+        ingest_samples([{"timestamp": now - 2, "solar": 1.0}, {"timestamp": now * 1000, "solar": 9.0}])
+    assert ingest_samples([{"timestamp": now - 1, "solar": 2.0}]) == {"accepted": 1, "dropped_out_of_order": 0}
+    assert latest_readings(now=now)["solar"] == {"timestamp": now - 1, "value": 2.0}
+
+def test_small_clock_skew_is_accepted():
+    now = time.time()
+    assert ingest_samples([{"timestamp": now + MAX_CLOCK_SKEW_SECONDS / 2, "solar": 1.0}])["accepted"] == 1
+
+def test_post_returns_400(monkeypatch):
+    monkeypatch.setenv("SYNAPSE_MODEL_WARMUP", "0")
+    from app import app
+    response = app.test_client().post("/api/telemetry", data='{"timestamp": Infinity, "solar": 1.0}',
+                                      content_type="application/json")
+    assert response.status_code == 400
+    response = app.test_client().post("/api/telemetry", json={"timestamp": time.time() * 1000, "solar": 1.0})
+    assert response.status_code == 400
+
+@pytest.mark.skipif(not hasattr(os, "fork") or telemetry.fcntl is None, reason="needs fork() and flock")
+def test_forked_workers_share_readings(tmp_path, monkeypatch):
+    monkeypatch.setattr(telemetry, "TELEMETRY_DIR", str(tmp_path))
+    monkeypatch.setattr(telemetry, "_series", None)
+    monkeypatch.setattr(telemetry, "_shared_dir", None)
+    assert latest_readings() == {} # opens the ring files before the fork, as the server does
+    now = time.time()
+    for w in range(3):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                ok = ingest_samples([{"timestamp": now - 10 + w, "solar": float(w)}])["accepted"] == 1
+            finally:
+                os._exit(0 if ok else 1)
+        assert os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1]) == 0
+    # A worker started later maps the same files
+    monkeypatch.setattr(telemetry, "_series", None)
+    assert latest_readings(now=now)["solar"] == {"timestamp": now - 8, "value": 2.0}
+    stats = telemetry.get_telemetry_stats()
+    assert stats["accepted"] == 3 and stats["stored"]["solar"]["raw"] == 3
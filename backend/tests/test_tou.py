@@ -0,0 +1,49 @@
+# backend/tests/test_tou.py
+
+import os
+import json
+
+import pytest
+
+import utils
+from utils import get_current_tou_prices, get_tou_version
+
+
+def _tiers(rate):
+    return [{"name": "Flat", "rate_per_kwh": rate, "start_hour": 0, "end_hour": 24}]
+
+@pytest.fixture
+def tariff(tmp_path, monkeypatch):
+    path = tmp_path / "tou_pricing.json"
+    monkeypatch.setattr(utils, "TOU_PRICING_FILEPATH", str(path))
+    for name in ("_tou_prices_cache", "_tou_table", "_tou_mtime_ns", "_tou_failed_mtime_ns"):
+        monkeypatch.setattr(utils, name, None)
+    versions = iter(range(1, 100))
+
+    def write(content):
+        path.write_text(content if isinstance(content, str) else json.dumps(content))
+        # Distinct mtimes even when writes land within the filesystem's timestamp granularity
+        stamp = next(versions) * 1_000_000_000
+        os.utime(path, ns=(stamp, stamp))
+    return write
+
+def test_invalid_tariff_falls_back_to_zero_prices(tariff, capsys):
+    tariff({"buying_prices": [], "selling_prices": _tiers(0.05)}) # no buying tiers
+    for _ in range(3):
+        assert get_current_tou_prices(12) == {"buying_price_per_kwh": 0.0, "selling_price_per_kwh": 0.0}
+    assert capsys.readouterr().out.count("invalid tou_pricing.json") == 1
+
+def test_invalid_edit_keeps_previous_tariff_until_fixed(tariff, capsys):
+    tariff({"buying_prices": _tiers(0.2), "selling_prices": _tiers(0.05)})
+    assert get_current_tou_prices(12)["buying_price_per_kwh"] == 0.2
+    version = get_tou_version()
+
+    tariff('{"buying_prices": [') # caught mid-write
+    for _ in range(3):
+        assert get_current_tou_prices(12)["buying_price_per_kwh"] == 0.2
+    assert get_tou_version() == version
+    assert capsys.readouterr().out.count("keeping the previous tariff") == 1
+
+    tariff({"buying_prices": _tiers(0.3), "selling_prices": _tiers(0.05)})
+    assert get_current_tou_prices(12)["buying_price_per_kwh"] == 0.3
+    assert get_tou_version() == version + 1
@@ -0,0 +1,477 @@
+# backend/train_models.py
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import statistics
+from datetime import datetime
+
+import numpy as np
+
+from forecasting import MODEL_DIR, MODEL_FILES, FEATURES
+from history_store import history_range
+from batch_simulation import imap_shared_forecast
+from backtest import (build_backtest_inputs, DEFAULT_DAILY_DEMAND_KWH, SOLAR_KWH_PER_KW_BEST_DAY,
+                      MAX_WIND_CAPACITY_FACTOR, REFERENCE_PERCENTILE, SOLAR_PROFILE, WIND_PROFILE, DEMAND_PROFILE)
+
+# Training data: renewable_power_data.csv turned into hourly per-kW solar/wind
+# output and household demand the same way backtest.py does, so the models
+# predict exactly what the simulations multiply by the installed capacity.
+TARGETS = {"solar": "solar_per_kw", "wind": "wind_per_kw", "demand": "demand_kwh"}
+
+# Hourly frames are cached per calendar year (the scaling is normalized per
+# year, so a year's frame only depends on that year's rows). Appending rows
+# rebuilds the last year's frame only. Bump when the frame layout changes.
+FEATURE_CACHE_FORMAT = 1
+
+DEFAULT_TREES = 100
+DEFAULT_MIN_SAMPLES_LEAF = 20 # keeps each forest around 15 MB instead of ~170 MB
+DEFAULT_SEED = 42
+# Trees fitted on the updated frames when rows were appended; the existing
+# trees are kept. Once a forest reaches MAX_TREES_FACTOR x --trees the next
+# run retrains it from scratch.
+DEFAULT_INCREMENTAL_TREES = 20
+MAX_TREES_FACTOR = 2
+# Every HOLDOUT_EVERY-th day (by date, so appends never move rows between the
+# sets) is left out of training and scored in the report
+HOLDOUT_EVERY = 5
+
+# Each version keeps its models as compressed joblib archives; the active
+# version is installed into MODEL_DIR uncompressed, which is what lets
+# forecasting memory-map the tree arrays instead of reading them in.
+ARCHIVE_COMPRESS = ('zlib', 3)
+ARCHIVE_SUFFIX = '.z'
+
+# Inference-latency report: batch sizes (rows) and repeats per batch
+LATENCY_BATCHES = {"1": 200, "24": 100, "8760": 5}
+
+
+def versions_dir(model_dir=MODEL_DIR):
+    return os.path.join(model_dir, 'versions')
+
+def feature_cache_dir(model_dir=MODEL_DIR):
+    return os.path.join(model_dir, 'training_cache')
+
+def _write_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# --- Feature frames ---
+
+def _scaling_params(daily_demand_kwh):
+    return {
+        "format": FEATURE_CACHE_FORMAT,
+        "daily_demand_kwh": daily_demand_kwh,
+        "solar_kwh_per_kw_best_day": SOLAR_KWH_PER_KW_BEST_DAY,
+        "max_wind_capacity_factor": MAX_WIND_CAPACITY_FACTOR,
+        "reference_percentile": REFERENCE_PERCENTILE,
+        "profiles": [p.tolist() for p in (SOLAR_PROFILE, WIND_PROFILE, DEMAND_PROFILE)],
+    }
+
+def _year_digest(dates, values, valid, scaling):
+    h = hashlib.sha256(json.dumps(scaling, sort_keys=True).encode())
+    for array in (dates, values, valid):
+        h.update(np.ascontiguousarray(array).tobytes())
+    return h.hexdigest()
+
+def build_year_frame(year, daily_demand_kwh=DEFAULT_DAILY_DEMAND_KWH):
+    """
+    Hourly training rows for one calendar year.
+    Returns:
+        dict: "features" (n, len(FEATURES)) in FEATURES order, one target
+        array per model and "day" (days since epoch, for the holdout split).
+    """
+    inputs = build_backtest_inputs(f"{year}-01-01", f"{year}-12-31", daily_demand_kwh)
+    days = inputs["days"].astype('datetime64[D]')
+    hours = (days.astype('datetime64[h]')[:, None] + np.arange(24)).ravel()
+    day = hours.astype('datetime64[D]')
+    features = np.column_stack([
+        (hours - day).astype(int),                                     # hour
+        (day.astype(int) + 3) % 7,                                     # dayofweek (Monday=0; 1970-01-01 was a Thursday)
+        day.astype('datetime64[M]').astype(int) % 12 + 1,              # month
+        day.astype('datetime64[Y]').astype(int) + 1970,                # year
+    ]).astype(np.int16)
+    frame = {name: np.asarray(inputs[key], dtype=float) for name, key in TARGETS.items()}
+    frame.update(features=features, day=day.astype(np.int32))
+    return frame
+
+def load_feature_frames(model_dir=MODEL_DIR, daily_demand_kwh=DEFAULT_DAILY_DEMAND_KWH, refresh=False):
+    """
+    Hourly frames for every year in the history, read from the per-year cache
+    where the year's rows are unchanged and rebuilt (and cached) otherwise.
+    Args:
+        refresh (bool): Rebuild every year, ignoring the cache.
+    Returns:
+        tuple: (frame, info) where frame concatenates the years and info has
+        the per-year digests and cache hits.
+    """
+    started = time.perf_counter()
+    cache_dir = feature_cache_dir(model_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    scaling = _scaling_params(daily_demand_kwh)
+
+    dates, values, valid = history_range()
+    years = np.asarray(dates).astype('datetime64[Y]').astype(int) + 1970
+    frames, digests, cached, built = [], {}, [], []
+    for year in np.unique(years):
+        year = int(year)
+        in_year = years == year
+        digest = _year_digest(dates[in_year], values[in_year], valid[in_year], scaling)
+        digests[str(year)] = digest
+        path = os.path.join(cache_dir, f"frame_{year}_{digest[:16]}.npz")
+        frame = None
+        if not refresh and os.path.exists(path):
+            try:
+                with np.load(path) as data:
+                    frame = {name: data[name] for name in data.files}
+                cached.append(year)
+            except (OSError, ValueError) as e:
+                print(f"Could not read feature cache {path}: {e}")
+        if frame is None:
+            frame = build_year_frame(year, daily_demand_kwh)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **frame)
+            os.replace(tmp_path, path)
+            built.append(year)
+            # Frames of this year built from older rows are no longer needed
+            for name in os.listdir(cache_dir):
+                if name.startswith(f"frame_{year}_") and name != os.path.basename(path):
+                    os.remove(os.path.join(cache_dir, name))
+        frames.append(frame)
+
+    frame = {key: np.concatenate([f[key] for f in frames]) for key in frames[0]} if frames else {}
+    rows = len(frame.get("day", ()))
+    first_last = frame["day"][[0, -1]].astype('datetime64[D]') if rows else (None, None)
+    info = {
+        "start": str(first_last[0]) if rows else None,
+        "end": str(first_last[1]) if rows else None,
+        "rows": rows,
+        "days": rows // 24,
+        "year_digests": digests,
+        "digest": hashlib.sha256("".join(digests.values()).encode()).hexdigest(),
+        "cached_years": cached,
+        "built_years": built,
+        "seconds": round(time.perf_counter() - started, 4),
+    }
+    return frame, info
+
+
+# --- Training ---
+
+def _frame_to_dataframe(features):
+    import pandas as pd
+    return pd.DataFrame(features, columns=FEATURES)
+
+def _fit_model(shared, task):
+    """
+    Fits (or grows) one model and writes its compressed archive (a pool task).
+    Returns:
+        dict: Per-model training report.
+    """
+    import joblib
+    from sklearn.ensemble import RandomForestRegressor
+
+    name = task["name"]
+    frame = shared["frame"]
+    holdout = frame["day"] % HOLDOUT_EVERY == 0
+    X = _frame_to_dataframe(frame["features"])
+    y = frame[name]
+
+    if task["parent_archive"]:
+        model = joblib.load(task["parent_archive"])
+        previous_trees = model.n_estimators
+        model.set_params(warm_start=True, n_estimators=previous_trees + task["add_trees"], n_jobs=task["n_jobs"])
+    else:
+        previous_trees = 0
+        model = RandomForestRegressor(n_estimators=task["trees"], min_samples_leaf=task["min_samples_leaf"],
+                                      random_state=task["seed"], n_jobs=task["n_jobs"])
+    started = time.perf_counter()
+    model.fit(X[~holdout], y[~holdout])
+    fit_seconds = time.perf_counter() - started
+    # Archived models must not carry the training-time settings into serving
+    model.set_params(warm_start=False, n_jobs=None)
+
+    error = model.predict(X[holdout]) - y[holdout] if holdout.any() else np.zeros(0)
+    path = os.path.join(task["version_dir"], MODEL_FILES[name] + ARCHIVE_SUFFIX)
+    joblib.dump(model, path, compress=ARCHIVE_COMPRESS)
+    return {
+        "name": name,
+        "trees": model.n_estimators,
+        "added_trees": model.n_estimators - previous_trees,
+        "fit_seconds": round(fit_seconds, 3),
+        "train_rows": int((~holdout).sum()),
+        "holdout_rows": int(holdout.sum()),
+        "holdout_mae": round(float(np.abs(error).mean()), 5) if len(error) else None,
+        "holdout_rmse": round(float(np.sqrt((error ** 2).mean())), 5) if len(error) else None,
+        "archive_bytes": os.path.getsize(path),
+    }
+
+def _can_grow(parent, params, data, trees, add_trees):
+    """
+    Whether the parent version's forests can be grown instead of retrained:
+    same training parameters, rows only appended since, and room for more trees.
+    """
+    if parent is None or parent["params"] != params:
+        return False
+    old, new = parent["data"]["year_digests"], data["year_digests"]
+    years = sorted(old)
+    if not years or years[-1] not in new or any(old[y] != new.get(y) for y in years[:-1]):
+        return False # earlier rows changed (or were dropped): not an append
+    return max(parent["models"][name]["trees"] for name in TARGETS) + add_trees <= trees * MAX_TREES_FACTOR
+
+def train_models(model_dir=MODEL_DIR, trees=DEFAULT_TREES, incremental_trees=DEFAULT_INCREMENTAL_TREES,
+                 min_samples_leaf=DEFAULT_MIN_SAMPLES_LEAF, seed=DEFAULT_SEED,
+                 daily_demand_kwh=DEFAULT_DAILY_DEMAND_KWH, full=False, refresh_features=False,
+                 install=True, workers=None):
+    """
+    Trains the solar, wind and demand models, one per pool worker, into a new
+    version under models/versions/ and (optionally) installs it for serving.
+    When the active version was trained on the same parameters and rows were
+    only appended since, its forests are grown by incremental_trees trees
+    fitted on the updated data instead of being retrained.
+    Args:
+        full (bool): Retrain from scratch even if the forests could be grown.
+        refresh_features (bool): Rebuild the cached feature frames.
+        install (bool): Make the new version the one the backend serves.
+        workers (int): Pool size (at most 3); defaults to the CPU count.
+    Returns:
+        dict: The version manifest (data, parameters, training and
+        inference-latency reports). "mode" is "unchanged" and nothing is
+        trained when the data and parameters match the active version.
+    Raises:
+        ValueError: On invalid parameters or an empty history.
+    """
+    if trees < 1 or incremental_trees < 1 or min_samples_leaf < 1:
+        raise ValueError("trees, incremental_trees and min_samples_leaf must be positive")
+    if daily_demand_kwh <= 0:
+        raise ValueError("daily_demand_kwh must be positive")
+    started = time.perf_counter()
+    frame, data = load_feature_frames(model_dir, daily_demand_kwh, refresh_features)
+    if not data["rows"]:
+        raise ValueError("renewable_power_data.csv has no days with solar, wind and consumption")
+
+    params = {"trees": trees, "min_samples_leaf": min_samples_leaf, "seed": seed, "daily_demand_kwh": daily_demand_kwh,
+              "feature_format": FEATURE_CACHE_FORMAT, "holdout_every": HOLDOUT_EVERY}
+    parent = get_active_version(model_dir)
+    if (not full and parent is not None and parent["params"] == params
+            and parent["data"]["digest"] == data["digest"]):
+        return dict(parent, mode="unchanged")
+    grow = not full and _can_grow(parent, params, data, trees, incremental_trees)
+
+    created = datetime.now()
+    version = f"{created:%Y%m%dT%H%M%S}-{data['digest'][:8]}"
+    version_dir = os.path.join(versions_dir(model_dir), version)
+    os.makedirs(version_dir)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(TARGETS)))
+    tasks = [{
+        "name": name,
+        "version_dir": version_dir,
+        "parent_archive": os.path.join(versions_dir(model_dir), parent["version"], MODEL_FILES[name] + ARCHIVE_SUFFIX)
+                          if grow else None,
+        "trees": trees,
+        "add_trees": incremental_trees,
+        "min_samples_leaf": min_samples_leaf,
+        "seed": seed,
+        # The cores left over once each model has a worker go to tree-level parallelism
+        "n_jobs": max(1, (os.cpu_count() or 1) // workers),
+    } for name in TARGETS]
+
+    training_started = time.perf_counter()
+    try:
+        models = {result["name"]: result for result in imap_shared_forecast(_fit_model, tasks, {"frame": frame},
+                                                                             workers)}
+    except BaseException:
+        shutil.rmtree(version_dir, ignore_errors=True)
+        raise
+
+    manifest = {
+        "version": version,
+        "created_at": created.isoformat(timespec="seconds"),
+        "mode": "incremental" if grow else "full",
+        "parent": parent["version"] if parent is not None else None,
+        "params": params,
+        "data": {key: data[key] for key in ("start", "end", "rows", "days", "year_digests", "digest")},
+        "models": {name: models[name] for name in TARGETS},
+        "training": {
+            "workers": workers,
+            "feature_seconds": data["seconds"],
+            "cached_years": data["cached_years"],
+            "built_years": data["built_years"],
+            "fit_wall_seconds": round(time.perf_counter() - training_started, 3),
+            "total_seconds": None,
+        },
+        "inference": None,
+    }
+    _write_json(os.path.join(version_dir, 'manifest.json'), manifest)
+    if install:
+        activate_version(version, model_dir)
+        manifest["inference"] = measure_inference_latency(model_dir)
+    manifest["training"]["total_seconds"] = round(time.perf_counter() - started, 3)
+    _write_json(os.path.join(version_dir, 'manifest.json'), manifest)
+    return manifest
+
+
+# --- Versions ---
+
+def list_versions(model_dir=MODEL_DIR):
+    """Manifests of every trained version, oldest first."""
+    root = versions_dir(model_dir)
+    if not os.path.isdir(root):
+        return []
+    manifests = (_read_json(os.path.join(root, name, 'manifest.json')) for name in sorted(os.listdir(root)))
+    return [m for m in manifests if m is not None]
+
+def get_active_version(model_dir=MODEL_DIR):
+    """Manifest of the installed version, or None."""
+    current = _read_json(os.path.join(versions_dir(model_dir), 'current.json'))
+    if current is None:
+        return None
+    return _read_json(os.path.join(versions_dir(model_dir), current["version"], 'manifest.json'))
+
+def activate_version(version, model_dir=MODEL_DIR):
+    """
+    Installs a version's models into model_dir, uncompressed so forecasting
+    can memory-map them. Each file is swapped in atomically; a running
+    backend picks the new files up on its next model-file check (or on
+    POST /api/models/reload).
+    Raises:
+        ValueError: If the version does not exist.
+    """
+    import joblib
+    version_dir = os.path.join(versions_dir(model_dir), version)
+    if _read_json(os.path.join(version_dir, 'manifest.json')) is None:
+        raise ValueError(f"Unknown model version: {version}")
+    models = {name: joblib.load(os.path.join(version_dir, filename + ARCHIVE_SUFFIX))
+              for name, filename in MODEL_FILES.items()}
+    for name, filename in MODEL_FILES.items():
+        path = os.path.join(model_dir, filename)
+        joblib.dump(models[name], path + ".tmp", compress=0)
+        os.replace(path + ".tmp", path)
+    _write_json(os.path.join(versions_dir(model_dir), 'current.json'),
+                {"version": version, "activated_at": datetime.now().isoformat(timespec="seconds")})
+
+
+# --- Reports ---
+
+def measure_inference_latency(model_dir=MODEL_DIR):
+    """
+    Loads each installed model the way forecasting does (memory-mapped) and
+    times predict() on 1, 24 and 8760-row batches of this year's features.
+    Returns:
+        dict: Per model: load seconds and median predict milliseconds per batch size.
+    """
+    import joblib
+    year = datetime.now().year
+    hours = np.arange(f"{year}-01-01T00", f"{year + 1}-01-01T00", dtype='datetime64[h]')[:8760]
+    day = hours.astype('datetime64[D]')
+    features = _frame_to_dataframe(np.column_stack([
+        (hours - day).astype(int), (day.astype(int) + 3) % 7,
+        day.astype('datetime64[M]').astype(int) % 12 + 1, np.full(len(hours), year)]))
+
+    report = {}
+    for name, filename in MODEL_FILES.items():
+        started = time.perf_counter()
+        model = joblib.load(os.path.join(model_dir, filename), mmap_mode='r')
+        entry = {"load_seconds": round(time.perf_counter() - started, 4)}
+        for rows, repeats in LATENCY_BATCHES.items():
+            batch = features.iloc[:int(rows)]
+            samples = []
+            for _ in range(repeats):
+                started = time.perf_counter()
+                model.predict(batch)
+                samples.append(time.perf_counter() - started)
+            entry[f"predict_{rows}_ms"] = round(statistics.median(samples) * 1000, 3)
+        report[name] = entry
+    return report
+
+def print_report(manifest):
+    data, training = manifest["data"], manifest["training"]
+    print(f"Version {manifest['version']} ({manifest['mode']}"
+          + (f", from {manifest['parent']}" if manifest["parent"] else "") + ")")
+    print(f"Data {data['start']} .. {data['end']}: {data['rows']} hourly rows ({data['days']} days)")
+    print(f"Features {training['feature_seconds']}s (cached years: {len(training['cached_years'])}, "
+          f"built: {len(training['built_years'])}); fit {training['fit_wall_seconds']}s wall on "
+          f"{training['workers']} worker(s); total {training['total_seconds']}s")
+    header = f"{'model':<8}{'trees':>7}{'added':>7}{'fit s':>9}{'MAE':>10}{'RMSE':>10}{'archive MB':>12}"
+    print(header)
+    print("-" * len(header))
+    for name, m in manifest["models"].items():
+        print(f"{name:<8}{m['trees']:>7}{m['added_trees']:>7}{m['fit_seconds']:>9.2f}{m['holdout_mae']:>10.4f}"
+              f"{m['holdout_rmse']:>10.4f}{m['archive_bytes'] / 1e6:>12.2f}")
+    if manifest["inference"]:
+        batches = [f"predict_{rows}_ms" for rows in LATENCY_BATCHES]
+        header = f"{'model':<8}{'load s':>9}" + "".join(f"{b:>18}" for b in batches)
+        print(header)
+        print("-" * len(header))
+        for name, m in manifest["inference"].items():
+            print(f"{name:<8}{m['load_seconds']:>9.4f}" + "".join(f"{m[b]:>18.3f}" for b in batches))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the solar, wind and demand models from renewable_power_data.csv.")
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    parser.add_argument("--trees", type=int, default=DEFAULT_TREES)
+    parser.add_argument("--incremental-trees", type=int, default=DEFAULT_INCREMENTAL_TREES,
+                        help="Trees added per model when rows were appended")
+    parser.add_argument("--min-samples-leaf", type=int, default=DEFAULT_MIN_SAMPLES_LEAF)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--daily-demand", type=float, default=DEFAULT_DAILY_DEMAND_KWH)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--full", action="store_true", help="Retrain from scratch")
+    parser.add_argument("--refresh-features", action="store_true", help="Rebuild the cached feature frames")
+    parser.add_argument("--no-install", action="store_true", help="Train a version without serving it")
+    parser.add_argument("--activate", metavar="VERSION", help="Install an existing version and exit")
+    parser.add_argument("--list", action="store_true", help="List trained versions and exit")
+    parser.add_argument("--json", action="store_true", help="Print the manifest as JSON")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        active = get_active_version(args.model_dir)
+        for m in list_versions(args.model_dir):
+            marker = "*" if active is not None and m["version"] == active["version"] else " "
+            print(f"{marker} {m['version']}  {m['mode']:<12}{m['data']['end']}  "
+                  f"trees {', '.join(str(m['models'][name]['trees']) for name in TARGETS)}")
+        return 0
+    if args.activate:
+        try:
+            activate_version(args.activate, args.model_dir)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"Activated {args.activate}")
+        return 0
+
+    try:
+        manifest = train_models(args.model_dir, args.trees, args.incremental_trees, args.min_samples_leaf,
+                                args.seed, args.daily_demand, full=args.full,
+                                refresh_features=args.refresh_features, install=not args.no_install,
+                                workers=args.workers)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.json:
+        json.dump(manifest, sys.stdout, indent=2)
+        print()
+    elif manifest["mode"] == "unchanged":
+        print(f"Version {manifest['version']} is up to date; nothing to train (use --full to retrain)")
+    else:
+        print_report(manifest)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
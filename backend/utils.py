@@ -1,49 +1,188 @@
 import json
 import os
+import threading
 
-# Cache for TOU pricing to avoid reading file on every request
+import numpy as np
+
+TOU_PRICING_FILEPATH = os.path.join(os.path.dirname(__file__), 'data', 'tou_pricing.json')
+
+# Finest supported tier granularity is one minute
+_SLOT_RESOLUTIONS = (1, 2, 3, 4, 6, 12, 60)
+
+# Cache for TOU pricing to avoid reading file on every request.
+# Refreshed whenever tou_pricing.json's mtime changes.
 _tou_prices_cache = None
+_tou_table = None
+_tou_mtime_ns = None
+_tou_failed_mtime_ns = None # version of the file last rejected as invalid
+_tou_version = 0
+_tou_lock = threading.Lock()
 
-def load_tou_prices():
-    global _tou_prices_cache
-    if _tou_prices_cache is None:
-        script_dir = os.path.dirname(__file__) # Get current directory of utils.py
-        file_path = os.path.join(script_dir, 'data', 'tou_pricing.json')
+
+def validate_tou_tiers(tiers, name):
+    """
+    Checks that a tier list covers [0, 24) hours exactly once.
+    Args:
+        tiers (list[dict]): Tiers with start_hour, end_hour and rate_per_kwh.
+        name (str): List name, used in error messages.
+    Raises:
+        ValueError: On malformed tiers, gaps or overlaps.
+    """
+    spans = []
+    for tier in tiers:
+        try:
+            start, end, rate = float(tier['start_hour']), float(tier['end_hour']), float(tier['rate_per_kwh'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"{name}: every tier needs numeric start_hour, end_hour and rate_per_kwh")
+        if not 0 <= start < end <= 24:
+            raise ValueError(f"{name}: tier {tier.get('name', '')!r} has invalid hours {start}-{end}")
+        if rate < 0:
+            raise ValueError(f"{name}: tier {tier.get('name', '')!r} has a negative rate")
+        spans.append((start, end))
+
+    covered_until = 0.0
+    for start, end in sorted(spans):
+        if start > covered_until:
+            raise ValueError(f"{name}: no tier covers hours {covered_until}-{start}")
+        if start < covered_until:
+            raise ValueError(f"{name}: tiers overlap at hour {start}")
+        covered_until = end
+    if covered_until < 24:
+        raise ValueError(f"{name}: no tier covers hours {covered_until}-24")
+
+def _slots_per_hour(tier_lists):
+    boundaries = [float(tier[key]) for tiers in tier_lists for tier in tiers for key in ('start_hour', 'end_hour')]
+    for slots in _SLOT_RESOLUTIONS:
+        if all(abs(b * slots - round(b * slots)) < 1e-9 for b in boundaries):
+            return slots
+    raise ValueError("Tier boundaries must fall on whole minutes")
+
+def _build_price_table(tou_data):
+    """Precomputes per-slot buying/selling prices for a whole day."""
+    buying_tiers = tou_data.get('buying_prices', [])
+    selling_tiers = tou_data.get('selling_prices', [])
+    slots = _slots_per_hour([buying_tiers, selling_tiers])
+
+    def fill(tiers):
+        prices = np.zeros(24 * slots)
+        for tier in tiers:
+            prices[round(tier['start_hour'] * slots):round(tier['end_hour'] * slots)] = tier['rate_per_kwh']
+        prices.setflags(write=False)
+        return prices
+
+    return {"slots_per_hour": slots, "buying": fill(buying_tiers), "selling": fill(selling_tiers)}
+
+def _refresh_tou_prices():
+    global _tou_prices_cache, _tou_table, _tou_mtime_ns, _tou_failed_mtime_ns, _tou_version
+    try:
+        mtime_ns = os.stat(TOU_PRICING_FILEPATH).st_mtime_ns
+    except FileNotFoundError:
+        mtime_ns = None
+    if _tou_table is not None and mtime_ns in (_tou_mtime_ns, _tou_failed_mtime_ns):
+        return
+
+    with _tou_lock:
+        if _tou_table is not None and mtime_ns in (_tou_mtime_ns, _tou_failed_mtime_ns):
+            return
         try:
-            with open(file_path, 'r') as f:
-                _tou_prices_cache = json.load(f)
+            with open(TOU_PRICING_FILEPATH, 'r') as f:
+                tou_data = json.load(f)
+            validate_tou_tiers(tou_data.get('buying_prices', []), 'buying_prices')
+            validate_tou_tiers(tou_data.get('selling_prices', []), 'selling_prices')
+            table = _build_price_table(tou_data)
         except FileNotFoundError:
-            print(f"Error: tou_pricing.json not found at {file_path}")
-            _tou_prices_cache = {"buying_prices": [], "selling_prices": []} # Return empty to prevent crashes
+            print(f"Error: tou_pricing.json not found at {TOU_PRICING_FILEPATH}")
+            tou_data = {"buying_prices": [], "selling_prices": []} # Return empty to prevent crashes
+            table = _build_price_table(tou_data)
+        except (ValueError, TypeError) as e:
+            # Each bad version of the file is parsed and reported once; the
+            # next write (e.g. the rest of a file caught mid-write) changes
+            # the mtime and is read again
+            _tou_failed_mtime_ns = mtime_ns
+            if _tou_table is not None:
+                print(f"Error: invalid tou_pricing.json, keeping the previous tariff: {e}")
+                return
+            print(f"Error: invalid tou_pricing.json, prices default to 0: {e}")
+            tou_data = {"buying_prices": [], "selling_prices": []}
+            table = _build_price_table(tou_data)
+
+        _tou_prices_cache = tou_data
+        _tou_table = table
+        _tou_mtime_ns = mtime_ns
+        _tou_version += 1
+
+def load_tou_prices():
+    _refresh_tou_prices()
     return _tou_prices_cache
 
+def get_tou_price_table():
+    """
+    Returns the precomputed daily price table.
+    Returns:
+        dict: {'slots_per_hour': int, 'buying': array, 'selling': array}, where the
+        arrays hold 24 * slots_per_hour read-only prices starting at midnight.
+    """
+    _refresh_tou_prices()
+    return _tou_table
+
+def get_tou_version():
+    """Counter bumped every time a new tariff is loaded."""
+    _refresh_tou_prices()
+    return _tou_version
+
 def get_current_tou_prices(hour):
     """
     Returns the buying and selling price for a given hour based on TOU schedule.
     Args:
-        hour (int): The current hour (0-23).
+        hour (int or float): The current hour (0-23); fractions select sub-hour tiers.
     Returns:
         dict: {'buying_price_per_kwh': float, 'selling_price_per_kwh': float}
     """
-    tou_data = load_tou_prices()
+    table = get_tou_price_table()
 
     buying_price = 0.0
-    for tier in tou_data.get('buying_prices', []):
-        if tier['start_hour'] <= hour < tier['end_hour']:
-            buying_price = tier['rate_per_kwh']
-            break
-
     selling_price = 0.0
-    for tier in tou_data.get('selling_prices', []):
-        if tier['start_hour'] <= hour < tier['end_hour']:
-            selling_price = tier['rate_per_kwh']
-            break
+    if 0 <= hour < 24:
+        slot = int(hour * table['slots_per_hour'])
+        buying_price = float(table['buying'][slot])
+        selling_price = float(table['selling'][slot])
 
     return {
         'buying_price_per_kwh': buying_price,
         'selling_price_per_kwh': selling_price
     }
 
+def get_tou_price_arrays(hours):
+    """
+    Returns buying and selling prices for a sequence of hours by indexing the
+    precomputed table.
+    Args:
+        hours (array-like of int or float): Hour of day (0-24) for each step.
+    Returns:
+        tuple: (buying_prices, selling_prices) float arrays, one value per step.
+    """
+    table = get_tou_price_table()
+    slots = np.floor(np.asarray(hours, dtype=float) * table['slots_per_hour']).astype(int)
+    in_day = (slots >= 0) & (slots < len(table['buying']))
+    slots = np.where(in_day, slots, 0)
+    buying = np.where(in_day, table['buying'][slots], 0.0)
+    selling = np.where(in_day, table['selling'][slots], 0.0)
+    return buying, selling
+
+def step_hour(dt, timestep_minutes=60):
+    """
+    Hour of day a step starting at dt is priced at: its hour for hourly steps,
+    its fractional hour for shorter ones (so they pick up sub-hour tariff slots).
+    """
+    return dt.hour if timestep_minutes >= 60 else dt.hour + dt.minute / 60
+
+def get_step_price_arrays(times, timestep_minutes=60):
+    """
+    Returns buying and selling prices for the simulation steps starting at
+    `times` (see step_hour()).
+    """
+    return get_tou_price_arrays([step_hour(dt, timestep_minutes) for dt in times])
+
 # Example of how to use it (can be removed later or placed in a test)
 if __name__ == "__main__":
     print(f"Price at 1 AM: {get_current_tou_prices(1)}")
@@ -60,11 +60,13 @@ function Analytics() {
         return <div className="analytics-page error-message">{error}</div>;
     }
 
-    if (!simulationData || !simulationData.hourly_results) {
+    if (!simulationData || !simulationData.step_results) {
         return <div className="analytics-page">No simulation data available.</div>;
     }
 
-    const labels = simulationData.hourly_results.map(h => `${h.hour}:00`);
+    // One entry per simulation step (simulationData.timestep_minutes long), labelled HH:MM
+    const steps = simulationData.step_results;
+    const labels = steps.map(s => s.step_label);
     
     // --- Chart Data Preparation ---
 
@@ -73,7 +75,7 @@ function Analytics() {
         datasets: [
             {
                 label: 'Predicted Solar (kWh)',
-                data: simulationData.hourly_results.map(h => h.predicted_solar_kwh),
+                data: steps.map(s => s.predicted_solar_kwh),
                 borderColor: 'rgba(255, 206, 86, 1)',
                 backgroundColor: 'rgba(255, 206, 86, 0.2)',
                 fill: true,
@@ -81,7 +83,7 @@ function Analytics() {
             },
             {
                 label: 'Predicted Wind (kWh)',
-                data: simulationData.hourly_results.map(h => h.predicted_wind_kwh),
+                data: steps.map(s => s.predicted_wind_kwh),
                 borderColor: 'rgba(54, 162, 235, 1)',
                 backgroundColor: 'rgba(54, 162, 235, 0.2)',
                 fill: true,
@@ -89,7 +91,7 @@ function Analytics() {
             },
             {
                 label: 'Predicted Demand (kWh)',
-                data: simulationData.hourly_results.map(h => h.predicted_demand_kwh),
+                data: steps.map(s => s.predicted_demand_kwh),
                 borderColor: 'rgba(255, 99, 132, 1)',
                 backgroundColor: 'rgba(255, 99, 132, 0.2)',
                 fill: false,
@@ -104,7 +106,7 @@ function Analytics() {
         datasets: [
             {
                 label: 'Simulated Battery Charge (kWh)',
-                data: simulationData.hourly_results.map(h => h.simulated_battery_charge_kwh_end_of_hour),
+                data: steps.map(s => s.simulated_battery_charge_kwh_end_of_step),
                 borderColor: 'rgba(75, 192, 192, 1)',
                 backgroundColor: 'rgba(75, 192, 192, 0.2)',
                 fill: true,
@@ -118,7 +120,7 @@ function Analytics() {
         datasets: [
             {
                 label: 'Grid Import (kWh)',
-                data: simulationData.hourly_results.map(h => h.decision.power_from_grid),
+                data: steps.map(s => s.decision.power_from_grid),
                 borderColor: 'rgba(255, 159, 64, 1)',
                 backgroundColor: 'rgba(255, 159, 64, 0.2)',
                 fill: true,
@@ -126,7 +128,7 @@ function Analytics() {
             },
             {
                 label: 'Grid Export (kWh)',
-                data: simulationData.hourly_results.map(h => h.decision.power_to_grid),
+                data: steps.map(s => s.decision.power_to_grid),
                 borderColor: 'rgba(153, 102, 255, 1)',
                 backgroundColor: 'rgba(153, 102, 255, 0.2)',
                 fill: true,
@@ -139,8 +141,8 @@ function Analytics() {
         labels,
         datasets: [
             {
-                label: 'Hourly Net Cost ($)',
-                data: simulationData.hourly_results.map(h => h.hourly_net_cost),
+                label: 'Net Cost per Step ($)',
+                data: steps.map(s => s.step_net_cost),
                 borderColor: 'rgba(201, 203, 207, 1)',
                 backgroundColor: 'rgba(201, 203, 207, 0.2)',
                 fill: true,
@@ -176,7 +178,7 @@ const chartOptions = {
             x: {
                 title: {
                     display: true,
-                    text: 'Hour of Day',
+                    text: 'Time of Day',
                     color: '#e0e0e0'
                 },
                 ticks: {
@@ -212,7 +214,7 @@ const chartOptions = {
             <h2>Energy Simulation & Analytics</h2>
 
             <div className="simulation-summary">
-                <h3>Simulation Summary ({simulationData.hourly_results[0].decision.current_operating_mode} Mode)</h3>
+                <h3>Simulation Summary ({steps[0].decision.current_operating_mode} Mode)</h3>
                 <p><strong>Total Grid Import:</strong> {simulationData.summary.total_grid_import_kwh} kWh</p>
                 <p><strong>Total Grid Export:</strong> {simulationData.summary.total_grid_export_kwh} kWh</p>
                 <p><strong>Net Grid Cost:</strong> ${simulationData.summary.net_grid_cost.toFixed(2)}</p>
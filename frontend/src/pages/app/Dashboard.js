@@ -10,58 +10,60 @@ function Dashboard() {
     const [error, setError] = useState(null);
 
     useEffect(() => {
-        const fetchStatus = async () => {
-            try {
-                const response = await fetch('http://127.0.0.1:5000/api/status');
-                if (!response.ok) {
-                    throw new Error(`HTTP error! status: ${response.status}`);
-                }
-                const data = await response.json();
+        const applyStatus = (data) => {
+            // --- NEW: Calculate Grid Dependence and Self-Sufficiency here ---
+            if (data && data.live_data && data.kpi) {
+                const total_production = data.live_data.solar + data.live_data.wind;
+                const total_demand = data.live_data.home_demand;
                 
-                // --- NEW: Calculate Grid Dependence and Self-Sufficiency here ---
-                if (data && data.live_data && data.kpi) {
-                    const total_production = data.live_data.solar + data.live_data.wind;
-                    const total_demand = data.live_data.home_demand;
+                let current_grid_dependence = "N/A";
+                let current_self_sufficiency = "N/A";
+
+                if (total_demand > 0) {
+                    // Calculate how much demand is met by own production or battery,
+                    // and how much by grid. This is a simplified instantaneous view.
+                    // Removed: met_by_own, net_to_grid, energy_for_home
+
+                    // If grid import > 0, we have dependence
+                    if (data.decision_engine_output.power_from_grid > 0) {
+                        current_grid_dependence = (data.decision_engine_output.power_from_grid / total_demand) * 100;
+                    } else {
+                        current_grid_dependence = 0; // No import, so 0 dependence
+                    }
                     
-                    let current_grid_dependence = "N/A";
-                    let current_self_sufficiency = "N/A";
-
-                    if (total_demand > 0) {
-                        // Calculate how much demand is met by own production or battery,
-                        // and how much by grid. This is a simplified instantaneous view.
-                        // Removed: met_by_own, net_to_grid, energy_for_home
-
-                        // If grid import > 0, we have dependence
-                        if (data.decision_engine_output.power_from_grid > 0) {
-                            current_grid_dependence = (data.decision_engine_output.power_from_grid / total_demand) * 100;
-                        } else {
-                            current_grid_dependence = 0; // No import, so 0 dependence
-                        }
-                        
-                        // Self-sufficiency: how much of demand is met by own production (solar + wind + battery discharge)
-                        const own_source_to_home = (total_production - (data.decision_engine_output.power_to_battery || 0) - (data.decision_engine_output.power_to_grid || 0)) // own gen that didn't go to batt or grid
-                                                         + (data.decision_engine_output.power_from_battery || 0); // plus battery discharge
-                        
-                        // If home demand is met by own sources (and not from grid)
-                        if (data.decision_engine_output.power_from_grid === 0) { // If not buying from grid
-                            current_self_sufficiency = (own_source_to_home / total_demand) * 100;
-                            if (current_self_sufficiency > 100) current_self_sufficiency = 100; // Cap at 100%
-                        } else {
-                            current_self_sufficiency = ((total_demand - data.decision_engine_output.power_from_grid) / total_demand) * 100;
-                            if (current_self_sufficiency < 0) current_self_sufficiency = 0; // Floor at 0%
-                        }
+                    // Self-sufficiency: how much of demand is met by own production (solar + wind + battery discharge)
+                    const own_source_to_home = (total_production - (data.decision_engine_output.power_to_battery || 0) - (data.decision_engine_output.power_to_grid || 0)) // own gen that didn't go to batt or grid
+                                                     + (data.decision_engine_output.power_from_battery || 0); // plus battery discharge
+                    
+                    // If home demand is met by own sources (and not from grid)
+                    if (data.decision_engine_output.power_from_grid === 0) { // If not buying from grid
+                        current_self_sufficiency = (own_source_to_home / total_demand) * 100;
+                        if (current_self_sufficiency > 100) current_self_sufficiency = 100; // Cap at 100%
                     } else {
-                        current_self_sufficiency = 100; // No demand, so 100% self-sufficient
+                        current_self_sufficiency = ((total_demand - data.decision_engine_output.power_from_grid) / total_demand) * 100;
+                        if (current_self_sufficiency < 0) current_self_sufficiency = 0; // Floor at 0%
                     }
-
-                    // Update the KPI values in the status object
-                    data.kpi.grid_dependence = current_grid_dependence;
-                    data.kpi.self_sufficiency = current_self_sufficiency;
+                } else {
+                    current_self_sufficiency = 100; // No demand, so 100% self-sufficient
                 }
-                // --- END NEW KPI CALCULATION ---
 
-                setStatus(data); // Set status *after* modifying kpi values
-                setLoading(false);
+                // Update the KPI values in the status object
+                data.kpi.grid_dependence = current_grid_dependence;
+                data.kpi.self_sufficiency = current_self_sufficiency;
+            }
+            // --- END NEW KPI CALCULATION ---
+
+            setStatus(data); // Set status *after* modifying kpi values
+            setLoading(false);
+        };
+
+        const fetchStatus = async () => {
+            try {
+                const response = await fetch('http://127.0.0.1:5000/api/status');
+                if (!response.ok) {
+                    throw new Error(`HTTP error! status: ${response.status}`);
+                }
+                applyStatus(await response.json());
             } catch (e) {
                 console.error("Error fetching status:", e);
                 setError("Failed to load dashboard data. Please ensure the backend is running.");
@@ -69,9 +71,82 @@ function Dashboard() {
             }
         };
 
-        fetchStatus();
-        const intervalId = setInterval(fetchStatus, 5000); // Fetch every 5 seconds
-        return () => clearInterval(intervalId); // Cleanup on component unmount
+        // Merges a "delta" event (only the changed fields) into the last snapshot
+        const mergeDelta = (base, delta) => {
+            const merged = { ...base };
+            Object.keys(delta).forEach((key) => {
+                const value = delta[key];
+                merged[key] = (value && typeof value === 'object' && !Array.isArray(value) && base[key])
+                    ? mergeDelta(base[key], value)
+                    : value;
+            });
+            return merged;
+        };
+
+        const STREAM_MAX_ERRORS = 3; // Consecutive stream failures before falling back to polling
+        const STREAM_RETRY_MS = 60000; // While polling, try the stream again this often
+
+        let intervalId = null;
+        let retryId = null;
+        let source = null;
+        let streamErrors = 0;
+        let latest = null; // Raw server state; KPIs are recomputed on a copy
+
+        const startPolling = () => {
+            if (intervalId === null) {
+                fetchStatus();
+                intervalId = setInterval(fetchStatus, 5000); // Fetch every 5 seconds
+            }
+        };
+
+        const stopPolling = () => {
+            if (intervalId !== null) {
+                clearInterval(intervalId);
+                intervalId = null;
+            }
+        };
+
+        const openStream = () => {
+            retryId = null;
+            // Server pushes one status per tick to every open dashboard
+            source = new EventSource('http://127.0.0.1:5000/api/status/stream');
+            source.addEventListener('snapshot', (event) => {
+                streamErrors = 0;
+                stopPolling(); // Stream is (back) up
+                latest = JSON.parse(event.data);
+                applyStatus({ ...latest, kpi: { ...latest.kpi } });
+            });
+            source.addEventListener('delta', (event) => {
+                if (latest === null) return;
+                latest = mergeDelta(latest, JSON.parse(event.data));
+                applyStatus({ ...latest, kpi: { ...latest.kpi } });
+            });
+            source.onerror = () => {
+                streamErrors += 1;
+                // A dropped connection is retried by EventSource itself; a refused one is closed
+                if (source.readyState !== EventSource.CLOSED && streamErrors < STREAM_MAX_ERRORS) return;
+                source.close();
+                if (streamErrors < STREAM_MAX_ERRORS) {
+                    retryId = setTimeout(openStream, 2000 * streamErrors);
+                } else {
+                    // Stream keeps failing (e.g. older backend): poll until it comes back
+                    startPolling();
+                    retryId = setTimeout(openStream, STREAM_RETRY_MS);
+                }
+            };
+        };
+
+        if (window.EventSource) {
+            openStream();
+        } else {
+            startPolling();
+        }
+
+        return () => { // Cleanup on component unmount
+            if (source) source.close();
+            if (retryId !== null) clearTimeout(retryId);
+            stopPolling();
+        };
     }, []);
 
     // ... (rest of your Dashboard.js file from `if (loading)` down, remains unchanged) ...
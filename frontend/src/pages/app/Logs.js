@@ -5,19 +5,24 @@ import '../../assets/css/Logs.css';
 function Logs() {
   const [logs, setLogs] = useState([]); // Default to an empty array
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState(null); // null: no older pages
+
+  // Newest page first; passing the previous page's next_cursor loads older entries
+  const fetchLogs = async (cursor = null) => {
+    try {
+      const query = cursor === null ? '' : `?cursor=${cursor}`;
+      const response = await fetch(`http://127.0.0.1:5000/api/logs${query}`);
+      const data = await response.json();
+      setLogs((previous) => (cursor === null ? data.events : [...previous, ...data.events]));
+      setNextCursor(data.next_cursor);
+    } catch (error) {
+      console.error("Error fetching logs:", error);
+    } finally {
+      setLoading(false);
+    }
+  };
 
   useEffect(() => {
-    const fetchLogs = async () => {
-      try {
-        const response = await fetch('http://127.0.0.1:5000/api/logs');
-        const data = await response.json();
-        setLogs(data);
-      } catch (error) {
-        console.error("Error fetching logs:", error);
-      } finally {
-        setLoading(false);
-      }
-    };
     fetchLogs();
   }, []);
 
@@ -25,6 +30,7 @@ function Logs() {
     if (type === 'DECISION') return 'type-decision';
     if (type === 'ACTION') return 'type-action';
     if (type === 'ALERT') return 'type-alert';
+    if (type === 'SETTINGS' || type === 'SYSTEM') return 'type-action';
     return '';
   };
 
@@ -41,14 +47,17 @@ function Logs() {
           <span className="header-msg">Event Details</span>
           <span className="header-type">Type</span>
         </div>
-        {logs.map((log, index) => (
-          <div className="log-item" key={index}>
+        {logs.map((log) => (
+          <div className="log-item" key={log.seq}>
             <span className="timestamp">{log.timestamp}</span>
             <span className="message">{log.message}</span>
             <span className={`type ${getTypeClassName(log.type)}`}>{log.type}</span>
           </div>
         ))}
       </div>
+      {nextCursor !== null && (
+        <button className="load-more" onClick={() => fetchLogs(nextCursor)}>Load older entries</button>
+      )}
     </div>
   );
 }
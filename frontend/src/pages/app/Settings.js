@@ -16,6 +16,10 @@ function Settings() {
     const [batteryCapacity, setBatteryCapacity] = useState(10.0);
     const [batteryCurrentCharge, setBatteryCurrentCharge] = useState(5.0); // Note: This will be dynamic, but good to display
     const [batteryMinReserveSystem, setBatteryMinReserveSystem] = useState(20); // Hard system min
+    const [batteryMaxChargeKw, setBatteryMaxChargeKw] = useState(0.0); // 0 = no limit
+    const [batteryMaxDischargeKw, setBatteryMaxDischargeKw] = useState(0.0); // 0 = no limit
+    const [roundTripEfficiency, setRoundTripEfficiency] = useState(1.0);
+    const [timestepMinutes, setTimestepMinutes] = useState(60);
 
     const fetchSettings = async () => {
         try {
@@ -32,6 +36,10 @@ function Settings() {
             setBatteryCapacity(data.battery_capacity_kwh);
             setBatteryCurrentCharge(data.battery_current_charge_kwh);
             setBatteryMinReserveSystem(data.battery_min_reserve_percent); // For display purposes
+            setBatteryMaxChargeKw(data.battery_max_charge_kw);
+            setBatteryMaxDischargeKw(data.battery_max_discharge_kw);
+            setRoundTripEfficiency(data.battery_round_trip_efficiency);
+            setTimestepMinutes(data.simulation_timestep_minutes);
         } catch (e) {
             console.error("Error fetching settings:", e);
             setError("Failed to load settings.");
@@ -57,6 +65,10 @@ function Settings() {
             battery_capacity_kwh: parseFloat(batteryCapacity),
             battery_current_charge_kwh: parseFloat(batteryCurrentCharge),
             battery_min_reserve_percent: parseInt(batteryMinReserveSystem),
+            battery_max_charge_kw: parseFloat(batteryMaxChargeKw),
+            battery_max_discharge_kw: parseFloat(batteryMaxDischargeKw),
+            battery_round_trip_efficiency: parseFloat(roundTripEfficiency),
+            simulation_timestep_minutes: parseInt(timestepMinutes),
         };
 
         try {
@@ -109,6 +121,7 @@ function Settings() {
                         <option value="Cost Optimization">Cost Optimization</option>
                         <option value="Self-Sufficiency">Self-Sufficiency</option>
                         <option value="Environmental">Environmental</option>
+                        <option value="Optimal Dispatch">Optimal Dispatch</option>
                     </select>
                     <p className="field-description">
                         Determines the primary goal of your energy system.
@@ -176,6 +189,71 @@ function Settings() {
                         The total energy storage capacity of your battery system.
                     </p>
                 </div>
+                <div className="form-group">
+                    <label htmlFor="batteryMaxChargeKw">Max Charge Power (kW):</label>
+                    <input
+                        type="number"
+                        id="batteryMaxChargeKw"
+                        value={batteryMaxChargeKw}
+                        onChange={(e) => setBatteryMaxChargeKw(e.target.value)}
+                        step="0.1"
+                        min="0"
+                    />
+                    <p className="field-description">
+                        The fastest your battery can charge. 0 means no limit.
+                    </p>
+                </div>
+
+                <div className="form-group">
+                    <label htmlFor="batteryMaxDischargeKw">Max Discharge Power (kW):</label>
+                    <input
+                        type="number"
+                        id="batteryMaxDischargeKw"
+                        value={batteryMaxDischargeKw}
+                        onChange={(e) => setBatteryMaxDischargeKw(e.target.value)}
+                        step="0.1"
+                        min="0"
+                    />
+                    <p className="field-description">
+                        The fastest your battery can discharge. 0 means no limit.
+                    </p>
+                </div>
+
+                <div className="form-group">
+                    <label htmlFor="roundTripEfficiency">Round-Trip Efficiency:</label>
+                    <input
+                        type="number"
+                        id="roundTripEfficiency"
+                        value={roundTripEfficiency}
+                        onChange={(e) => setRoundTripEfficiency(e.target.value)}
+                        step="0.01"
+                        min="0.5"
+                        max="1"
+                    />
+                    <p className="field-description">
+                        Share of the energy put into the battery that you get back out (e.g. 0.9).
+                    </p>
+                </div>
+
+                <div className="form-group">
+                    <label htmlFor="timestepMinutes">Simulation Timestep:</label>
+                    <select
+                        id="timestepMinutes"
+                        value={timestepMinutes}
+                        onChange={(e) => setTimestepMinutes(e.target.value)}
+                    >
+                        <option value="5">5 minutes</option>
+                        <option value="10">10 minutes</option>
+                        <option value="15">15 minutes</option>
+                        <option value="30">30 minutes</option>
+                        <option value="60">1 hour</option>
+                    </select>
+                    <p className="field-description">
+                        Resolution of simulations and of the live decision. Shorter steps follow
+                        battery power limits and tariff changes more closely.
+                    </p>
+                </div>
+
                 {/* Display current charge, but don't allow direct editing here for realism */}
                 <div className="form-group">
                     <label htmlFor="batteryCurrentCharge">Current Battery Charge (kWh):</label>